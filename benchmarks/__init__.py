@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""Throughput and latency benchmarks of the conversion endpoint."""
+
+import concurrent.futures
+import contextlib
+import io
+import os
+import platform
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+import zipfile
+
+from matoconv import Config, Matoconv
+
+
+# Directory of documents used by system tests
+CORPUS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'system_tests', 'files')
+
+# Destination formats of each source format, when not specified
+DEFAULT_DESTINATIONS = {
+    'html': ['pdf', 'docx'],
+    'odt': ['pdf', 'docx'],
+    'docx': ['pdf', 'odt'],
+    'doc': ['pdf', 'docx'],
+    'pdf': ['html', 'docx'],
+}
+
+# Text filling synthetic document pages
+_PARAGRAPH = (
+    'Matoconv benchmark paragraph, converted to measure throughput and latency '
+    'of the conversion endpoint across documents of growing size. ')
+PARAGRAPHS_PER_PAGE = 20
+
+class Document(object):
+    """Struct-like object for storing a benchmark input document."""
+
+    def __init__(self, name: str, extension: str, data: bytes, pages: int = None):
+        """Setup member variables."""
+        self._name: str = name
+        self._extension: str = extension
+        self._data: bytes = data
+        self._pages: int = pages
+
+    @property
+    def name(self) -> str:
+        """Return name of document."""
+        return self._name
+
+    @property
+    def extension(self) -> str:
+        """Return extension of document format."""
+        return self._extension
+
+    @property
+    def filename(self) -> str:
+        """Return filename of document, used in conversion requests."""
+        return '{}.{}'.format(self._name, self._extension)
+
+    @property
+    def data(self) -> bytes:
+        """Return content of document."""
+        return self._data
+
+    @property
+    def pages(self) -> int:
+        """Return number of pages, or None if unknown."""
+        return self._pages
+
+    def unique_data(self, index: int) -> bytes:
+        """Return content of document, altered to be unique for the given index,
+        so that conversions are not served from the result cache.
+
+        Documents in formats that cannot be altered are returned unchanged.
+        """
+        marker = 'matoconv-benchmark-{}'.format(index)
+        if self._extension == 'html':
+            return self._data + '\n<!-- {} -->\n'.format(marker).encode('ascii')
+        if self._extension == 'pdf':
+            # Comments following the end of file marker are ignored by readers
+            return self._data + '%{}\n'.format(marker).encode('ascii')
+        if self._extension in ('odt', 'docx'):
+            output = io.BytesIO()
+            with zipfile.ZipFile(io.BytesIO(self._data)) as source, \
+                    zipfile.ZipFile(output, 'w') as destination:
+                # Members are copied in order, retaining the ODT mimetype as the first member
+                for info in source.infolist():
+                    destination.writestr(info, source.read(info))
+                destination.writestr('matoconv-benchmark.txt', marker)
+            return output.getvalue()
+        return self._data
+
+
+def synthetic_html(pages: int) -> Document:
+    """Return HTML document with the given number of pages."""
+    page = '<p>{}</p>\n'.format(_PARAGRAPH) * PARAGRAPHS_PER_PAGE
+    body = '<div style="page-break-after: always">\n{}</div>\n'.format(page) * pages
+    data = '<html><head><title>Benchmark</title></head><body>\n{}</body></html>\n'.format(body)
+    return Document('synthetic_{}_pages'.format(pages), 'html', data.encode('ascii'), pages=pages)
+
+
+def synthetic_pdf(pages: int) -> Document:
+    """Return PDF document with the given number of pages, each with a page of text."""
+    lines = ' T* '.join(
+        '({}) Tj'.format(_PARAGRAPH[:80]) for _ in range(PARAGRAPHS_PER_PAGE * 2))
+    stream = 'BT /F1 10 Tf 12 TL 40 800 Td {} ET'.format(lines).encode('ascii')
+
+    # Objects are the catalog, page tree, font, then a page and its content for each page
+    page_ids = [4 + index * 2 for index in range(pages)]
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        '<< /Type /Pages /Kids [{}] /Count {} >>'.format(
+            ' '.join('{} 0 R'.format(page_id) for page_id in page_ids), pages).encode('ascii'),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    for page_id in page_ids:
+        objects.append(
+            '<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+            '/Resources << /Font << /F1 3 0 R >> >> /Contents {} 0 R >>'.format(
+                page_id + 1).encode('ascii'))
+        objects.append(
+            '<< /Length {} >>\nstream\n'.format(len(stream)).encode('ascii') +
+            stream + b'\nendstream')
+
+    data = b'%PDF-1.4\n'
+    offsets = []
+    for object_id, content in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += '{} 0 obj\n'.format(object_id).encode('ascii') + content + b'\nendobj\n'
+    xref_offset = len(data)
+    data += 'xref\n0 {}\n0000000000 65535 f \n'.format(len(objects) + 1).encode('ascii')
+    data += b''.join('{:010d} 00000 n \n'.format(offset).encode('ascii') for offset in offsets)
+    data += 'trailer\n<< /Size {} /Root 1 0 R >>\nstartxref\n{}\n%%EOF\n'.format(
+        len(objects) + 1, xref_offset).encode('ascii')
+    return Document('synthetic_{}_pages'.format(pages), 'pdf', data, pages=pages)
+
+
+def load_corpus(directory: str = CORPUS_DIR) -> list:
+    """Return input documents of the system test corpus."""
+    documents = []
+    for filename in sorted(os.listdir(directory)):
+        name, extension = os.path.splitext(filename)
+        if not name.startswith('input_') or extension[1:] not in DEFAULT_DESTINATIONS:
+            continue
+        with open(os.path.join(directory, filename), 'rb') as fh:
+            documents.append(Document(name, extension[1:], fh.read()))
+    return documents
+
+
+def percentile(values: list, percent: float) -> float:
+    """Return percentile of values, using the nearest rank."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+@contextlib.contextmanager
+def stub_converter():
+    """Route all conversions of apps created within the context to the stub
+    converter backend, which copies input files to their outputs, to measure
+    the overhead of matoconv itself.
+    """
+    original_config = (Config.CONVERTER_ROUTES, Config.PROFILE_TEMPLATE)
+    Config.CONVERTER_ROUTES = '*:*=stub'
+    Config.PROFILE_TEMPLATE = False
+    try:
+        yield
+    finally:
+        Config.CONVERTER_ROUTES, Config.PROFILE_TEMPLATE = original_config
+
+
+class AppClient(object):
+    """Send conversion requests to an in-process matoconv app."""
+
+    def __init__(self, app):
+        """Setup member variables."""
+        self._app = app
+        self._local = threading.local()
+
+    @property
+    def target(self) -> str:
+        """Return description of target of requests."""
+        return 'in-process'
+
+    def convert(self, filename: str, data: bytes, destination: str) -> tuple:
+        """Convert document, returning status code and conversion attempts header."""
+        # Test clients hold state of their requests, so one is used per thread
+        if not hasattr(self._local, 'client'):
+            self._local.client = self._app.test_client()
+        response = self._local.client.post(
+            '/convert/format/' + destination,
+            headers={'Content-Disposition': 'attachment; filename="{}"'.format(filename)},
+            data=data)
+        try:
+            response.get_data()
+            return response.status_code, response.headers.get('X-Conversion-Attempts')
+        finally:
+            response.close()
+
+
+class HttpClient(object):
+    """Send conversion requests to a matoconv server."""
+
+    def __init__(self, url: str, timeout: float = 300):
+        """Setup member variables."""
+        self._url: str = url.rstrip('/')
+        self._timeout: float = timeout
+
+    @property
+    def target(self) -> str:
+        """Return description of target of requests."""
+        return self._url
+
+    def convert(self, filename: str, data: bytes, destination: str) -> tuple:
+        """Convert document, returning status code and conversion attempts header."""
+        request = urllib.request.Request(
+            self._url + '/convert/format/' + destination, data=data, method='POST',
+            headers={'Content-Disposition': 'attachment; filename="{}"'.format(filename)})
+        try:
+            with urllib.request.urlopen(request, timeout=self._timeout) as response:
+                response.read()
+                return response.status, response.headers.get('X-Conversion-Attempts')
+        except urllib.error.HTTPError as exc:
+            exc.read()
+            return exc.code, None
+
+
+def run_pair(client, document: Document, destination: str, requests: int,
+             concurrency: int, warmup: int = 0, unique: bool = True) -> dict:
+    """Convert document repeatedly, returning throughput and latency of conversions.
+
+    Warmup requests are sent first and not measured. If unique is set,
+    each request converts a unique copy of the document, bypassing the
+    result cache.
+    """
+    counter = iter(range(warmup + requests))
+    counter_lock = threading.Lock()
+
+    def convert(_):
+        with counter_lock:
+            index = next(counter)
+        data = document.unique_data(index) if unique else document.data
+        started_at = time.perf_counter()
+        try:
+            status, attempts = client.convert(document.filename, data, destination)
+        except Exception:
+            status, attempts = None, None
+        return status, attempts, time.perf_counter() - started_at
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(convert, range(warmup)))
+        started_at = time.perf_counter()
+        outcomes = list(executor.map(convert, range(requests)))
+        duration = time.perf_counter() - started_at
+
+    latencies = [latency for status, _, latency in outcomes if status == 200]
+    statuses = {}
+    for status, _, _ in outcomes:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'document': document.name,
+        'source': document.extension,
+        'destination': destination,
+        'size': len(document.data),
+        'pages': document.pages,
+        'requests': requests,
+        'concurrency': concurrency,
+        'succeeded': len(latencies),
+        'errors': requests - len(latencies),
+        'statuses': statuses,
+        # Converted responses report their attempts, so those without were cached
+        'cached': sum(1 for status, attempts, _ in outcomes if status == 200 and not attempts),
+        'duration': duration,
+        'throughput': len(latencies) / duration if duration else None,
+        'latency': {
+            'mean': sum(latencies) / len(latencies) if latencies else None,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': max(latencies) if latencies else None,
+        },
+    }
+
+
+def environment() -> dict:
+    """Return details of the environment benchmarks are run in."""
+    try:
+        revision = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        'revision': revision,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'max_converters': Config.MAX_CONVERTERS,
+        'converter_routes': Config.converter_routes(),
+    }
+
+
+def run(client, documents: list, concurrency: list, requests: int, warmup: int = 0,
+        destinations: list = None, unique: bool = True, backend: str = 'converter') -> dict:
+    """Run benchmarks of each document and destination format, at each concurrency.
+
+    Destination formats default to those of DEFAULT_DESTINATIONS for each document.
+    """
+    results = []
+    for document in documents:
+        for destination in destinations or DEFAULT_DESTINATIONS.get(document.extension, []):
+            if destination == document.extension:
+                continue
+            for level in concurrency:
+                result = run_pair(client, document, destination, requests=requests,
+                                  concurrency=level, warmup=warmup, unique=unique)
+                result['backend'] = backend
+                results.append(result)
+    return {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'target': client.target,
+        'backend': backend,
+        'environment': environment(),
+        'results': results,
+    }
+
+
+def result_key(result: dict) -> tuple:
+    """Return key identifying benchmark, used to compare results of runs."""
+    return (result['backend'], result['document'], result['source'],
+            result['destination'], result['concurrency'])
+
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.1) -> list:
+    """Return descriptions of benchmarks regressed from the baseline run.
+
+    Benchmarks regress if p95 latency increases, or throughput decreases,
+    by more than the tolerance, or if more requests fail.
+    """
+    baseline_results = {result_key(result): result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        previous = baseline_results.get(result_key(result))
+        if previous is None:
+            continue
+        name = '{} {} -> {} at concurrency {} ({})'.format(
+            result['document'], result['source'], result['destination'],
+            result['concurrency'], result['backend'])
+        if result['errors'] > previous['errors']:
+            regressions.append('{}: errors increased from {} to {}'.format(
+                name, previous['errors'], result['errors']))
+        if previous['latency']['p95'] and result['latency']['p95'] and (
+                result['latency']['p95'] > previous['latency']['p95'] * (1 + tolerance)):
+            regressions.append('{}: p95 latency increased from {:.3f}s to {:.3f}s'.format(
+                name, previous['latency']['p95'], result['latency']['p95']))
+        if previous['throughput'] and (result['throughput'] or 0) < (
+                previous['throughput'] * (1 - tolerance)):
+            regressions.append('{}: throughput decreased from {:.2f}/s to {:.2f}/s'.format(
+                name, previous['throughput'], result['throughput'] or 0))
+    return regressions
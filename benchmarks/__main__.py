@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""Run benchmarks of the conversion endpoint, writing results as JSON."""
+
+import argparse
+import contextlib
+import json
+import sys
+
+import benchmarks
+from matoconv import Matoconv
+
+
+def parse_args(argv: list = None) -> argparse.Namespace:
+    """Return parsed command line arguments."""
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Measure throughput and latency of the conversion endpoint.')
+    parser.add_argument(
+        '--url', help='URL of matoconv server to benchmark, rather than an in-process app')
+    parser.add_argument(
+        '--stub', action='store_true',
+        help='Replace converter processes with a stub, to measure overhead of matoconv itself. '
+             'Only applies to the in-process app')
+    parser.add_argument(
+        '--concurrency', default='1,4', help='Comma separated concurrent request counts')
+    parser.add_argument(
+        '--requests', type=int, default=20, help='Measured requests for each benchmark')
+    parser.add_argument(
+        '--warmup', type=int, default=2, help='Unmeasured requests sent before each benchmark')
+    parser.add_argument(
+        '--pages', default='1,10,50',
+        help='Comma separated page counts of synthetic HTML and PDF documents, empty to disable')
+    parser.add_argument(
+        '--no-corpus', action='store_true', help='Do not benchmark the system test documents')
+    parser.add_argument(
+        '--destinations', help='Comma separated destination formats, rather than defaults for each source format')
+    parser.add_argument(
+        '--no-unique', action='store_true',
+        help='Send identical documents, so that repeated conversions are served from the result cache')
+    parser.add_argument('--output', help='Path to write JSON results to (default: stdout)')
+    parser.add_argument('--baseline', help='Path of JSON results to compare results with')
+    parser.add_argument(
+        '--tolerance', type=float, default=0.1,
+        help='Proportion by which latency or throughput may regress from the baseline')
+    return parser.parse_args(argv)
+
+
+def summary(result: dict) -> str:
+    """Return one line summary of benchmark result."""
+    latency = {
+        key: '-' if value is None else '{:.3f}s'.format(value)
+        for key, value in result['latency'].items()
+    }
+    return '{} {} -> {} x{}: {:.2f}/s, p50 {}, p95 {}, p99 {}, {} errors'.format(
+        result['document'], result['source'], result['destination'], result['concurrency'],
+        result['throughput'] or 0, latency['p50'], latency['p95'], latency['p99'],
+        result['errors'])
+
+
+def main(argv: list = None) -> int:
+    """Run benchmarks, returning exit code, which is 1 if any regressed from the baseline."""
+    args = parse_args(argv)
+
+    documents = [] if args.no_corpus else benchmarks.load_corpus()
+    for pages in [int(pages) for pages in args.pages.split(',') if pages]:
+        documents += [benchmarks.synthetic_html(pages), benchmarks.synthetic_pdf(pages)]
+
+    with contextlib.ExitStack() as stack:
+        if args.url:
+            client = benchmarks.HttpClient(args.url)
+            backend = 'server'
+        else:
+            if args.stub:
+                stack.enter_context(benchmarks.stub_converter())
+            client = benchmarks.AppClient(Matoconv.get_instance().app)
+            backend = 'stub' if args.stub else 'converter'
+
+        results = benchmarks.run(
+            client, documents,
+            concurrency=[int(level) for level in args.concurrency.split(',')],
+            requests=args.requests, warmup=args.warmup,
+            destinations=args.destinations.split(',') if args.destinations else None,
+            unique=not args.no_unique, backend=backend)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            fh.write(output + '\n')
+    else:
+        print(output)
+
+    for result in results['results']:
+        print(summary(result), file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as fh:
+            regressions = benchmarks.compare(json.load(fh), results, tolerance=args.tolerance)
+        for regression in regressions:
+            print('Regression: ' + regression, file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
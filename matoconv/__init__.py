@@ -1,16 +1,39 @@
 # -*- coding: utf-8 -*-
 
+import atexit
+import contextlib
+import hashlib
+import threading
+import urllib.parse
 import os
+import shutil
 import tempfile
-import subprocess
 import time
-from multiprocessing import Pool, TimeoutError
-import re
-import base64
-import mimetypes
+import zipfile
 
 import flask
 from flask_cors import CORS
+from werkzeug.wsgi import wrap_file, ClosingIterator
+
+from matoconv.exceptions import (
+    MatoconvException, UnknownFileTypeError, CannotDetectFileTypeError,
+    OfficeListenerError, ProfileTemplateError, AdmissionRejectedError, InvalidInputError,
+    ConverterUnavailableError)
+from matoconv import backends
+from matoconv import compression
+from matoconv import preflight
+from matoconv.profile import ProfileTemplate
+from matoconv.cache import ResultCache, CacheEntry
+from matoconv.batch import BatchFile, iter_uploads, write_archive
+from matoconv.jobs import Job, JobStore
+from matoconv.admission import AdmissionController, AdmissionRequest, SharedSlots
+from matoconv.metrics import MatoconvMetrics, TaskStats
+from matoconv.scheduler import ConverterScheduler
+from matoconv.routing import Conversion, ConversionGraph
+from matoconv.retry import RetryController, RetryPolicy
+from matoconv.progress import OutputProgress, ProgressiveStream
+from matoconv.workdir import WorkDirectories
+from matoconv.supervisor import ProcessSupervisor
 
 
 class Config(object):
@@ -20,7 +43,78 @@ class Config(object):
     MAX_CONVERTERS = int(os.environ.get('MAX_CONVERTERS', 5))
     POOL_CONVERT_TIMEOUT = int(os.environ.get('POOL_CONVERT_TIMEOUT', 60))
     RETRY_WAIT_PERIOD = int(os.environ.get('RETRY_WAIT_PERIOD', 1))
+    RETRY_MAX_WAIT_PERIOD = int(os.environ.get('RETRY_MAX_WAIT_PERIOD', 30))
+    RETRY_BUDGET_RATIO = float(os.environ.get('RETRY_BUDGET_RATIO', 0.2))
+    RETRY_BUDGET_MIN = int(os.environ.get('RETRY_BUDGET_MIN', 3))
+    CIRCUIT_BREAKER_THRESHOLD = float(os.environ.get('CIRCUIT_BREAKER_THRESHOLD', 0.5))
+    CIRCUIT_BREAKER_MIN_ATTEMPTS = int(os.environ.get('CIRCUIT_BREAKER_MIN_ATTEMPTS', 10))
+    CIRCUIT_BREAKER_WINDOW = int(os.environ.get('CIRCUIT_BREAKER_WINDOW', 20))
+    CIRCUIT_BREAKER_COOLDOWN = int(os.environ.get('CIRCUIT_BREAKER_COOLDOWN', 30))
     EXECUTION_TIMEOUT = int(os.environ.get('EXECUTION_TIMEOUT', 20))
+    CONVERTER_CPU_LIMIT = int(os.environ.get('CONVERTER_CPU_LIMIT', 0))
+    CONVERTER_MEMORY_LIMIT = int(os.environ.get('CONVERTER_MEMORY_LIMIT', 0))
+    CONVERTER_OUTPUT_LIMIT = int(os.environ.get('CONVERTER_OUTPUT_LIMIT', 64 * 1024))
+    CONVERTER_KILL_GRACE = float(os.environ.get('CONVERTER_KILL_GRACE', 5))
+    CONVERTER_MODE = os.environ.get('CONVERTER_MODE', 'oneshot')
+    CONVERTER_ROUTES = os.environ.get('CONVERTER_ROUTES', '')
+    STUB_BACKEND_DELAY = float(os.environ.get('STUB_BACKEND_DELAY', 0))
+    LISTENER_START_TIMEOUT = int(os.environ.get('LISTENER_START_TIMEOUT', 30))
+    PROFILE_TEMPLATE = os.environ.get('PROFILE_TEMPLATE', 'true') == 'true'
+    PROFILE_TEMPLATE_DIR = os.environ.get('PROFILE_TEMPLATE_DIR', '')
+    PROFILE_CLONE_MODE = os.environ.get('PROFILE_CLONE_MODE', 'reflink')
+    PROFILE_BUILD_TIMEOUT = int(os.environ.get('PROFILE_BUILD_TIMEOUT', 120))
+    RESULT_CACHE_MEMORY_SIZE = int(os.environ.get('RESULT_CACHE_MEMORY_SIZE', 64 * 1024 * 1024))
+    RESULT_CACHE_DISK_SIZE = int(os.environ.get('RESULT_CACHE_DISK_SIZE', 512 * 1024 * 1024))
+    RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR', '')
+    WORK_DIR = os.environ.get('WORK_DIR', '')
+    WORK_DIR_MAX_USAGE = int(os.environ.get('WORK_DIR_MAX_USAGE', 0))
+    STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', 64 * 1024))
+    COMPRESSION = os.environ.get('COMPRESSION', 'true') == 'true'
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 5))
+    BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', 1000))
+    BATCH_GROUP_SIZE = int(os.environ.get('BATCH_GROUP_SIZE', 50))
+    JOB_TTL = int(os.environ.get('JOB_TTL', 3600))
+    JOB_DIR = os.environ.get('JOB_DIR', '')
+    JOB_CALLBACK_TIMEOUT = int(os.environ.get('JOB_CALLBACK_TIMEOUT', 10))
+    ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', 20))
+    ADMISSION_MAX_WAIT = int(os.environ.get('ADMISSION_MAX_WAIT', 30))
+    ADMISSION_MAX_LOAD = float(os.environ.get('ADMISSION_MAX_LOAD', 0))
+    ADMISSION_MIN_MEMORY = int(os.environ.get('ADMISSION_MIN_MEMORY', 0))
+    ADMISSION_AGING = float(os.environ.get('ADMISSION_AGING', 1))
+    ADMISSION_BATCH_DELAY = float(os.environ.get('ADMISSION_BATCH_DELAY', 10))
+    ADMISSION_RESERVED_SLOTS = int(os.environ.get('ADMISSION_RESERVED_SLOTS', 0))
+    CONVERTER_SLOTS_DIR = os.environ.get('CONVERTER_SLOTS_DIR', '')
+    MAX_REQUEST_SIZE = int(os.environ.get('MAX_REQUEST_SIZE', 256 * 1024 * 1024))
+    INLINE_IMAGE_WORKERS = int(os.environ.get('INLINE_IMAGE_WORKERS', 4))
+    PDFTOHTML_SHARD_PAGES = int(os.environ.get('PDFTOHTML_SHARD_PAGES', 20))
+    PDFTOHTML_SHARD_WORKERS = int(os.environ.get('PDFTOHTML_SHARD_WORKERS', os.cpu_count() or 1))
+    ROUTE_MAX_STEPS = int(os.environ.get('ROUTE_MAX_STEPS', 2))
+    ROUTE_STATS_WINDOW = int(os.environ.get('ROUTE_STATS_WINDOW', 20))
+    PREFLIGHT = os.environ.get('PREFLIGHT', 'true') == 'true'
+    PREFLIGHT_MAX_SIZE = int(os.environ.get('PREFLIGHT_MAX_SIZE', 0))
+    PREFLIGHT_MAX_PAGES = int(os.environ.get('PREFLIGHT_MAX_PAGES', 0))
+    PREVIEW_WIDTH = int(os.environ.get('PREVIEW_WIDTH', 200))
+    PREVIEW_MAX_WIDTH = int(os.environ.get('PREVIEW_MAX_WIDTH', 2000))
+
+    @staticmethod
+    def format_limit(name: str, extension: str) -> int:
+        """Return limit for format, from <name>_<EXTENSION> environment variable,
+        falling back to the limit for all formats.
+        """
+        return int(os.environ.get('{}_{}'.format(name, extension.upper()), getattr(Config, name)))
+
+    @staticmethod
+    def converter_routes() -> str:
+        """Return routing table of converter backends, defaulting to pdftohtml for
+        PDF to HTML, pdftoppm for PDF to images and LibreOffice, in the configured
+        converter mode, for all others.
+        """
+        if Config.CONVERTER_ROUTES:
+            return Config.CONVERTER_ROUTES
+        return 'pdf:html=pdftohtml,pdf:*=pdftoppm,*:*=' + (
+            'soffice-listener' if Config.CONVERTER_MODE == 'persistent' else 'soffice')
 
 
 class Format(object):
@@ -30,6 +124,16 @@ class Format(object):
     EXTENSION = None
     INPUT_FILTER = None
     OUTPUT_FILTER = None
+    # Filter names used when converting through a persistent office
+    # listener, where command line switches such as --writer
+    # are not available.
+    UNO_INPUT_FILTER = None
+    UNO_OUTPUT_FILTER = None
+    # Whether format is an image, which documents are rendered to as previews
+    IMAGE = False
+    # Whether files of format are compressed by response compression,
+    # which is not worthwhile for formats which are already compressed.
+    COMPRESSIBLE = True
 
     @property
     def content_type(self):
@@ -41,6 +145,16 @@ class Format(object):
         """Return extension."""
         return self.EXTENSION
 
+    @property
+    def image(self):
+        """Return whether format is an image."""
+        return self.IMAGE
+
+    @property
+    def compressible(self):
+        """Return whether files of format are compressed in responses."""
+        return self.COMPRESSIBLE
+
     @property
     def input_filter(self):
         """Return input filter."""
@@ -51,6 +165,25 @@ class Format(object):
         """Return output filter."""
         return self.OUTPUT_FILTER
 
+    @property
+    def uno_input_filter(self):
+        """Return filter name for loading documents through UNO."""
+        return self.UNO_INPUT_FILTER or self.INPUT_FILTER
+
+    @property
+    def uno_output_filter(self):
+        """Return filter name for storing documents through UNO."""
+        if self.UNO_OUTPUT_FILTER:
+            return self.UNO_OUTPUT_FILTER
+        # Output filter is in form of <extension>:<filter name>[:<filter options>]
+        return self.OUTPUT_FILTER.split(':')[1]
+
+    @property
+    def uno_output_filter_options(self):
+        """Return filter options for storing documents through UNO."""
+        filter_parts = self.OUTPUT_FILTER.split(':', 2)
+        return filter_parts[2] if len(filter_parts) == 3 else None
+
 
 class PDF(Format):
     """Format class for PDF format."""
@@ -59,6 +192,8 @@ class PDF(Format):
     EXTENSION = 'pdf'
     INPUT_FILTER = 'writer_pdf_import'
     OUTPUT_FILTER = 'pdf'
+    UNO_OUTPUT_FILTER = 'writer_pdf_Export'
+    COMPRESSIBLE = False
 
 
 class DOC(Format):
@@ -75,6 +210,7 @@ class DOCX(Format):
     CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
     EXTENSION = 'docx'
     OUTPUT_FILTER = 'docx:Office Open XML Text'
+    COMPRESSIBLE = False
 
 
 class ODT(Format):
@@ -83,6 +219,7 @@ class ODT(Format):
     CONTENT_TYPE = 'application/vnd.oasis.opendocument.text'
     EXTENSION = 'odt'
     OUTPUT_FILTER = 'odt:writer8'
+    COMPRESSIBLE = False
 
 
 class HTML(Format):
@@ -91,26 +228,125 @@ class HTML(Format):
     CONTENT_TYPE = 'text/html'
     EXTENSION = 'html'
     OUTPUT_FILTER = 'html:HTML (StarWriter):EmbedImages'
+    UNO_INPUT_FILTER = 'HTML (StarWriter)'
+
+
+class PNG(Format):
+    """Format class for PNG images."""
+
+    CONTENT_TYPE = 'image/png'
+    EXTENSION = 'png'
+    IMAGE = True
+    COMPRESSIBLE = False
+
+
+class JPEG(Format):
+    """Format class for JPEG images."""
+
+    CONTENT_TYPE = 'image/jpeg'
+    EXTENSION = 'jpeg'
+    IMAGE = True
+    COMPRESSIBLE = False
 
 
 class FormatFactory(object):
-    """Factory class for providing lookup of format classes."""
+    """Factory class for providing lookup of format classes,
+    and routes of conversions between them.
+    """
 
     FORMATS = []
+    BY_EXTENSION = {}
+    GRAPH = None
+    BACKENDS = {}
 
     @staticmethod
     def _register_format(format_cls: Format):
         """Register a format"""
         FormatFactory.FORMATS.append(format_cls)
+        # Formats are stateless, so a single instance is shared by all lookups
+        format_instance = format_cls()
+        FormatFactory.BY_EXTENSION[format_instance.extension] = format_instance
+
+    @staticmethod
+    def _register_conversion(backend: str, source: str, destination: str, cost: float):
+        """Register conversion between formats, performed by converter backend."""
+        FormatFactory.GRAPH.add_conversion(Conversion(backend, source, destination, cost))
 
     @staticmethod
-    def register_formats():
-        """Register all formats."""
+    def create_supervisor() -> ProcessSupervisor:
+        """Return supervisor of converter processes, limited by the configured resource limits."""
+        return ProcessSupervisor(
+            cpu_limit=Config.CONVERTER_CPU_LIMIT,
+            memory_limit=Config.CONVERTER_MEMORY_LIMIT,
+            output_limit=Config.CONVERTER_OUTPUT_LIMIT,
+            kill_grace=Config.CONVERTER_KILL_GRACE)
+
+    @staticmethod
+    def create_backend(name: str, profile_template: ProfileTemplate = None) -> backends.ConverterBackend:
+        """Return converter backend with the given name."""
+        if name == backends.SofficeBackend.NAME:
+            return backends.SofficeBackend(
+                execution_timeout=Config.EXECUTION_TIMEOUT, profile_template=profile_template,
+                supervisor=FormatFactory.create_supervisor())
+        if name == backends.OfficeListenerBackend.NAME:
+            return backends.OfficeListenerBackend(
+                start_timeout=Config.LISTENER_START_TIMEOUT,
+                execution_timeout=Config.EXECUTION_TIMEOUT,
+                profile_template=profile_template,
+                supervisor=FormatFactory.create_supervisor())
+        if name == backends.PdfToHtmlBackend.NAME:
+            return backends.PdfToHtmlBackend(
+                execution_timeout=Config.EXECUTION_TIMEOUT,
+                chunk_size=Config.STREAM_CHUNK_SIZE,
+                image_workers=Config.INLINE_IMAGE_WORKERS,
+                shard_pages=Config.PDFTOHTML_SHARD_PAGES,
+                shard_workers=Config.PDFTOHTML_SHARD_WORKERS,
+                supervisor=FormatFactory.create_supervisor())
+        if name == backends.PdfToPpmBackend.NAME:
+            return backends.PdfToPpmBackend(
+                execution_timeout=Config.EXECUTION_TIMEOUT,
+                supervisor=FormatFactory.create_supervisor())
+        if name == backends.StubBackend.NAME:
+            return backends.StubBackend(delay=Config.STUB_BACKEND_DELAY)
+        raise MatoconvException('Unknown converter backend: ' + name)
+
+    @staticmethod
+    def register_formats(profile_template: ProfileTemplate = None):
+        """Register all formats, converter backends of the routing
+        table, and conversions between formats performed by them.
+        """
+        FormatFactory.FORMATS = []
+        FormatFactory.BY_EXTENSION = {}
+        FormatFactory.GRAPH = ConversionGraph(
+            max_steps=Config.ROUTE_MAX_STEPS, window=Config.ROUTE_STATS_WINDOW)
+
         FormatFactory._register_format(PDF)
         FormatFactory._register_format(DOC)
         FormatFactory._register_format(ODT)
         FormatFactory._register_format(DOCX)
         FormatFactory._register_format(HTML)
+        FormatFactory._register_format(PNG)
+        FormatFactory._register_format(JPEG)
+
+        routes = backends.parse_routing_table(Config.converter_routes())
+        FormatFactory.BACKENDS = {}
+        for _, _, name in routes:
+            if name not in FormatFactory.BACKENDS:
+                FormatFactory.BACKENDS[name] = FormatFactory.create_backend(name, profile_template)
+
+        # Each pair of formats is converted by the backend of the first matching route
+        for source in FormatFactory.BY_EXTENSION:
+            for destination in FormatFactory.BY_EXTENSION:
+                backend = backends.select_backend(
+                    routes, FormatFactory.BACKENDS, source, destination)
+                if backend is not None:
+                    FormatFactory._register_conversion(
+                        backend.name, source, destination, backend.cost)
+
+    @staticmethod
+    def backend(name: str) -> backends.ConverterBackend:
+        """Return registered converter backend with the given name."""
+        return FormatFactory.BACKENDS[name]
 
     @staticmethod
     def by_extension(extension: str):
@@ -119,32 +355,29 @@ class FormatFactory(object):
         if not extension:
             return None
 
-        # Look through formats to matching extension
-        for ext in FormatFactory.FORMATS:
-            if ext().extension == extension.lower():
-                # Return instance of class, so that properties work
-                return ext()
-
-        # Default return None
-        return None
-
-
-class MatoconvException(Exception):
-    """Base exception for matoconv."""
-
-    pass
-
-
-class UnknownFileTypeError(MatoconvException):
-    """Unknown filetype."""
-
-    pass
+        return FormatFactory.BY_EXTENSION.get(extension.lower())
 
+    @staticmethod
+    def observe_conversion(conversion: Conversion, duration: float, units: float = None):
+        """Record duration of conversion (seconds), of input of units of work, if known,
+        to select future routes and estimate durations of future conversions.
+        """
+        if FormatFactory.GRAPH is not None:
+            FormatFactory.GRAPH.observe(conversion, duration, units=units)
 
-class CannotDetectFileTypeError(MatoconvException):
-    """Cannot detect input file type."""
+    @staticmethod
+    def estimate_duration(route: list, units: float) -> float:
+        """Return expected duration of conversions of route, of input of units of work (seconds)."""
+        if FormatFactory.GRAPH is None:
+            return 0
+        return sum(FormatFactory.GRAPH.estimate(conversion, units) for conversion in route)
 
-    pass
+    @staticmethod
+    def find_route(source_format: Format, destination_format: Format) -> list:
+        """Return cheapest list of conversions between formats, or None if there is no route."""
+        if FormatFactory.GRAPH is None:
+            return None
+        return FormatFactory.GRAPH.find_route(source_format.extension, destination_format.extension)
 
 
 class FlaskNoName(flask.Flask):
@@ -157,17 +390,78 @@ class FlaskNoName(flask.Flask):
         return response
 
 
+class PageRange(object):
+    """Struct-like object for storing a range of pages to convert."""
+
+    def __init__(self, first: int, last: int = None):
+        """Setup member variables."""
+        self._first: int = first
+        self._last: int = last
+
+    @property
+    def first(self) -> int:
+        """Return first page to convert."""
+        return self._first
+
+    @property
+    def last(self) -> int:
+        """Return last page to convert, or None to convert to the end of the document."""
+        return self._last
+
+    def count(self, pages: int) -> int:
+        """Return number of pages converted from a document with the given number of pages."""
+        last = pages if self._last is None else min(self._last, pages)
+        return max(0, last - self._first + 1)
+
+    def __str__(self) -> str:
+        """Return range, in the form used by request parameters, e.g. 1-2."""
+        if self._last == self._first:
+            return str(self._first)
+        return '{}-{}'.format(self._first, '' if self._last is None else self._last)
+
+    @staticmethod
+    def parse(value: str) -> 'PageRange':
+        """Return page range from request parameter, such as 1, 1-2 or 3-."""
+        first, has_last, last = value.strip().partition('-')
+        try:
+            page_range = PageRange(
+                int(first), (int(last) if last else None) if has_last else int(first))
+        except ValueError:
+            raise InvalidInputError('Invalid page range: ' + value, status_code=400)
+        if page_range.first < 1 or (page_range.last is not None and page_range.last < page_range.first):
+            raise InvalidInputError('Invalid page range: ' + value, status_code=400)
+        return page_range
+
+
 class ConversionDetails(object):
     """Struct-like object for storing details
     about conversions, such as file paths.
     """
 
+    # Size of input counted as a page of work, where its pages are not known (bytes)
+    PAGE_SIZE = 100 * 1024
+
     def __init__(self,
                  content_disp_headers: str,
                  temp_directory: str,
-                 dest_format: Format):
-        """Setup member variables."""
+                 dest_format: Format,
+                 t_extless_filename: str = 'conversion',
+                 page_range: PageRange = None,
+                 width: int = None,
+                 image_assets: bool = False):
+        """Setup member variables.
+
+        Conversions sharing a temporary directory must use
+        distinct temporary filenames.
+        If page_range is provided, only the pages within it are converted.
+        If width is provided, images are rendered with the given width (pixels).
+        If image_assets is True, the output is a zip archive of the converted
+        document and its images, rather than a document embedding its images.
+        """
         self._destination_format: Format = dest_format
+        self._page_range: PageRange = page_range
+        self._width: int = width
+        self._image_assets: bool = image_assets
         self._content_disp_headers: str = content_disp_headers
 
         self._original_filename: str = None
@@ -182,29 +476,75 @@ class ConversionDetails(object):
             #   Remove any double-quotes
             self._original_filename = self._content_disp_headers.split(
                 ';')[1].strip().split('=')[1].replace('"', '')
-            self._source_format = FormatFactory.by_extension(
-                self._original_filename.split('.')[-1])
-        except ValueError:
+        except (ValueError, IndexError):
             raise CannotDetectFileTypeError('Cannot detect input file type')
 
-        if self._source_format is None:
-            raise UnknownFileTypeError('Unsupported source format')
+        # Without an extension, the source format is detected from the input file
+        # once it has been received, using detect_source_format().
+        original_basename, has_extension, extension = self._original_filename.rpartition('.')
+        if has_extension:
+            self._source_format = FormatFactory.by_extension(extension)
+            if self._source_format is None:
+                raise UnknownFileTypeError('Unsupported source format')
+        else:
+            original_basename = self._original_filename
 
         # Generate output filename, removing the extension from the original filename
         # and adding output filetype extension.
-        self._ouptut_filename: str = '.'.join(self.original_filename.split(
-            '.')[:-1]) + '.' + self.destination_format.extension
+        self._ouptut_filename: str = original_basename + '.' + self.destination_format.extension
+        if self._image_assets:
+            self._ouptut_filename += '.zip'
 
         # Create temporary file names for connversion
-        self._t_extless_filename: str = 'conversion'
-        self._t_input_filename: str = self.t_extless_filename + \
-            '.' + self.source_format.extension
+        self._t_profile_dirname: str = 'profile'
+        self._t_extless_filename: str = t_extless_filename
+        self._t_input_filename: str = self.t_extless_filename + (
+            '.' + self.source_format.extension if self.source_format else '')
         self._t_output_filename: str = self.t_extless_filename + \
             '.' + self.destination_format.extension
 
         # Store temporary working directory
         self._temp_directory: str = temp_directory
 
+        # Outcome of each conversion attempt
+        self.attempts: list = []
+
+        # Progress of output written progressively, if it is to be streamed
+        self.progress: OutputProgress = None
+
+        # Size (bytes) and number of pages to convert of the input, once inspected
+        self.input_size: int = None
+        self.pages: int = None
+
+        # Resources used by each converter process run for the conversion
+        self.process_usage: list = []
+
+    def detect_source_format(self, source_format: Format):
+        """Set source format, detected from the received input file,
+        renaming the input file to match.
+        """
+        input_path = self.t_input_path
+        self._source_format = source_format
+        self._t_input_filename = self._t_extless_filename + '.' + source_format.extension
+        os.rename(input_path, self.t_input_path)
+
+    def step(self, conversion: Conversion, page_range: PageRange = None,
+             width: int = None, image_assets: bool = False) -> 'ConversionDetails':
+        """Return details of a step of a multi-step conversion.
+
+        Steps share the temporary filename, so that each step
+        converts the output of the previous step.
+        """
+        return ConversionDetails(
+            content_disp_headers='attachment; filename="{}.{}"'.format(
+                self._t_extless_filename, conversion.source),
+            temp_directory=self._temp_directory,
+            dest_format=FormatFactory.by_extension(conversion.destination),
+            t_extless_filename=self._t_extless_filename,
+            page_range=page_range,
+            width=width,
+            image_assets=image_assets)
+
     def _prepend_path(self, filename: str) -> str:
         """Prepend filename with temporary directory."""
         return self._temp_directory + '/' + filename
@@ -214,11 +554,57 @@ class ConversionDetails(object):
         """Return the original filename."""
         return self._original_filename
 
+    @property
+    def page_range(self) -> PageRange:
+        """Return range of pages to convert, or None to convert all pages."""
+        return self._page_range
+
+    @property
+    def width(self) -> int:
+        """Return width of rendered images (pixels), or None for the default width."""
+        return self._width
+
+    @property
+    def image_assets(self) -> bool:
+        """Return whether images are output as separate files, in a zip archive with the document."""
+        return self._image_assets
+
+    @property
+    def work_units(self) -> float:
+        """Return amount of work to convert input, in pages, used to estimate its duration.
+
+        Inputs with an unknown number of pages are counted as a page per PAGE_SIZE bytes.
+        """
+        if self.pages is not None:
+            return max(1, self.pages)
+        if self.input_size is not None:
+            return max(1, self.input_size / self.PAGE_SIZE)
+        return 1
+
+    @property
+    def options(self) -> str:
+        """Return options of conversion which change its result, used in cache keys."""
+        options = []
+        if self._page_range:
+            options.append('pages=' + str(self._page_range))
+        if self._width:
+            options.append('width=' + str(self._width))
+        if self._image_assets:
+            options.append('images=separate')
+        return ','.join(options)
+
     @property
     def response_mime_type(self) -> str:
         """Return response mime type."""
+        if self._image_assets:
+            return 'application/zip'
         return self._destination_format.content_type
 
+    @property
+    def compressible(self) -> bool:
+        """Return whether the result benefits from being compressed."""
+        return self._destination_format.compressible and not self._image_assets
+
     @property
     def t_input_path(self) -> str:
         """Property for full path of temporary input file."""
@@ -229,6 +615,11 @@ class ConversionDetails(object):
         """Property for full path of temporary output file."""
         return self._prepend_path(self._t_output_filename)
 
+    @property
+    def t_profile_path(self) -> str:
+        """Property for path of LibreOffice user profile used for conversion."""
+        return self._prepend_path(self._t_profile_dirname)
+
     @property
     def t_input_filename(self) -> str:
         """Property for name of temporary input file."""
@@ -274,75 +665,1008 @@ class Matoconv(object):
 
     INSTANCE = None
     DEST_FORMATS = {}
+    PROFILE_TEMPLATE = None
+
+    # Return code of conversion commands killed by timeout
+    TIMEOUT_RC = backends.TIMEOUT_RC
 
     def __init__(self):
-        """Instantiate flask app, cors and conversion pool."""
+        """Instantiate flask app, cors and converter scheduler."""
         self.app = FlaskNoName(__name__)
         self.cors = CORS(self.app, resources={r"*": {"origins": ""}})
-        self.converter_pool = Pool(processes=Config.MAX_CONVERTERS)
 
-        FormatFactory.register_formats()
+        # Build profile template before starting the scheduler,
+        # so that it is available to the first conversions.
+        self.build_profile_template()
+
+        self.scheduler = ConverterScheduler(slots=Config.MAX_CONVERTERS)
+        self.admission = AdmissionController(
+            slots=Config.MAX_CONVERTERS,
+            max_queue=Config.ADMISSION_MAX_QUEUE,
+            max_wait=Config.ADMISSION_MAX_WAIT,
+            max_load=Config.ADMISSION_MAX_LOAD,
+            min_memory=Config.ADMISSION_MIN_MEMORY,
+            shared_slots=(SharedSlots(Config.CONVERTER_SLOTS_DIR, Config.MAX_CONVERTERS)
+                          if Config.CONVERTER_SLOTS_DIR else None),
+            aging=Config.ADMISSION_AGING,
+            batch_delay=Config.ADMISSION_BATCH_DELAY,
+            reserved_slots=Config.ADMISSION_RESERVED_SLOTS)
+        self.metrics = MatoconvMetrics(self.admission)
+        self.retries = RetryController(
+            policy=RetryPolicy(
+                max_attempts=Config.MAX_ATTEMPTS,
+                base_delay=Config.RETRY_WAIT_PERIOD,
+                max_delay=Config.RETRY_MAX_WAIT_PERIOD),
+            budget_ratio=Config.RETRY_BUDGET_RATIO,
+            budget_min_retries=Config.RETRY_BUDGET_MIN,
+            breaker_threshold=Config.CIRCUIT_BREAKER_THRESHOLD,
+            breaker_min_attempts=Config.CIRCUIT_BREAKER_MIN_ATTEMPTS,
+            breaker_window=Config.CIRCUIT_BREAKER_WINDOW,
+            breaker_cooldown=Config.CIRCUIT_BREAKER_COOLDOWN)
+
+        self.result_cache = ResultCache(
+            memory_size=Config.RESULT_CACHE_MEMORY_SIZE,
+            disk_size=Config.RESULT_CACHE_DISK_SIZE,
+            directory=Config.RESULT_CACHE_DIR)
+
+        self.work_directories = WorkDirectories(
+            root=Config.WORK_DIR, max_usage=Config.WORK_DIR_MAX_USAGE)
+
+        self.job_store = JobStore(
+            ttl=Config.JOB_TTL, directory=Config.JOB_DIR,
+            release_directory=self.work_directories.release)
+
+        FormatFactory.register_formats(profile_template=Matoconv.PROFILE_TEMPLATE)
+        self.start_backends()
+
+        self.app.register_error_handler(
+            AdmissionRejectedError, self.handle_admission_rejected)
+        self.app.register_error_handler(
+            ConverterUnavailableError, self.handle_converter_unavailable)
+        for input_error in (InvalidInputError, UnknownFileTypeError, CannotDetectFileTypeError):
+            self.app.register_error_handler(input_error, self.handle_input_error)
+        self.app.config['MAX_CONTENT_LENGTH'] = Config.MAX_REQUEST_SIZE or None
+        self.app.before_request(self.check_request_size)
+        self.app.before_request(self.start_request_metrics)
+        self.app.after_request(self.record_request_metrics)
 
         @self.app.route('/convert/format/<dest_filetype>', methods=['POST'])
         def convert_file(dest_filetype: str):
             """Provide endpoint for converting files."""
+            self.set_request_labels(endpoint='convert')
 
             # Check valid destination format
             dest_format = FormatFactory.by_extension(dest_filetype)
             if dest_format is None:
                 flask.abort(404, 'Invalid destination file format')
+            self.set_request_labels(destination=dest_format.extension)
 
-            content_disp = flask.request.headers.get(
-                'Content-Disposition', None)
-            if not content_disp:
-                flask.abort(400, 'Missing Content-Disposition header')
+            return self.convert_request(
+                dest_format, page_range=self.get_page_range(), image_assets=self.get_image_assets())
 
-            with tempfile.TemporaryDirectory() as tempdir:
+        @self.app.route('/preview/format/<dest_filetype>', methods=['POST'])
+        def preview_file(dest_filetype: str):
+            """Provide endpoint for rendering a page of files as an image."""
+            self.set_request_labels(endpoint='preview')
 
-                conversion_details = ConversionDetails(
-                    content_disp_headers=content_disp,
-                    temp_directory=tempdir,
-                    dest_format=dest_format)
+            # Check valid image format
+            dest_format = FormatFactory.by_extension(dest_filetype)
+            if dest_format is None or not dest_format.image:
+                flask.abort(404, 'Invalid preview image format')
+            self.set_request_labels(destination=dest_format.extension)
+
+            try:
+                page = int(flask.request.args.get('page', 1))
+                width = int(flask.request.args.get('width', Config.PREVIEW_WIDTH))
+            except ValueError:
+                flask.abort(400, 'Invalid preview page or width')
+            if page < 1 or not 1 <= width <= Config.PREVIEW_MAX_WIDTH:
+                flask.abort(400, 'Invalid preview page or width')
+
+            # Only the page is converted, before being rendered
+            return self.convert_request(dest_format, page_range=PageRange(page, page), width=width)
+
+        @self.app.route('/convert/batch/format/<dest_filetype>', methods=['POST'])
+        def convert_batch(dest_filetype: str):
+            """Provide endpoint for converting many files in one request."""
+            self.set_request_labels(endpoint='batch')
 
-                with open(conversion_details.t_input_path, 'wb') as fh:
-                    fh.write(flask.request.get_data())
+            # Check valid destination format
+            dest_format = FormatFactory.by_extension(dest_filetype)
+            if dest_format is None:
+                flask.abort(404, 'Invalid destination file format')
+            self.set_request_labels(destination=dest_format.extension)
+
+            page_range = self.get_page_range()
+            with self.work_directories.directory() as tempdir:
 
-                t = self.converter_pool.apply_async(
-                    self.perform_conversion, (conversion_details, ))
+                try:
+                    batch_files = self.receive_batch(tempdir, dest_format, page_range)
+                except zipfile.BadZipFile:
+                    flask.abort(400, 'Invalid zip archive')
 
-                # Wait for pool taks to complete and obtain logs from
-                # response
-                conv_logs = t.get(timeout=Config.POOL_CONVERT_TIMEOUT)
+                if not batch_files:
+                    flask.abort(400, 'No files provided')
 
-                for log in conv_logs:
-                    Matoconv.log(log)
+                self.convert_batch_files(batch_files)
 
-                # Get response data
-                output_data = None
-                with open(conversion_details.t_output_path, 'rb') as fh:
-                    output_data = fh.read()
+                archive_path = os.path.join(tempdir, 'batch-output.zip')
+                write_archive(archive_path, batch_files)
 
-            # Create cusotm response to handle binary data from
-            # converted file
-            response = flask.make_response(output_data)
-            response.content_type = conversion_details.response_mime_type
+                response = self.make_entry_response(CacheEntry(None, path=archive_path))
 
-            # Add content disposition header for holding
-            # output filename.
+            response.content_type = 'application/zip'
             response.headers.set(
                 'Content-Disposition', 'attachment',
-                filename=conversion_details.ouptut_filename)
+                filename='converted.zip')
+
+            return response
+
+        @self.app.route('/jobs', methods=['POST'])
+        def create_job():
+            """Provide endpoint for starting conversion job, returning without waiting for it."""
+            self.set_request_labels(endpoint='jobs')
+
+            # Check valid destination format
+            dest_format = FormatFactory.by_extension(flask.request.args.get('format', ''))
+            if dest_format is None:
+                flask.abort(404, 'Invalid destination file format')
+            self.set_request_labels(destination=dest_format.extension)
+
+            content_disp = flask.request.headers.get(
+                'Content-Disposition', None)
+            if not content_disp:
+                flask.abort(400, 'Missing Content-Disposition header')
+
+            callback_url = flask.request.args.get('callback', None)
+            if callback_url and urllib.parse.urlparse(callback_url).scheme not in ('http', 'https'):
+                flask.abort(400, 'Invalid callback URL')
 
+            job = self.job_store.create(callback_url=callback_url)
+            try:
+                job.conversion_details = ConversionDetails(
+                    content_disp_headers=content_disp,
+                    temp_directory=job.directory,
+                    dest_format=dest_format,
+                    page_range=self.get_page_range(),
+                    image_assets=self.get_image_assets())
+
+                input_digest = self.receive_input(
+                    job.conversion_details, flask.request.stream)
+                self.check_input(job.conversion_details)
+                self.check_page_range(job.conversion_details)
+                self.check_image_assets(job.conversion_details)
+                self.set_request_labels(source=job.conversion_details.source_format.extension)
+
+                job.cache_key = ResultCache.make_key(
+                    input_digest=input_digest,
+                    source_format=job.conversion_details.source_format,
+                    destination_format=job.conversion_details.destination_format,
+                    options=job.conversion_details.options)
+
+                self.start_job(job)
+            except Exception:
+                self.job_store.remove(job.id)
+                raise
+
+            response = flask.make_response(flask.jsonify(job.to_dict()), 202)
+            response.headers['Location'] = flask.url_for('get_job', job_id=job.id)
+            return response
+
+        @self.app.route('/jobs/<job_id>', methods=['GET'])
+        def get_job(job_id: str):
+            """Provide endpoint for obtaining status of conversion job."""
+            job = self.job_store.get(job_id)
+            if job is None:
+                flask.abort(404, 'Unknown job')
+            return flask.jsonify(job.to_dict())
+
+        @self.app.route('/jobs/<job_id>/result', methods=['GET'])
+        def get_job_result(job_id: str):
+            """Provide endpoint for obtaining result of conversion job."""
+            job = self.job_store.get(job_id)
+            if job is None:
+                flask.abort(404, 'Unknown job')
+            if job.status != Job.DONE:
+                flask.abort(409, 'Job has not completed successfully')
+
+            response = self.make_entry_response(
+                CacheEntry(job.cache_key, path=job.conversion_details.t_output_path))
+            self.set_result_headers(response, job.conversion_details, job.cache_key)
             return response
 
+        @self.app.route('/metrics', methods=['GET'])
+        def metrics():
+            """Provide endpoint for metrics in Prometheus text format."""
+            return flask.Response(
+                self.metrics.render(),
+                content_type='text/plain; version=0.0.4; charset=utf-8')
+
+        @self.app.route('/health', methods=['GET'])
+        def health():
+            """Provide endpoint for health of converter backends."""
+            status = self.backend_health()
+            return flask.jsonify(status), 200 if all(status.values()) else 503
+
         @self.app.route('/', methods=['GET'])
         def index():  # pragma: no cover
             return flask.send_from_directory('static', 'index.html')
 
+    @staticmethod
+    def check_request_size():
+        """Reject requests with bodies larger than the maximum request size."""
+        if (Config.MAX_REQUEST_SIZE and flask.request.content_length and
+                flask.request.content_length > Config.MAX_REQUEST_SIZE):
+            flask.abort(413)
+
+    def convert_request(self, dest_format: Format, page_range: PageRange = None,
+                        width: int = None, image_assets: bool = False) -> flask.Response:
+        """Convert file of request body to destination format, responding with the result.
+
+        Where the converter backend writes output progressively, output is
+        streamed whilst it is converted.
+        Results are compressed using the content encoding accepted by the client,
+        if any, for formats which are compressible.
+        """
+        content_disp = flask.request.headers.get(
+            'Content-Disposition', None)
+        if not content_disp:
+            flask.abort(400, 'Missing Content-Disposition header')
+
+        with contextlib.ExitStack() as stack:
+            tempdir = stack.enter_context(self.work_directories.directory())
+
+            conversion_details = ConversionDetails(
+                content_disp_headers=content_disp,
+                temp_directory=tempdir,
+                dest_format=dest_format,
+                page_range=page_range,
+                width=width,
+                image_assets=image_assets)
+
+            input_digest = self.receive_input(
+                conversion_details, flask.request.stream)
+            self.check_input(conversion_details)
+            self.check_page_range(conversion_details)
+            self.check_image_assets(conversion_details)
+            self.set_request_labels(source=conversion_details.source_format.extension)
+            cache_key = ResultCache.make_key(
+                input_digest=input_digest,
+                source_format=conversion_details.source_format,
+                destination_format=conversion_details.destination_format,
+                options=conversion_details.options)
+
+            encoding = self.negotiate_encoding(conversion_details)
+
+            # Result is determined by the key, so clients holding
+            # the result do not need it to be converted again.
+            for etag in [cache_key, ResultCache.variant_key(cache_key, encoding) if encoding else None]:
+                if etag and flask.request.if_none_match.contains_weak(etag):
+                    response = flask.make_response('', 304)
+                    response.set_etag(etag)
+                    self.set_vary(response, conversion_details)
+                    return response
+
+            if self.streams_output(conversion_details):
+                conversion_details.progress = OutputProgress()
+            entry = self.convert_cached(conversion_details, cache_key)
+            if entry is None:
+                # Temporary directory is removed once output has been streamed
+                return self.make_progressive_response(conversion_details, cache_key, stack, encoding)
+
+            # Output file is opened before the temporary directory is
+            # removed, so remains readable until the response has been sent.
+            if encoding and self.entry_size(entry) >= Config.COMPRESSION_MIN_SIZE:
+                response = self.make_compressed_response(entry, cache_key, encoding)
+            else:
+                encoding = None
+                response = self.make_entry_response(entry)
+
+        self.set_result_headers(response, conversion_details, cache_key)
+        if encoding:
+            response.set_etag(ResultCache.variant_key(cache_key, encoding))
+        self.set_vary(response, conversion_details)
+        return response
+
+    @staticmethod
+    def negotiate_encoding(conversion_details: ConversionDetails) -> str:
+        """Return content encoding accepted by the client to compress results
+        of the conversion with, or None to send them uncompressed.
+        """
+        if not Config.COMPRESSION or not conversion_details.compressible:
+            return None
+        return flask.request.accept_encodings.best_match(compression.available_encodings())
+
+    @staticmethod
+    def set_vary(response: flask.Response, conversion_details: ConversionDetails):
+        """Mark response of conversion as varying by accepted encoding, if it may be compressed."""
+        if Config.COMPRESSION and conversion_details.compressible:
+            response.vary.add('Accept-Encoding')
+
+    @staticmethod
+    def entry_size(entry: CacheEntry) -> int:
+        """Return size of conversion result (bytes)."""
+        if entry.data is not None:
+            return len(entry.data)
+        return os.path.getsize(entry.path)
+
+    @staticmethod
+    def compress(chunks, encoding: str, flush: bool = False):
+        """Yield chunks compressed with the content encoding."""
+        return compression.compress(
+            chunks, encoding,
+            gzip_level=Config.COMPRESSION_GZIP_LEVEL,
+            brotli_quality=Config.COMPRESSION_BROTLI_QUALITY,
+            flush=flush)
+
+    def make_compressed_response(self, entry: CacheEntry, cache_key: str,
+                                 encoding: str) -> flask.Response:
+        """Create response for conversion result, compressed with the content encoding.
+
+        Compressed results are cached, so that each result is compressed once.
+        Results not already compressed are compressed whilst they are sent,
+        then cached once sent.
+        """
+        variant_key = ResultCache.variant_key(cache_key, encoding)
+        variant = self.result_cache.get(variant_key)
+        if variant is not None:
+            response = self.make_entry_response(variant)
+        else:
+            fh = open(entry.path, 'rb') if entry.data is None else None
+
+            def generate():
+                chunks = [entry.data] if fh is None else iter(
+                    lambda: fh.read(Config.STREAM_CHUNK_SIZE), b'')
+                try:
+                    with tempfile.NamedTemporaryFile(prefix='matoconv-compressed-') as variant_fh:
+                        for data in self.compress(chunks, encoding):
+                            variant_fh.write(data)
+                            yield data
+                        variant_fh.flush()
+                        self.result_cache.put(variant_key, variant_fh.name)
+                finally:
+                    if fh is not None:
+                        fh.close()
+
+            response = flask.Response(generate())
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    @staticmethod
+    def streams_output(conversion_details: ConversionDetails) -> bool:
+        """Return whether output of conversion may be written progressively,
+        as it is converted by a single backend which supports streaming.
+        Archives of documents and their images are written once converted.
+        """
+        if conversion_details.image_assets:
+            return False
+        route = FormatFactory.find_route(
+            conversion_details.source_format, conversion_details.destination_format)
+        return bool(route) and len(route) == 1 and FormatFactory.backend(
+            route[0].backend).supports_streaming(route[0].source, route[0].destination)
+
+    def make_progressive_response(self, conversion_details: ConversionDetails, cache_key: str,
+                                  stack: contextlib.ExitStack, encoding: str = None) -> flask.Response:
+        """Create response streaming output of conversion whilst it is written,
+        compressed with the content encoding, if provided.
+
+        Once the conversion has finished, the result is cached, if it succeeded,
+        and the contexts of stack, such as the temporary directory, are exited.
+        Should the conversion fail, the response is truncated, so no ETag is set.
+        """
+        try:
+            # Output file is opened before it may be removed by a failed conversion
+            fh = open(conversion_details.t_output_path, 'rb')
+        except OSError:
+            self.result_cache.release(cache_key)
+            raise
+        cleanup = stack.pop_all()
+
+        def on_close():
+            for log in conversion_details.progress.logs:
+                Matoconv.log(log)
+            try:
+                if not conversion_details.progress.logs:
+                    self.result_cache.put(cache_key, conversion_details.t_output_path)
+            finally:
+                self.result_cache.release(cache_key)
+                cleanup.close()
+
+        stream = ProgressiveStream(
+            conversion_details.progress, fh, Config.STREAM_CHUNK_SIZE, on_close)
+        if encoding:
+            # Each part is flushed, so that it reaches the client as it is written
+            response = flask.Response(ClosingIterator(
+                self.compress(stream, encoding, flush=True), stream.close))
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response = flask.Response(stream)
+        self.set_vary(response, conversion_details)
+        response.content_type = conversion_details.response_mime_type
+        response.headers.set(
+            'Content-Disposition', 'attachment',
+            filename=conversion_details.ouptut_filename)
+        return response
+
+    @staticmethod
+    def receive_input(conversion_details: ConversionDetails, stream) -> str:
+        """Stream input to the temporary input file, returning its hash.
+
+        Input without a declared length, such as chunked request bodies, is
+        limited to the maximum request size as it is read.
+        """
+        input_hash = hashlib.sha256()
+        size = 0
+        with open(conversion_details.t_input_path, 'wb') as fh:
+            while True:
+                chunk = stream.read(Config.STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if Config.MAX_REQUEST_SIZE and size > Config.MAX_REQUEST_SIZE:
+                    flask.abort(413)
+                input_hash.update(chunk)
+                fh.write(chunk)
+        return input_hash.hexdigest()
+
+    @staticmethod
+    def check_input(conversion_details: ConversionDetails):
+        """Check received input file matches its source format and is within
+        limits of the format, detecting the source format if it is not known.
+
+        Invalid input is rejected before being queued for conversion.
+        """
+        size = os.path.getsize(conversion_details.t_input_path)
+        conversion_details.input_size = size
+        if not Config.PREFLIGHT and conversion_details.source_format is not None:
+            return
+
+        source_format = conversion_details.source_format
+        max_pages = Config.format_limit(
+            'PREFLIGHT_MAX_PAGES', source_format.extension) if source_format else 0
+        info = preflight.inspect(
+            conversion_details.t_input_path, size,
+            count_pages=bool(max_pages or conversion_details.page_range))
+
+        if source_format is None:
+            source_format = FormatFactory.by_extension(info.extension)
+            if source_format is None:
+                raise CannotDetectFileTypeError('Cannot detect input file type')
+            conversion_details.detect_source_format(source_format)
+            if not Config.PREFLIGHT:
+                return
+            max_pages = Config.format_limit('PREFLIGHT_MAX_PAGES', source_format.extension)
+        elif info.extension != source_format.extension:
+            raise InvalidInputError(
+                'File content does not match {} format'.format(source_format.extension),
+                status_code=415)
+
+        max_size = Config.format_limit('PREFLIGHT_MAX_SIZE', source_format.extension)
+        if max_size and size > max_size:
+            raise InvalidInputError(
+                'File exceeds maximum size of {} bytes'.format(max_size), status_code=413)
+        if info.pages is None:
+            return
+        pages = info.pages
+        if conversion_details.page_range is not None:
+            # Only pages within the range are converted
+            pages = conversion_details.page_range.count(info.pages)
+            if not pages:
+                raise InvalidInputError(
+                    'Page range is beyond the {} pages of the document'.format(info.pages),
+                    status_code=422)
+        conversion_details.pages = pages
+        if max_pages and pages > max_pages:
+            raise InvalidInputError(
+                'Document exceeds maximum of {} pages'.format(max_pages), status_code=413)
+
+    @staticmethod
+    def get_page_range() -> PageRange:
+        """Return range of pages to convert from pages request parameter, or None."""
+        pages = flask.request.args.get('pages', '')
+        return PageRange.parse(pages) if pages else None
+
+    @staticmethod
+    def get_image_assets() -> bool:
+        """Return whether images are to be output as separate files, from images request parameter."""
+        images = flask.request.args.get('images', 'inline')
+        if images not in ('inline', 'separate'):
+            raise InvalidInputError('Invalid images option: ' + images, status_code=400)
+        return images == 'separate'
+
+    @staticmethod
+    def page_range_step(route: list, page_range: PageRange) -> int:
+        """Return index of the first conversion of route whose backend
+        converts only the pages within page_range, or None if there is none.
+
+        Later conversions convert all pages of the output of that conversion.
+        """
+        for index, conversion in enumerate(route):
+            if FormatFactory.backend(conversion.backend).supports_page_range(
+                    conversion.source, conversion.destination):
+                return index
+        return None
+
+    @staticmethod
+    def check_page_range(conversion_details: ConversionDetails):
+        """Reject conversion with a page range if it cannot be applied by any
+        conversion of the route between its formats.
+        """
+        if conversion_details.page_range is None:
+            return
+        route = FormatFactory.find_route(
+            conversion_details.source_format, conversion_details.destination_format)
+        if route and Matoconv.page_range_step(route, conversion_details.page_range) is None:
+            raise InvalidInputError(
+                'Page ranges are not supported for conversion from {} to {}'.format(
+                    conversion_details.source_format.extension,
+                    conversion_details.destination_format.extension),
+                status_code=400)
+
+    @staticmethod
+    def get_admission_request(conversions: list, default_priority: str) -> AdmissionRequest:
+        """Return admission request for conversion details of conversions, with their
+        expected duration, and priority class and tenant from request headers.
+        """
+        priority = flask.request.headers.get('X-Priority', default_priority)
+        if priority not in AdmissionRequest.PRIORITIES:
+            raise InvalidInputError('Invalid priority: ' + priority, status_code=400)
+        cost = 0
+        for conversion_details in conversions:
+            route = FormatFactory.find_route(
+                conversion_details.source_format, conversion_details.destination_format)
+            if route:
+                cost += FormatFactory.estimate_duration(route, conversion_details.work_units)
+        return AdmissionRequest(
+            cost=cost, priority=priority, tenant=flask.request.headers.get('X-Tenant', ''))
+
+    @staticmethod
+    def check_image_assets(conversion_details: ConversionDetails):
+        """Reject conversion outputting images as separate files if the backend
+        of the last conversion of the route between its formats cannot do so.
+        """
+        if not conversion_details.image_assets:
+            return
+        route = FormatFactory.find_route(
+            conversion_details.source_format, conversion_details.destination_format)
+        if route and not FormatFactory.backend(route[-1].backend).supports_image_assets(
+                route[-1].source, route[-1].destination):
+            raise InvalidInputError(
+                'Separate images are not supported for conversion from {} to {}'.format(
+                    conversion_details.source_format.extension,
+                    conversion_details.destination_format.extension),
+                status_code=400)
+
+    @staticmethod
+    def make_entry_response(entry: CacheEntry) -> flask.Response:
+        """Create response for conversion result.
+
+        Results held on disk are streamed from the file, using the
+        server's file wrapper (e.g. sendfile), where available.
+        """
+        if entry.data is not None:
+            return flask.make_response(entry.data)
+
+        fh = open(entry.path, 'rb')
+        response = flask.Response(
+            wrap_file(flask.request.environ, fh, Config.STREAM_CHUNK_SIZE),
+            direct_passthrough=True)
+        response.content_length = os.fstat(fh.fileno()).st_size
+        return response
+
+    @staticmethod
+    def set_result_headers(response: flask.Response,
+                           conversion_details: ConversionDetails, cache_key: str):
+        """Set headers of response containing conversion result."""
+        response.content_type = conversion_details.response_mime_type
+        response.set_etag(cache_key)
+
+        # Add content disposition header for holding
+        # output filename.
+        response.headers.set(
+            'Content-Disposition', 'attachment',
+            filename=conversion_details.ouptut_filename)
+
+        # Report outcome of each attempt, for results that were converted
+        if conversion_details.attempts:
+            response.headers['X-Conversion-Attempts'] = ', '.join(conversion_details.attempts)
+
+    @staticmethod
+    def handle_admission_rejected(exc: AdmissionRejectedError) -> flask.Response:
+        """Respond to rejected conversions, with time after which to retry."""
+        response = flask.make_response(str(exc), 429)
+        response.headers['Retry-After'] = str(exc.retry_after)
+        return response
+
+    @staticmethod
+    def handle_converter_unavailable(exc: ConverterUnavailableError) -> flask.Response:
+        """Respond to conversions rejected by circuit breaker, with time after which to retry."""
+        response = flask.make_response(str(exc), 503)
+        response.headers['Retry-After'] = str(exc.retry_after)
+        return response
+
+    @staticmethod
+    def handle_input_error(exc: MatoconvException) -> flask.Response:
+        """Respond to unsupported or invalid input with a client error."""
+        status_code = exc.status_code if isinstance(exc, InvalidInputError) else 415
+        return flask.make_response(str(exc), status_code)
+
+    @staticmethod
+    def set_request_labels(**labels):
+        """Set metric labels of current conversion request."""
+        if 'metrics_labels' not in flask.g:
+            flask.g.metrics_labels = {'endpoint': None, 'source': 'unknown', 'destination': 'unknown'}
+        flask.g.metrics_labels.update(labels)
+
+    @staticmethod
+    def start_request_metrics():
+        """Store start time of request."""
+        flask.g.request_started = time.monotonic()
+
+    def record_request_metrics(self, response: flask.Response) -> flask.Response:
+        """Record metrics of conversion requests."""
+        labels = flask.g.pop('metrics_labels', None)
+        if labels is not None:
+            self.metrics.requests.inc(status=response.status_code, **labels)
+            self.metrics.request_duration.observe(
+                time.monotonic() - flask.g.request_started, **labels)
+        return response
+
+    @staticmethod
+    def format_labels(conversion_details: ConversionDetails) -> dict:
+        """Return metric labels for formats of conversion."""
+        return {
+            'source': conversion_details.source_format.extension,
+            'destination': conversion_details.destination_format.extension
+        }
+
+    @staticmethod
+    def run_task(func, args: tuple):
+        """Run conversion function in converter slot, returning its logs and task statistics."""
+        stats = TaskStats()
+        stats.started_at = time.monotonic()
+        logs = func(*args, stats=stats)
+        stats.finished_at = time.monotonic()
+        return logs, stats
+
+    @staticmethod
+    def attempt_outcome(stats: TaskStats) -> str:
+        """Return outcome of conversion attempt, from its statistics."""
+        if not stats.failures:
+            return 'succeeded'
+        return 'timeout' if stats.timeouts else 'failed'
+
+    def check_converter_available(self, conversion_details: ConversionDetails):
+        """Reject conversion if the circuit breaker of its formats is open."""
+        breaker = self.retries.breaker(**self.format_labels(conversion_details))
+        if not breaker.allow():
+            raise ConverterUnavailableError(
+                'Conversions from {source} to {destination} are failing'.format(
+                    **self.format_labels(conversion_details)),
+                retry_after=breaker.retry_after())
+
+    def submit_conversion(self, func, args: tuple, conversion_details: ConversionDetails,
+                          queued_at: float, callback=None, attempts: list = None,
+                          admission_request: AdmissionRequest = None):
+        """Submit admitted conversion to the scheduler, releasing its slot once finished.
+
+        Failed attempts are retried by the scheduler, within the retry budget of the
+        formats of conversion_details, and whilst their circuit breaker is closed.
+        The slot is released whilst waiting to retry.
+        The outcome of each attempt is added to attempts, if provided.
+
+        Metrics of the task are recorded against the formats of conversion_details,
+        with the time it waited measured from queued_at.
+        The result of the task is its logs and statistics. The callback is
+        called with the logs.
+        """
+        labels = self.format_labels(conversion_details)
+        budget = self.retries.budget(**labels)
+        breaker = self.retries.breaker(**labels)
+        budget.record_request()
+        if attempts is None:
+            attempts = []
+
+        def run_attempt(func, args: tuple):
+            logs, stats = self.run_task(func, args)
+            outcome = self.attempt_outcome(stats)
+            attempts.append(outcome)
+            breaker.record(outcome == 'succeeded')
+            return logs, stats
+
+        def should_retry(result):
+            logs, stats = result
+            if not stats.failures or not breaker.allow() or not budget.try_spend():
+                return False
+            # Output already streamed cannot be converted again
+            if conversion_details.progress is not None and conversion_details.progress.streaming:
+                return False
+            # Only the final attempt is observed once finished, so
+            # record events of retried attempts now.
+            self.metrics.retries.inc(**labels)
+            if stats.timeouts:
+                self.metrics.timeouts.inc(stats.timeouts, **labels)
+            for log in logs:
+                self.app.logger.error(log)
+            self.app.logger.error('Retrying conversion after attempt {}: {}'.format(
+                len(attempts), attempts[-1]))
+            return True
+
+        def release():
+            self.admission.release(admission_request)
+
+        def reacquire():
+            self.admission.readmit(admission_request)
+
+        def on_result(result):
+            release()
+            logs, stats = result
+            self.metrics.observe_task(queued_at=queued_at, stats=stats, **labels)
+            if callback:
+                callback(logs)
+
+        def on_error(exc):
+            release()
+            self.metrics.failures.inc(**labels)
+            if callback:
+                callback([str(exc)])
+
+        return self.scheduler.submit(
+            run_attempt, (func, args), callback=on_result, error_callback=on_error,
+            retry_policy=self.retries.policy, should_retry=should_retry,
+            release=release, reacquire=reacquire)
+
+    def wait_task(self, t, timeout: int, conversion_details: ConversionDetails) -> list:
+        """Wait for conversion task, returning its logs.
+
+        Tasks which have not started by the timeout are cancelled.
+        """
+        try:
+            logs, _ = t.get(timeout=timeout)
+        except TimeoutError:
+            t.cancel()
+            self.metrics.timeouts.inc(**self.format_labels(conversion_details))
+            raise
+        return logs
+
+    def start_job(self, job: Job):
+        """Start conversion of job in the scheduler, using cached result if available.
+
+        Jobs are queued for admission without a maximum wait, which
+        is performed in the background.
+        """
+        entry = self.result_cache.get(job.cache_key)
+        if entry is not None:
+            # Copy result to job directory, so that it remains available
+            # if evicted from the cache
+            if entry.data is not None:
+                with open(job.conversion_details.t_output_path, 'wb') as fh:
+                    fh.write(entry.data)
+            else:
+                shutil.copyfile(entry.path, job.conversion_details.t_output_path)
+            self.finish_job(job, [])
+            return
+
+        self.check_converter_available(job.conversion_details)
+        admission_request = self.admission.enqueue(
+            self.get_admission_request([job.conversion_details], AdmissionRequest.BATCH))
+        threading.Thread(
+            target=self.submit_job, args=(job, time.monotonic(), admission_request), daemon=True).start()
+
+    def submit_job(self, job: Job, queued_at: float, admission_request: AdmissionRequest):
+        """Wait for converter slot and submit conversion of queued job."""
+        self.admission.wait(admission_request, limit_wait=False)
+        self.submit_conversion(
+            self.perform_conversion, (job.conversion_details, ),
+            conversion_details=job.conversion_details, queued_at=queued_at,
+            callback=lambda logs: self.finish_job(job, logs),
+            attempts=job.conversion_details.attempts,
+            admission_request=admission_request)
+
+    def finish_job(self, job: Job, logs: list):
+        """Mark job as finished, storing its result and notifying callback URL."""
+        for log in logs:
+            Matoconv.log(log)
+
+        output_path = job.conversion_details.t_output_path
+        if os.path.isfile(output_path):
+            self.result_cache.put(job.cache_key, output_path)
+            job.finish()
+        else:
+            job.finish(error='Conversion failed')
+
+        if job.callback_url:
+            threading.Thread(target=self.send_job_callback, args=(job, ), daemon=True).start()
+
+    @staticmethod
+    def send_job_callback(job: Job):
+        """Notify callback URL of job completion."""
+        try:
+            job.send_callback(timeout=Config.JOB_CALLBACK_TIMEOUT)
+        except (OSError, ValueError) as exc:
+            Matoconv.log('Unable to send callback for job {}: {}'.format(job.id, str(exc)))
+
+    def convert_cached(self, conversion_details: ConversionDetails,
+                       cache_key: str) -> CacheEntry:
+        """Return conversion result from cache, performing conversion if not cached.
+
+        If an identical conversion is already in progress, wait for its result
+        rather than converting again.
+
+        If the conversion has progress and its output is partially written before
+        it finishes, None is returned, leaving the output to be streamed, and
+        the result to be cached once it has finished.
+        """
+        while True:
+            entry = self.result_cache.get(cache_key)
+            if entry is not None:
+                return entry
+            if self.result_cache.wait_or_lead(cache_key, timeout=Config.POOL_CONVERT_TIMEOUT):
+                break
+
+        streaming = False
+        try:
+            self.check_converter_available(conversion_details)
+            queued_at = time.monotonic()
+            admission_request = self.admission.acquire(
+                self.get_admission_request([conversion_details], AdmissionRequest.INTERACTIVE))
+            progress = conversion_details.progress
+            t = self.submit_conversion(
+                self.perform_conversion, (conversion_details, ),
+                conversion_details=conversion_details, queued_at=queued_at,
+                attempts=conversion_details.attempts,
+                callback=progress.finish if progress is not None else None,
+                admission_request=admission_request)
+
+            timeout = Config.POOL_CONVERT_TIMEOUT
+            if progress is not None:
+                deadline = time.monotonic() + timeout
+                if progress.wait_streaming(timeout):
+                    streaming = True
+                    return None
+                timeout = max(0, deadline - time.monotonic())
+
+            # Wait for conversion task to complete and obtain logs from
+            # response
+            conv_logs = self.wait_task(t, timeout, conversion_details)
+
+            for log in conv_logs:
+                Matoconv.log(log)
+
+            self.result_cache.put(cache_key, conversion_details.t_output_path)
+
+            return CacheEntry(cache_key, path=conversion_details.t_output_path)
+        finally:
+            # Streamed results are released once the conversion has finished
+            if not streaming:
+                self.result_cache.release(cache_key)
+
+    def receive_batch(self, temp_directory: str, dest_format: Format,
+                      page_range: PageRange = None) -> list:
+        """Store each file of batch request in the temporary directory,
+        converting only pages within page_range, if provided.
+        """
+        batch_files = []
+        uploads = iter_uploads(
+            flask.request, os.path.join(temp_directory, 'batch-input.zip'),
+            Config.STREAM_CHUNK_SIZE)
+        for index, (filename, stream) in enumerate(uploads):
+            if index >= Config.BATCH_MAX_FILES:
+                flask.abort(400, 'Too many files in batch')
+
+            batch_file = BatchFile(filename)
+            batch_files.append(batch_file)
+            try:
+                conversion_details = ConversionDetails(
+                    content_disp_headers='attachment; filename="{}"'.format(filename),
+                    temp_directory=temp_directory,
+                    dest_format=dest_format,
+                    t_extless_filename='conversion-{}'.format(index),
+                    page_range=page_range)
+                input_digest = self.receive_input(conversion_details, stream)
+                self.check_input(conversion_details)
+                self.check_page_range(conversion_details)
+            except MatoconvException as exc:
+                batch_file.error = str(exc)
+                continue
+
+            batch_file.conversion_details = conversion_details
+            batch_file.cache_key = ResultCache.make_key(
+                input_digest=input_digest,
+                source_format=conversion_details.source_format,
+                destination_format=conversion_details.destination_format,
+                options=conversion_details.options)
+        return batch_files
+
+    @staticmethod
+    def group_batch(batch_files: list) -> list:
+        """Split files into groups, by source format, that can share a conversion."""
+        groups = {}
+        for batch_file in batch_files:
+            groups.setdefault(
+                batch_file.conversion_details.source_format.extension, []).append(batch_file)
+        return [
+            group[i:i + Config.BATCH_GROUP_SIZE]
+            for group in groups.values()
+            for i in range(0, len(group), Config.BATCH_GROUP_SIZE)
+        ]
+
+    def convert_batch_files(self, batch_files: list):
+        """Convert files of batch, using cached results where available.
+
+        Each group of files is converted by a single conversion task.
+        """
+        pending = []
+        for batch_file in batch_files:
+            if batch_file.conversion_details is None:
+                continue
+            batch_file.entry = self.result_cache.get(batch_file.cache_key)
+            if batch_file.entry is None:
+                pending.append(batch_file)
+
+        tasks = []
+        queued_at = time.monotonic()
+        for group in self.group_batch(pending):
+            try:
+                self.check_converter_available(group[0].conversion_details)
+                admission_request = self.admission.acquire(self.get_admission_request(
+                    [batch_file.conversion_details for batch_file in group], AdmissionRequest.BATCH))
+            except (AdmissionRejectedError, ConverterUnavailableError) as exc:
+                # Reject request if no files have been admitted
+                if not tasks:
+                    raise
+                for batch_file in group:
+                    batch_file.error = str(exc)
+                continue
+            # Files of the group share the attempts of its conversion
+            attempts = []
+            for batch_file in group:
+                batch_file.conversion_details.attempts = attempts
+            tasks.append((group, self.submit_conversion(
+                self.perform_batch_conversion,
+                ([batch_file.conversion_details for batch_file in group], ),
+                conversion_details=group[0].conversion_details, queued_at=queued_at,
+                attempts=attempts, admission_request=admission_request)))
+
+        for group, t in tasks:
+            try:
+                conv_logs = self.wait_task(
+                    t, Config.POOL_CONVERT_TIMEOUT * len(group), group[0].conversion_details)
+            except TimeoutError:
+                for batch_file in group:
+                    batch_file.error = 'Conversion timed out'
+                continue
+
+            for log in conv_logs:
+                Matoconv.log(log)
+
+            for batch_file in group:
+                output_path = batch_file.conversion_details.t_output_path
+                if not os.path.isfile(output_path):
+                    batch_file.error = 'Conversion failed'
+                    continue
+                self.result_cache.put(batch_file.cache_key, output_path)
+                batch_file.entry = CacheEntry(batch_file.cache_key, path=output_path)
+
     def __del__(self):
-        """Close threading pool."""
-        self.converter_pool.close()
-        self.converter_pool.terminate()
+        """Stop converter scheduler and backends."""
+        self.scheduler.stop()
+        for backend in FormatFactory.BACKENDS.values():
+            backend.stop()
+
+    def start_backends(self):
+        """Start converter backends, warning of any unable to perform conversions."""
+        for backend in FormatFactory.BACKENDS.values():
+            backend.start()
+        for name, healthy in self.backend_health().items():
+            if not healthy:
+                self.app.logger.warning(
+                    'Converter backend {} is unable to perform conversions'.format(name))
+
+    @staticmethod
+    def backend_health() -> dict:
+        """Return whether each converter backend is able to perform conversions."""
+        return {name: backend.is_healthy() for name, backend in FormatFactory.BACKENDS.items()}
 
     @staticmethod
     def log(msg: str):
@@ -357,120 +1681,153 @@ class Matoconv(object):
 
         return Matoconv.INSTANCE
 
+    def build_profile_template(self):
+        """Build LibreOffice profile template, once per process."""
+        if Matoconv.PROFILE_TEMPLATE is not None or not Config.PROFILE_TEMPLATE:
+            return
+
+        template_path = Config.PROFILE_TEMPLATE_DIR
+        if not template_path:
+            template_path = tempfile.mkdtemp(prefix='matoconv-profile-template-')
+            atexit.register(shutil.rmtree, template_path, True)
+
+        template = ProfileTemplate(
+            path=template_path,
+            clone_mode=Config.PROFILE_CLONE_MODE,
+            build_timeout=Config.PROFILE_BUILD_TIMEOUT)
+        try:
+            duration = template.build()
+        except ProfileTemplateError as exc:
+            self.app.logger.error(
+                str(exc) + ', conversions will create their own profile')
+            return
+
+        self.app.logger.warning(
+            'Built LibreOffice profile template in {:.2f}s'.format(duration))
+        Matoconv.PROFILE_TEMPLATE = template
+
     @staticmethod
-    def get_conversion_command(conversion_details: ConversionDetails):
-        """Generate conversion command based on"""
-        callback = None
-        cmd = None
-        # Copy current environment variables
-        env = dict(os.environ)
-
-        if (conversion_details.source_format.extension == 'pdf' and
-                conversion_details.destination_format.extension == 'html'):
-            def callback(logs):
-                """Callback to rename output file"""
-                def gen_base64_img(match):
-                    fn = conversion_details.temp_directory + \
-                        '/' + match.groups()[0]
-                    logs.append('Converting file:' + fn)
-                    if os.path.isfile(fn):
-                        return 'src="data:' + mimetypes.guess_type(fn)[0] + ';base64,' + base64.b64encode(open(fn, 'rb').read()).decode('ascii') + '"'
-                    return match.group()
-
-                if os.path.isfile(conversion_details.t_extless_path + '-html.html'):
-                    with open(conversion_details.t_extless_path + '-html.html', 'r', encoding='latin-1') as fin:
-                        with open(conversion_details.t_extless_path + '.html', 'w', encoding='latin-1') as fout:
-                            while True:
-                                line = fin.readline()
-                                if not line:
-                                    break
-                                fout.write(
-                                    re.sub(r'src="(.*?)"', gen_base64_img, line) + '\n')
-
-            # Use pdftohtml command for pdf to HTML conversion
-            cmd = [
-                'timeout', str(Config.EXECUTION_TIMEOUT) + 's',
-                'pdftohtml',
-                '-nomerge',
-                '-s',
-                '-c',
-                conversion_details.t_input_path
-            ]
-        else:
-            # Generate default command using libreoffice
-            # Create argument for input filter, if one has been specified for the given
-            # input format
-            input_filter = (['--infilter=' + conversion_details.source_format.input_filter]
-                            if conversion_details.source_format.input_filter else [])
-
-            cmd = [
-                'timeout', str(Config.EXECUTION_TIMEOUT) + 's',
-                'soffice',
-                '--headless',
-                '--convert-to', conversion_details.destination_format.output_filter,
-            ] + input_filter + [
-                '-env:UserInstallation=file://' + conversion_details.temp_directory,
-                '--writer',
-                '--nocrashreport',
-                '--nodefault',
-                '--nofirststartwizard',
-                '--nologo',
-                '--norestore',
-                conversion_details.t_input_path
-            ]
-        return cmd, env, callback
-
-    @staticmethod
-    def perform_conversion(conversion_details: ConversionDetails):
-        """Using libreoffice, convert file to destination format."""
+    def perform_batch_conversion(batch: list, stats: TaskStats = None):
+        """Convert files sharing formats and a temporary directory.
+
+        Where the backend supports it, all files are converted by a single run.
+        Any files not converted by it are then converted individually.
+        Files converted by a previous attempt are not converted again.
+        """
         logs = []
-        try:
-            attempts = 0
-            return_logs = False
-
-            cmd, env, callback = Matoconv.get_conversion_command(
-                conversion_details)
-
-            while attempts < Config.MAX_ATTEMPTS:
-                logs.append('Running cmd:')
-                logs.append(cmd)
-                p = subprocess.Popen(
-                    cmd,
-                    stderr=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    cwd=conversion_details.temp_directory,
-                    env=env)
-
-                # Capture response code, stdout and stderr
-                rc = p.wait()
-                logs.append('Got RC ' + str(rc))
-                logs.append(p.stdout.read().decode(
-                    'utf8', errors='backslashreplace').replace('\r', ''))
-                logs.append(p.stderr.read().decode(
-                    'utf8', errors='backslashreplace').replace('\r', ''))
-
-                if callback:
-                    callback(logs)
-
-                # If libreoffice returned ok status code and
-                # the output file was created, break from loop
-                if not rc and os.path.isfile(conversion_details.t_output_path):
-                    break
-                else:
+        return_logs = False
+        batch = [
+            conversion_details for conversion_details in batch
+            if not os.path.isfile(conversion_details.t_output_path)
+        ]
+        if not batch:
+            return logs
+        route = FormatFactory.find_route(batch[0].source_format, batch[0].destination_format)
+        if len(batch) > 1 and route and len(route) == 1:
+            usage_count = len(batch[0].process_usage)
+            try:
+                rc = FormatFactory.backend(route[0].backend).convert_batch(batch, logs)
+                if rc:
+                    return_logs = True
+                if rc == Matoconv.TIMEOUT_RC and stats is not None:
+                    stats.timeouts += 1
+            except Exception as exc:
+                logs.append(str(exc))
+                return_logs = True
+            if stats is not None:
+                stats.add_usage(batch[0].process_usage[usage_count:])
+
+        for conversion_details in batch:
+            if not os.path.isfile(conversion_details.t_output_path):
+                conversion_logs = Matoconv.perform_conversion(conversion_details, stats=stats)
+                if conversion_logs:
+                    logs += conversion_logs
                     return_logs = True
 
+        # Only return logs if an error occured
+        return logs if return_logs else []
+
+    @staticmethod
+    def perform_conversion(conversion_details: ConversionDetails, stats: TaskStats = None):
+        """Convert file to destination format, using the cheapest route of conversions.
+
+        The duration of each conversion step is recorded, to select future routes.
+        Timeouts and failures are counted in stats, if provided. Failed conversions
+        are retried by the scheduler, so each call makes a single attempt.
+        """
+        if stats is None:
+            stats = TaskStats()
+        route = FormatFactory.find_route(
+            conversion_details.source_format, conversion_details.destination_format)
+        if not route:
+            stats.failures += 1
+            return ['No conversion available from {} to {}'.format(
+                conversion_details.source_format.extension,
+                conversion_details.destination_format.extension)]
+
+        page_range_step = None
+        if conversion_details.page_range is not None:
+            page_range_step = Matoconv.page_range_step(route, conversion_details.page_range)
+            if page_range_step is None:
+                stats.failures += 1
+                return ['No conversion from {} to {} supports page ranges'.format(
+                    conversion_details.source_format.extension,
+                    conversion_details.destination_format.extension)]
+
+        logs = []
+        for index, conversion in enumerate(route):
+            if len(route) == 1:
+                step_details = conversion_details
+            else:
+                # Only a single step converts the page range, and the last step
+                # renders images and bundles them
+                step_details = conversion_details.step(
+                    conversion,
+                    page_range=conversion_details.page_range if index == page_range_step else None,
+                    width=conversion_details.width if index == len(route) - 1 else None,
+                    image_assets=conversion_details.image_assets and index == len(route) - 1)
+            started_at = time.monotonic()
+            step_logs, converted = Matoconv.perform_conversion_step(
+                step_details, FormatFactory.backend(conversion.backend), stats)
+            logs += step_logs
+            if not converted:
+                break
+            # Conversions of page ranges are not representative of full conversions
+            if step_details.page_range is None:
+                FormatFactory.observe_conversion(
+                    conversion, time.monotonic() - started_at, units=conversion_details.work_units)
+        return logs
+
+    @staticmethod
+    def perform_conversion_step(conversion_details: ConversionDetails,
+                                backend: backends.ConverterBackend, stats: TaskStats):
+        """Convert file to destination format of conversion details, using the backend.
+
+        Returns logs, if an error occurred, and whether the file was converted.
+        """
+        logs = []
+        converted = False
+        usage_count = len(conversion_details.process_usage)
+        try:
+            rc = backend.convert(conversion_details, logs)
+
+            # Conversion succeeded if the backend returned ok
+            # status code and the output file was created
+            converted = not rc and os.path.isfile(conversion_details.t_output_path)
+            if not converted:
+                stats.failures += 1
+                if rc == Matoconv.TIMEOUT_RC:
+                    stats.timeouts += 1
+
                 # Remove output file if it was generated
                 if os.path.isfile(conversion_details.t_output_path):
                     os.unlink(conversion_details.t_output_path)
 
-                time.sleep(Config.RETRY_WAIT_PERIOD)
-
-                attempts += 1
         except Exception as exc:
             # Add exception string to list of logs to be returned
             logs.append(str(exc))
-            return_logs = True
+            stats.failures += 1
+        stats.add_usage(conversion_details.process_usage[usage_count:])
 
-        finally:
-            # Only return logs if an error occured
-            return logs if return_logs else []
+        # Only return logs if an error occured
+        return (logs if not converted else []), converted
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""Admission control in front of the converter scheduler."""
+
+import collections
+import fcntl
+import math
+import os
+import threading
+import time
+
+from matoconv.exceptions import AdmissionRejectedError
+
+
+def available_memory() -> int:
+    """Return memory available on the host (bytes), or None if unknown."""
+    try:
+        with open('/proc/meminfo', 'r') as fh:
+            for line in fh:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class SharedSlots(object):
+    """Converter slots shared by all server processes on the host.
+
+    Each slot is an exclusive lock on a file in the shared directory,
+    so slots held by a process are released should it exit.
+    """
+
+    def __init__(self, directory: str, slots: int):
+        """Setup member variables."""
+        self._paths: list = [
+            os.path.join(directory, 'slot-{}.lock'.format(index)) for index in range(slots)]
+        self._held: list = []
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        """Obtain a free slot, without waiting, returning whether one was obtained."""
+        with self._lock:
+            for path in self._paths:
+                fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    os.close(fd)
+                    continue
+                self._held.append(fd)
+                return True
+        return False
+
+    def release(self):
+        """Release a slot held by this process."""
+        with self._lock:
+            fd = self._held.pop()
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+class AdmissionRequest(object):
+    """Struct-like object for storing details of a conversion
+    waiting for a converter slot, used to order waiting conversions.
+    """
+
+    INTERACTIVE = 'interactive'
+    BATCH = 'batch'
+    PRIORITIES = (INTERACTIVE, BATCH)
+
+    def __init__(self, cost: float = 0, priority: str = INTERACTIVE, tenant: str = ''):
+        """Setup member variables."""
+        self._cost: float = cost
+        self._priority: str = priority
+        self._tenant: str = tenant
+        self.enqueued_at: float = None
+
+    @property
+    def cost(self) -> float:
+        """Return expected duration of conversion (seconds)."""
+        return self._cost
+
+    @property
+    def priority(self) -> str:
+        """Return priority class of conversion."""
+        return self._priority
+
+    @property
+    def tenant(self) -> str:
+        """Return key of tenant requesting conversion."""
+        return self._tenant
+
+
+class AdmissionController(object):
+    """Limit conversions to the number of converter slots, with a bounded queue.
+
+    Requests beyond the queue depth, or waiting longer than the maximum
+    queue wait, are rejected with the time after which a retry is
+    likely to be admitted.
+    Optionally, all requests are rejected whilst host load average is
+    above max_load or available memory is below min_memory.
+
+    If shared_slots is provided, slots are also obtained from it, limiting
+    conversions across all server processes, rather than just this one.
+
+    Waiting conversions are admitted in order of the fewest conversions of their
+    tenant already admitted, so that each tenant obtains a fair share of slots,
+    then of the shortest expected duration. Each second waited reduces the
+    expected duration by aging seconds, so that long conversions are not
+    starved, and batch conversions are ordered as if they had waited batch_delay
+    seconds less. reserved_slots are only used by interactive conversions.
+    """
+
+    # Period over which conversion completions are counted
+    # to determine the queue drain rate (seconds).
+    DRAIN_WINDOW = 60
+
+    # Interval at which shared slots are checked whilst waiting, as slots
+    # released by other processes cannot wake waiting conversions (seconds).
+    SHARED_SLOT_POLL_INTERVAL = 0.1
+
+    def __init__(self, slots: int, max_queue: int, max_wait: int,
+                 max_load: float = 0, min_memory: int = 0,
+                 shared_slots: SharedSlots = None, aging: float = 1,
+                 batch_delay: float = 0, reserved_slots: int = 0):
+        """Setup member variables."""
+        self._slots: int = slots
+        self._max_queue: int = max_queue
+        self._max_wait: int = max_wait
+        self._max_load: float = max_load
+        self._min_memory: int = min_memory
+        self._shared_slots: SharedSlots = shared_slots
+        self._aging: float = aging
+        self._batch_delay: float = batch_delay
+        self._reserved_slots: int = min(reserved_slots, slots - 1)
+
+        self._condition = threading.Condition()
+        self._active: int = 0
+        self._waiters: list = []
+        self._tenant_active = collections.Counter()
+        self._completions = collections.deque()
+
+    @property
+    def slots(self) -> int:
+        """Return number of converter slots."""
+        return self._slots
+
+    @property
+    def active(self) -> int:
+        """Return number of admitted conversions."""
+        return self._active
+
+    @property
+    def waiting(self) -> int:
+        """Return number of queued conversions."""
+        return len(self._waiters)
+
+    def _prune_completions(self, now: float):
+        """Remove completions older than the drain window."""
+        while self._completions and self._completions[0] < now - self.DRAIN_WINDOW:
+            self._completions.popleft()
+
+    def retry_after(self) -> int:
+        """Return estimated time for queue to drain (seconds)."""
+        with self._condition:
+            now = time.monotonic()
+            self._prune_completions(now)
+            if not self._completions:
+                return max(1, self._max_wait)
+            drain_rate = len(self._completions) / self.DRAIN_WINDOW
+            return max(1, math.ceil((len(self._waiters) + 1) / drain_rate))
+
+    def _reject(self, message: str):
+        """Raise rejection error, with estimated retry time."""
+        raise AdmissionRejectedError(message, retry_after=self.retry_after())
+
+    def _check_host(self):
+        """Reject conversion if host is overloaded."""
+        if self._max_load and os.getloadavg()[0] > self._max_load:
+            self._reject('Host load average is too high')
+        if self._min_memory:
+            memory = available_memory()
+            if memory is not None and memory < self._min_memory:
+                self._reject('Host available memory is too low')
+
+    def enqueue(self, request: AdmissionRequest = None) -> AdmissionRequest:
+        """Add conversion to queue, rejecting it if the queue is full or host is overloaded,
+        returning its request.
+
+        Must be followed by wait(), with the returned request.
+        """
+        request = request or AdmissionRequest()
+        self._check_host()
+        with self._condition:
+            if self._active + len(self._waiters) >= self._slots + self._max_queue:
+                full = True
+            else:
+                full = False
+                request.enqueued_at = time.monotonic()
+                self._waiters.append(request)
+        if full:
+            self._reject('Conversion queue is full')
+        return request
+
+    def _priority(self, request: AdmissionRequest, now: float) -> tuple:
+        """Return order of waiting request, lowest first."""
+        waited = now - request.enqueued_at
+        if request.priority == AdmissionRequest.BATCH:
+            waited -= self._batch_delay
+        return (self._tenant_active[request.tenant], request.cost - self._aging * waited)
+
+    def _next_waiter(self) -> AdmissionRequest:
+        """Return waiting request to admit to the next free slot, or None if there is none."""
+        if self._active >= self._slots:
+            return None
+        candidates = [
+            request for request in self._waiters
+            if request.priority == AdmissionRequest.INTERACTIVE or
+            self._active < self._slots - self._reserved_slots
+        ]
+        if not candidates:
+            return None
+        now = time.monotonic()
+        # Earlier requests are admitted first when of equal priority
+        return min(candidates, key=lambda request: self._priority(request, now))
+
+    def wait(self, request: AdmissionRequest, limit_wait: bool = True):
+        """Wait for queued conversion to obtain a converter slot.
+
+        Waits for up to the maximum queue wait, or indefinitely if limit_wait is False.
+        Once admitted, release() must be called with the request when the conversion finishes.
+        """
+        deadline = time.monotonic() + self._max_wait if limit_wait else None
+        with self._condition:
+            try:
+                while True:
+                    admitted = self._next_waiter() is request and (
+                        self._shared_slots is None or self._shared_slots.try_acquire())
+                    if admitted:
+                        self._active += 1
+                        self._tenant_active[request.tenant] += 1
+                        break
+
+                    timeout = None if deadline is None else deadline - time.monotonic()
+                    if timeout is not None and timeout <= 0:
+                        break
+                    if self._shared_slots is not None:
+                        timeout = min(timeout or self.SHARED_SLOT_POLL_INTERVAL,
+                                      self.SHARED_SLOT_POLL_INTERVAL)
+                    self._condition.wait(timeout)
+            finally:
+                self._waiters.remove(request)
+                # The next waiter may differ once this request has left the queue
+                self._condition.notify_all()
+        if not admitted:
+            self._reject('Timed out waiting for a converter')
+
+    def acquire(self, request: AdmissionRequest = None) -> AdmissionRequest:
+        """Queue conversion and wait for a converter slot, returning its request."""
+        request = self.enqueue(request)
+        self.wait(request)
+        return request
+
+    def readmit(self, request: AdmissionRequest = None):
+        """Wait for a converter slot, for a retry of an admitted conversion.
+
+        Retries are queued regardless of queue depth and wait indefinitely,
+        as the conversion has already been accepted. They keep the time they
+        were first queued, so are admitted ahead of conversions queued since.
+        """
+        request = request or AdmissionRequest()
+        with self._condition:
+            if request.enqueued_at is None:
+                request.enqueued_at = time.monotonic()
+            self._waiters.append(request)
+        self.wait(request, limit_wait=False)
+
+    def release(self, request: AdmissionRequest = None):
+        """Mark admitted conversion as finished, admitting the next queued conversion."""
+        request = request or AdmissionRequest()
+        with self._condition:
+            self._active -= 1
+            self._tenant_active[request.tenant] -= 1
+            if not self._tenant_active[request.tenant]:
+                del self._tenant_active[request.tenant]
+            if self._shared_slots is not None:
+                self._shared_slots.release()
+            now = time.monotonic()
+            self._completions.append(now)
+            self._prune_completions(now)
+            self._condition.notify_all()
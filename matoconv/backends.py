@@ -0,0 +1,584 @@
+# -*- coding: utf-8 -*-
+"""Converter backends, performing conversions between pairs of formats."""
+
+import concurrent.futures
+import json
+import os
+import shutil
+import time
+
+from matoconv.exceptions import MatoconvException, ProfileTemplateError
+from matoconv import office
+from matoconv import postprocess
+from matoconv import preflight
+from matoconv.supervisor import ProcessSupervisor, TIMEOUT_RC
+
+# Wildcard matching any format in routing tables
+ANY_FORMAT = '*'
+
+# Image formats, which documents are rendered to as previews
+IMAGE_FORMATS = ('png', 'jpeg')
+
+
+class ConverterBackend(object):
+    """Base class for converter backends.
+
+    Backends are created for each backend named by the routing table,
+    started before conversions are performed and stopped on shutdown.
+    Conversions are performed in converter slots, each converting a
+    file to the destination format of its conversion details, at
+    its output path.
+    """
+
+    NAME = None
+
+    # Estimated duration of conversions (seconds), until they have been measured.
+    COST = 1.0
+
+    @property
+    def name(self) -> str:
+        """Return name of backend, used by routing tables."""
+        return self.NAME
+
+    @property
+    def cost(self) -> float:
+        """Return estimated duration of conversions (seconds)."""
+        return self.COST
+
+    def supports(self, source: str, destination: str) -> bool:
+        """Return whether backend converts between the given format extensions."""
+        return True
+
+    def supports_page_range(self, source: str, destination: str) -> bool:
+        """Return whether backend converts only the page range of conversions
+        between the given format extensions.
+        """
+        return False
+
+    def supports_streaming(self, source: str, destination: str) -> bool:
+        """Return whether backend may write output progressively, advancing
+        the progress of conversion details, so that it can be streamed.
+        """
+        return False
+
+    def supports_image_assets(self, source: str, destination: str) -> bool:
+        """Return whether backend can output a zip archive of HTML and its
+        images as separate files, rather than embedding images.
+        """
+        return False
+
+    def start(self):
+        """Prepare backend to perform conversions."""
+        pass
+
+    def stop(self):
+        """Stop any processes held by the backend."""
+        pass
+
+    def is_healthy(self) -> bool:
+        """Return whether backend is able to perform conversions."""
+        return True
+
+    def convert(self, conversion_details, logs: list) -> int:
+        """Convert file, adding output to logs and returning an RC, which is 0 on success."""
+        raise NotImplementedError
+
+    def convert_batch(self, batch: list, logs: list) -> int:
+        """Convert files sharing formats and a temporary directory in a single run,
+        returning an RC, or None if the backend does not convert batches.
+        """
+        return None
+
+
+def run_command(cmd: list, env: dict, cwd: str, logs: list, timeout: float = None,
+                supervisor: ProcessSupervisor = None, usage: list = None) -> int:
+    """Run conversion command using the supervisor, killing it after the timeout,
+    adding output to logs and returning its RC.
+
+    Resources used by the command are added to usage, if provided.
+    """
+    supervisor = supervisor or ProcessSupervisor()
+    logs.append('Running cmd:')
+    logs.append(cmd)
+    result = supervisor.run(cmd, env, cwd, timeout=timeout)
+
+    # Capture response code, resource usage, stdout and stderr
+    logs.append('Got RC ' + str(result.rc))
+    logs.append('Used ' + str(result.usage))
+    for output in (result.stdout, result.stderr):
+        if output.discarded:
+            logs.append('Discarded first {} bytes of output'.format(output.discarded))
+        logs.append(output.getvalue().decode(
+            'utf8', errors='backslashreplace').replace('\r', ''))
+    if usage is not None:
+        usage.append(result.usage)
+    return result.rc
+
+
+class SofficeBackend(ConverterBackend):
+    """Convert using a LibreOffice process started for each conversion."""
+
+    NAME = 'soffice'
+    COST = 2.0
+
+    def __init__(self, execution_timeout: int, profile_template=None,
+                 supervisor: ProcessSupervisor = None):
+        """Setup member variables."""
+        self._execution_timeout: int = execution_timeout
+        self._profile_template = profile_template
+        self._supervisor: ProcessSupervisor = supervisor or ProcessSupervisor()
+
+    def is_healthy(self) -> bool:
+        """Return whether LibreOffice is installed."""
+        return shutil.which('soffice') is not None
+
+    def supports(self, source: str, destination: str) -> bool:
+        """Return whether backend converts between the given format extensions,
+        which are not image formats.
+        """
+        return source not in IMAGE_FORMATS and destination not in IMAGE_FORMATS
+
+    def supports_page_range(self, source: str, destination: str) -> bool:
+        """Return whether backend converts only the page range, which the PDF export supports."""
+        return destination == 'pdf'
+
+    @staticmethod
+    def page_range_filter_data(page_range) -> dict:
+        """Return export filter data converting only the page range."""
+        return {'PageRange': str(page_range)}
+
+    def get_output_filter(self, conversion_details) -> str:
+        """Return output filter of conversion, with filter options converting its page range."""
+        destination_format = conversion_details.destination_format
+        if conversion_details.page_range is None:
+            return destination_format.output_filter
+        filter_data = {
+            name: {'type': 'string', 'value': value}
+            for name, value in self.page_range_filter_data(conversion_details.page_range).items()
+        }
+        return '{}:{}:{}'.format(
+            destination_format.extension, destination_format.uno_output_filter,
+            json.dumps(filter_data))
+
+    def prepare_profile(self, profile_path: str, logs: list):
+        """Clone profile template to the given path, if available.
+
+        Without a template, LibreOffice creates a new profile on start-up.
+        """
+        if self._profile_template is None:
+            return
+        try:
+            self._profile_template.clone(profile_path)
+        except (OSError, ProfileTemplateError) as exc:
+            logs.append('Unable to clone profile template: ' + str(exc))
+
+    def get_command(self, conversion_details, input_paths: list) -> list:
+        """Return command converting each of the input files,
+        which share the formats and temporary directory of the conversion.
+        """
+        # Create argument for input filter, if one has been specified for the given
+        # input format
+        input_filter = (['--infilter=' + conversion_details.source_format.input_filter]
+                        if conversion_details.source_format.input_filter else [])
+
+        return [
+            'soffice',
+            '--headless',
+            '--convert-to', self.get_output_filter(conversion_details),
+        ] + input_filter + [
+            '-env:UserInstallation=file://' + conversion_details.t_profile_path,
+            '--writer',
+            '--nocrashreport',
+            '--nodefault',
+            '--nofirststartwizard',
+            '--nologo',
+            '--norestore'
+        ] + input_paths
+
+    def convert(self, conversion_details, logs: list) -> int:
+        """Convert file using a new LibreOffice process."""
+        return self.convert_batch([conversion_details], logs)
+
+    def convert_batch(self, batch: list, logs: list) -> int:
+        """Convert files using a single LibreOffice process."""
+        self.prepare_profile(batch[0].t_profile_path, logs)
+        cmd = self.get_command(
+            batch[0], [conversion_details.t_input_path for conversion_details in batch])
+        return run_command(
+            cmd, dict(os.environ), batch[0].temp_directory, logs,
+            timeout=self._execution_timeout * len(batch), supervisor=self._supervisor,
+            usage=batch[0].process_usage)
+
+
+class OfficeListenerBackend(SofficeBackend):
+    """Convert using a persistent LibreOffice listener owned by each converter slot."""
+
+    NAME = 'soffice-listener'
+    COST = 1.0
+
+    def __init__(self, start_timeout: int, execution_timeout: int, profile_template=None,
+                 supervisor: ProcessSupervisor = None):
+        """Setup member variables."""
+        super().__init__(
+            execution_timeout=execution_timeout, profile_template=profile_template,
+            supervisor=supervisor)
+        self._start_timeout: int = start_timeout
+
+    def start(self):
+        """Ensure the LibreOffice python UNO bindings are available."""
+        if not office.uno_available():
+            raise MatoconvException(
+                'Converter backend {} requires the LibreOffice python UNO bindings'.format(
+                    self.NAME))
+
+    def stop(self):
+        """Stop all listeners started by this process."""
+        office.stop_all()
+
+    def is_healthy(self) -> bool:
+        """Return whether LibreOffice and its python UNO bindings are installed."""
+        return office.uno_available() and super().is_healthy()
+
+    def convert(self, conversion_details, logs: list) -> int:
+        """Convert file using the office listener owned by the current converter slot."""
+        listener = office.slot_listener(
+            start_timeout=self._start_timeout,
+            execution_timeout=self._execution_timeout,
+            profile_template=self._profile_template)
+        logs.append('Converting using office listener: ' + listener.name)
+        try:
+            listener.convert(
+                input_path=conversion_details.t_input_path,
+                output_path=conversion_details.t_output_path,
+                input_filter=conversion_details.source_format.uno_input_filter,
+                output_filter=conversion_details.destination_format.uno_output_filter,
+                filter_options=conversion_details.destination_format.uno_output_filter_options,
+                filter_data=(self.page_range_filter_data(conversion_details.page_range)
+                             if conversion_details.page_range else None))
+        except Exception as exc:
+            logs.append('Office listener conversion failed: ' + str(exc))
+            return 1
+        return 0
+
+    def convert_batch(self, batch: list, logs: list) -> int:
+        """Listeners convert a single file at a time."""
+        return None
+
+
+class PdfToHtmlBackend(ConverterBackend):
+    """Convert PDF to HTML using pdftohtml, embedding images in the output,
+    or bundling the HTML and images written by pdftohtml in a zip archive.
+
+    Documents with more pages than shard_pages are split into shards of
+    pages, converted by parallel pdftohtml processes, then stitched into
+    a single document. Shards are written to the output in order as they
+    are converted, so that output can be streamed.
+    """
+
+    NAME = 'pdftohtml'
+    COST = 0.5
+
+    def __init__(self, execution_timeout: int, chunk_size: int, image_workers: int,
+                 shard_pages: int = 0, shard_workers: int = 1,
+                 supervisor: ProcessSupervisor = None):
+        """Setup member variables."""
+        self._execution_timeout: int = execution_timeout
+        self._supervisor: ProcessSupervisor = supervisor or ProcessSupervisor()
+        self._chunk_size: int = chunk_size
+        self._image_workers: int = image_workers
+        self._shard_pages: int = shard_pages
+        self._shard_workers: int = shard_workers
+
+    def supports(self, source: str, destination: str) -> bool:
+        """Return whether backend converts between the given format extensions."""
+        return (source, destination) == ('pdf', 'html')
+
+    def supports_page_range(self, source: str, destination: str) -> bool:
+        """Return whether backend converts only the page range of conversions."""
+        return True
+
+    def supports_streaming(self, source: str, destination: str) -> bool:
+        """Return whether backend may write output progressively, which it does
+        for sharded documents.
+        """
+        return self._shard_pages > 0
+
+    def supports_image_assets(self, source: str, destination: str) -> bool:
+        """Return whether backend can output images as separate files, which pdftohtml writes."""
+        return True
+
+    def is_healthy(self) -> bool:
+        """Return whether pdftohtml is installed."""
+        return shutil.which('pdftohtml') is not None
+
+    def get_command(self, conversion_details, first: int = None, last: int = None,
+                    output_root: str = None) -> list:
+        """Return command converting the input file, from the first to the last page,
+        defaulting to the page range of the conversion.
+
+        Output is written to files named using output_root, defaulting to
+        the name of the input file.
+        """
+        if first is None and conversion_details.page_range is not None:
+            first = conversion_details.page_range.first
+            last = conversion_details.page_range.last
+        page_range = []
+        if first is not None:
+            page_range = ['-f', str(first)]
+        if last is not None:
+            page_range += ['-l', str(last)]
+        return [
+            'pdftohtml',
+            '-nomerge',
+            '-s',
+            '-c',
+        ] + page_range + [
+            conversion_details.t_input_path
+        ] + ([output_root] if output_root else [])
+
+    def get_shards(self, conversion_details) -> list:
+        """Return first and last page of each shard of the document, or an
+        empty list if it is not sharded, as its pages are unknown or within a shard.
+        """
+        if self._shard_pages <= 0:
+            return []
+        pages = preflight.inspect(
+            conversion_details.t_input_path,
+            os.path.getsize(conversion_details.t_input_path)).pages
+        if pages is None:
+            return []
+        first, last = 1, pages
+        if conversion_details.page_range is not None:
+            first = conversion_details.page_range.first
+            if conversion_details.page_range.last is not None:
+                last = min(last, conversion_details.page_range.last)
+        if last - first + 1 <= self._shard_pages:
+            return []
+        return [
+            (shard_first, min(last, shard_first + self._shard_pages - 1))
+            for shard_first in range(first, last + 1, self._shard_pages)
+        ]
+
+    def convert_shard(self, conversion_details, index: int, first: int, last: int):
+        """Convert shard of pages, embedding its images unless they are
+        bundled, returning its RC, logs and path of its HTML file.
+        """
+        logs = []
+        output_root = '{}-shard-{}'.format(conversion_details.t_extless_path, index)
+        rc = run_command(
+            self.get_command(conversion_details, first, last, output_root), dict(os.environ),
+            conversion_details.temp_directory, logs, timeout=self._execution_timeout,
+            supervisor=self._supervisor, usage=conversion_details.process_usage)
+        if not rc and not os.path.isfile(output_root + '-html.html'):
+            logs.append('pdftohtml did not convert pages {}-{}'.format(first, last))
+            rc = 1
+        if conversion_details.image_assets:
+            return rc, logs, output_root + '-html.html'
+        if not rc:
+            postprocess.inline_images(
+                output_root + '-html.html',
+                output_root + '.html',
+                conversion_details.temp_directory,
+                logs,
+                chunk_size=self._chunk_size,
+                workers=self._image_workers,
+                class_prefix='{}{}-'.format(postprocess.CLASS_PREFIX, index))
+        return rc, logs, output_root + '.html'
+
+    def convert_shards(self, conversion_details, shards: list, logs: list) -> int:
+        """Convert shards in parallel, writing each to the output file in order,
+        once it and all previous shards are converted.
+
+        Where images are bundled, shards are written to the HTML file
+        of the bundle, which is then written to the output file.
+        """
+        progress = conversion_details.progress
+        html_path = conversion_details.t_output_path
+        if conversion_details.image_assets:
+            html_path = conversion_details.t_extless_path + '-html.html'
+        logs.append('Converting {} shards of pages'.format(len(shards)))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, self._shard_workers)) as executor:
+            futures = [
+                executor.submit(self.convert_shard, conversion_details, index, first, last)
+                for index, (first, last) in enumerate(shards)
+            ]
+            try:
+                with open(html_path, 'wb') as fh:
+                    for index, future in enumerate(futures):
+                        rc, shard_logs, shard_path = future.result()
+                        logs += shard_logs
+                        if rc:
+                            break
+                        postprocess.write_shard(
+                            fh, shard_path, index, first=index == 0, last=index == len(shards) - 1)
+                        fh.flush()
+                        if progress is not None:
+                            progress.advance(fh.tell())
+            except BaseException:
+                rc = 1
+                raise
+            finally:
+                if rc:
+                    # Shards not yet started are not converted, and
+                    # the partial output is removed
+                    for future in futures:
+                        future.cancel()
+                    if os.path.isfile(html_path):
+                        os.unlink(html_path)
+        if conversion_details.image_assets:
+            postprocess.bundle_images(
+                html_path, conversion_details.t_output_path,
+                conversion_details.temp_directory, logs, chunk_size=self._chunk_size)
+        return rc
+
+    def convert(self, conversion_details, logs: list) -> int:
+        """Convert file, then embed images in the output file."""
+        shards = self.get_shards(conversion_details)
+        if shards:
+            return self.convert_shards(conversion_details, shards, logs)
+
+        rc = run_command(
+            self.get_command(conversion_details), dict(os.environ),
+            conversion_details.temp_directory, logs, timeout=self._execution_timeout,
+            supervisor=self._supervisor, usage=conversion_details.process_usage)
+        if conversion_details.image_assets:
+            if os.path.isfile(conversion_details.t_extless_path + '-html.html'):
+                postprocess.bundle_images(
+                    conversion_details.t_extless_path + '-html.html',
+                    conversion_details.t_output_path,
+                    conversion_details.temp_directory,
+                    logs,
+                    chunk_size=self._chunk_size)
+        elif os.path.isfile(conversion_details.t_extless_path + '-html.html'):
+            postprocess.inline_images(
+                conversion_details.t_extless_path + '-html.html',
+                conversion_details.t_output_path,
+                conversion_details.temp_directory,
+                logs,
+                chunk_size=self._chunk_size,
+                workers=self._image_workers)
+        return rc
+
+
+class PdfToPpmBackend(ConverterBackend):
+    """Render the first page of PDF documents to PNG or JPEG images using pdftoppm."""
+
+    NAME = 'pdftoppm'
+    COST = 0.5
+
+    # Extensions of images written by pdftoppm for each image format
+    IMAGE_EXTENSIONS = {'png': 'png', 'jpeg': 'jpg'}
+
+    def __init__(self, execution_timeout: int, supervisor: ProcessSupervisor = None):
+        """Setup member variables."""
+        self._execution_timeout: int = execution_timeout
+        self._supervisor: ProcessSupervisor = supervisor or ProcessSupervisor()
+
+    def supports(self, source: str, destination: str) -> bool:
+        """Return whether backend converts between the given format extensions."""
+        return source == 'pdf' and destination in IMAGE_FORMATS
+
+    def supports_page_range(self, source: str, destination: str) -> bool:
+        """Return whether backend converts only the page range of conversions,
+        rendering its first page.
+        """
+        return True
+
+    def is_healthy(self) -> bool:
+        """Return whether pdftoppm is installed."""
+        return shutil.which('pdftoppm') is not None
+
+    def get_command(self, conversion_details) -> list:
+        """Return command rendering the input file, to an image at its extensionless path."""
+        page_range = []
+        if conversion_details.page_range is not None:
+            page_range = ['-f', str(conversion_details.page_range.first)]
+        # Height is scaled to maintain the aspect ratio of the page
+        width = []
+        if conversion_details.width is not None:
+            width = ['-scale-to-x', str(conversion_details.width), '-scale-to-y', '-1']
+        return [
+            'pdftoppm',
+            '-' + conversion_details.destination_format.extension,
+            '-singlefile',
+        ] + page_range + width + [
+            conversion_details.t_input_path,
+            conversion_details.t_extless_path
+        ]
+
+    def convert(self, conversion_details, logs: list) -> int:
+        """Render image, then move it to the output path."""
+        rc = run_command(
+            self.get_command(conversion_details), dict(os.environ),
+            conversion_details.temp_directory, logs, timeout=self._execution_timeout,
+            supervisor=self._supervisor, usage=conversion_details.process_usage)
+        image_path = conversion_details.t_extless_path + '.' + self.IMAGE_EXTENSIONS[
+            conversion_details.destination_format.extension]
+        if os.path.isfile(image_path) and image_path != conversion_details.t_output_path:
+            os.rename(image_path, conversion_details.t_output_path)
+        return rc
+
+
+class StubBackend(ConverterBackend):
+    """Convert files by copying them to their output path, after a fixed delay.
+
+    Allows the server to be load tested without converters installed.
+    """
+
+    NAME = 'stub'
+
+    def __init__(self, delay: float = 0):
+        """Setup member variables."""
+        self._delay: float = delay
+
+    @property
+    def cost(self) -> float:
+        """Return estimated duration of conversions (seconds)."""
+        return self._delay
+
+    def supports_page_range(self, source: str, destination: str) -> bool:
+        """Return whether backend converts only the page range, which is
+        ignored, as input files are copied whole.
+        """
+        return True
+
+    def convert(self, conversion_details, logs: list) -> int:
+        """Copy input file to output path."""
+        return self.convert_batch([conversion_details], logs)
+
+    def convert_batch(self, batch: list, logs: list) -> int:
+        """Copy input files to their output paths."""
+        logs.append('Converting using stub backend')
+        if self._delay:
+            time.sleep(self._delay)
+        for conversion_details in batch:
+            shutil.copyfile(conversion_details.t_input_path, conversion_details.t_output_path)
+        return 0
+
+
+def parse_routing_table(table: str) -> list:
+    """Return list of source, destination and backend name of each
+    route of a routing table, such as 'pdf:html=pdftohtml,*:*=soffice'.
+    """
+    routes = []
+    for entry in table.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        pair, _, backend = entry.partition('=')
+        source, _, destination = pair.partition(':')
+        if not (source.strip() and destination.strip() and backend.strip()):
+            raise MatoconvException('Invalid converter route: ' + entry)
+        routes.append((source.strip().lower(), destination.strip().lower(), backend.strip()))
+    return routes
+
+
+def select_backend(routes: list, backends: dict, source: str, destination: str) -> ConverterBackend:
+    """Return backend of the first route matching the format pair, which supports
+    the pair, or None if no backend converts between the formats.
+    """
+    for route_source, route_destination, name in routes:
+        if (route_source in (ANY_FORMAT, source) and route_destination in (ANY_FORMAT, destination)
+                and backends[name].supports(source, destination)):
+            return backends[name]
+    return None
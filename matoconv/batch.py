@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Handling of batch conversion requests."""
+
+import json
+import os
+import shutil
+import zipfile
+
+
+ZIP_MIMETYPES = ('application/zip', 'application/x-zip-compressed')
+
+# Name of archive member holding per-file results
+MANIFEST_FILENAME = 'results.json'
+
+
+class BatchFile(object):
+    """Struct-like object for storing the state
+    of a single file of a batch conversion.
+    """
+
+    def __init__(self, filename: str):
+        """Setup member variables."""
+        self._filename: str = filename
+        self.conversion_details = None
+        self.cache_key: str = None
+        self.entry = None
+        self.error: str = None
+
+    @property
+    def filename(self) -> str:
+        """Return filename of uploaded file."""
+        return self._filename
+
+    @property
+    def attempts(self) -> list:
+        """Return outcome of each conversion attempt."""
+        if self.conversion_details is None:
+            return []
+        return list(self.conversion_details.attempts)
+
+    @property
+    def output_filename(self) -> str:
+        """Return filename of converted file, if conversion succeeded."""
+        if self.entry is None:
+            return None
+        return self.conversion_details.ouptut_filename
+
+
+def iter_uploads(request, archive_path: str, chunk_size: int):
+    """Yield filename and stream of each file of a batch request.
+
+    Files are provided either as files of a multipart upload, or as members
+    of a zip archive request body, which is first streamed to archive_path.
+    """
+    if request.mimetype in ZIP_MIMETYPES:
+        with open(archive_path, 'wb') as fh:
+            shutil.copyfileobj(request.stream, fh, chunk_size)
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in archive.infolist():
+                if member.is_dir():
+                    continue
+                with archive.open(member) as stream:
+                    yield os.path.basename(member.filename), stream
+    else:
+        for _, upload in request.files.items(multi=True):
+            yield os.path.basename(upload.filename or ''), upload.stream
+
+
+def write_archive(path: str, batch_files: list):
+    """Write zip archive of converted files, with a manifest of per-file results."""
+    manifest = []
+    member_names = set([MANIFEST_FILENAME])
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for index, batch_file in enumerate(batch_files):
+            member_name = batch_file.output_filename
+            if member_name is not None:
+                # Prefix duplicate names with position of file in the batch
+                if member_name in member_names:
+                    member_name = '{}-{}'.format(index, member_name)
+                member_names.add(member_name)
+
+                if batch_file.entry.data is not None:
+                    archive.writestr(member_name, batch_file.entry.data)
+                else:
+                    archive.write(batch_file.entry.path, member_name)
+
+            manifest.append({
+                'filename': batch_file.filename,
+                'output_filename': member_name,
+                'success': batch_file.error is None,
+                'error': batch_file.error,
+                'attempts': batch_file.attempts
+            })
+
+        archive.writestr(MANIFEST_FILENAME, json.dumps(manifest, indent=2))
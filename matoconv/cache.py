@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""Content-addressed cache of conversion results."""
+
+import collections
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+
+class CacheEntry(object):
+    """Cached conversion result, held either in memory or on disk."""
+
+    def __init__(self, key: str, data: bytes = None, path: str = None):
+        """Store entry details."""
+        self._key: str = key
+        self._data: bytes = data
+        self._path: str = path
+
+    @property
+    def key(self) -> str:
+        """Return cache key of entry."""
+        return self._key
+
+    @property
+    def data(self) -> bytes:
+        """Return in-memory data of entry, if held in memory."""
+        return self._data
+
+    @property
+    def path(self) -> str:
+        """Return path of entry, if held on disk."""
+        return self._path
+
+    def read(self) -> bytes:
+        """Return content of entry."""
+        if self._data is not None:
+            return self._data
+        with open(self._path, 'rb') as fh:
+            return fh.read()
+
+
+class ResultCache(object):
+    """Two tier LRU cache of conversion results, keyed by content hash.
+
+    Small results are held in memory, all results are held on disk,
+    with each tier evicting least recently used entries once its size
+    limit is reached.
+    Concurrent requests for the same key are coalesced, so that only
+    one conversion is performed.
+    """
+
+    KEY_VERSION = '1'
+
+    # Only store results up to this fraction of the memory tier in memory,
+    # so that a single large result cannot flush the tier.
+    MEMORY_ITEM_RATIO = 4
+
+    def __init__(self, memory_size: int, disk_size: int, directory: str = None):
+        """Setup tiers, indexing any results left on disk by a previous run."""
+        self._memory_size: int = memory_size
+        self._disk_size: int = disk_size
+        self._lock = threading.Lock()
+
+        self._memory = collections.OrderedDict()
+        self._memory_usage: int = 0
+
+        self._disk = collections.OrderedDict()
+        self._disk_usage: int = 0
+        self._directory: str = None
+        if self._disk_size > 0:
+            self._directory = directory or tempfile.mkdtemp(prefix='matoconv-cache-')
+            os.makedirs(self._directory, exist_ok=True)
+            self._load_disk_index()
+
+        self._in_flight = {}
+
+    @staticmethod
+    def make_key(input_digest: str, source_format, destination_format,
+                 options: str = '') -> str:
+        """Generate cache key from hash of input data, formats and filter options."""
+        key_data = '\0'.join([
+            ResultCache.KEY_VERSION,
+            input_digest,
+            source_format.extension or '',
+            source_format.input_filter or '',
+            destination_format.extension or '',
+            destination_format.output_filter or '',
+            options
+        ])
+        return hashlib.sha256(key_data.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def variant_key(key: str, encoding: str) -> str:
+        """Return key of result compressed with the content encoding."""
+        return '{}.{}'.format(key, encoding)
+
+    def _disk_path(self, key: str) -> str:
+        """Return path of key in disk tier."""
+        return os.path.join(self._directory, key)
+
+    def _load_disk_index(self):
+        """Index results already present in disk tier, oldest first."""
+        existing = []
+        for dir_entry in os.scandir(self._directory):
+            if dir_entry.is_file() and not dir_entry.name.startswith('.'):
+                stat = dir_entry.stat()
+                existing.append((stat.st_mtime, dir_entry.name, stat.st_size))
+        for _, key, size in sorted(existing):
+            self._disk[key] = size
+            self._disk_usage += size
+        self._evict_disk()
+
+    def _evict_memory(self):
+        """Evict least recently used entries until memory tier is within limit."""
+        while self._memory_usage > self._memory_size and self._memory:
+            _, data = self._memory.popitem(last=False)
+            self._memory_usage -= len(data)
+
+    def _evict_disk(self):
+        """Evict least recently used entries until disk tier is within limit."""
+        while self._disk_usage > self._disk_size and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_usage -= size
+            try:
+                os.unlink(self._disk_path(key))
+            except FileNotFoundError:
+                pass
+
+    def _store_memory(self, key: str, data: bytes):
+        """Add data to memory tier."""
+        if key in self._memory:
+            self._memory_usage -= len(self._memory.pop(key))
+        self._memory[key] = data
+        self._memory_usage += len(data)
+        self._evict_memory()
+
+    def get(self, key: str) -> CacheEntry:
+        """Return cached entry for key, or None."""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return CacheEntry(key, data=data)
+
+            if key in self._disk:
+                self._disk.move_to_end(key)
+                path = self._disk_path(key)
+                try:
+                    # Update mtime, so LRU order is retained across restarts
+                    os.utime(path)
+                except FileNotFoundError:
+                    self._disk_usage -= self._disk.pop(key)
+                    return None
+                return CacheEntry(key, path=path)
+
+        return None
+
+    def put(self, key: str, path: str):
+        """Store conversion result file in cache."""
+        size = os.path.getsize(path)
+        data = None
+        if size <= self._memory_size // self.MEMORY_ITEM_RATIO:
+            with open(path, 'rb') as fh:
+                data = fh.read()
+
+        with self._lock:
+            if data is not None:
+                self._store_memory(key, data)
+
+            if self._directory is None or size > self._disk_size:
+                return
+
+            # Link or copy to temporary file and move into place, so that
+            # partial results are never read.
+            temp_path = os.path.join(
+                self._directory, '.{}.{}'.format(key, threading.get_ident()))
+            try:
+                os.link(path, temp_path)
+            except OSError:
+                shutil.copyfile(path, temp_path)
+            os.replace(temp_path, self._disk_path(key))
+
+            if key in self._disk:
+                self._disk_usage -= self._disk.pop(key)
+            self._disk[key] = size
+            self._disk_usage += size
+            self._evict_disk()
+
+    def wait_or_lead(self, key: str, timeout: int) -> bool:
+        """Register intent to produce result for key.
+
+        Returns True if the caller should perform the conversion, and must
+        call release() afterwards. Otherwise, waits for the conversion already
+        in progress to finish and returns False.
+        """
+        with self._lock:
+            event = self._in_flight.get(key)
+            if event is None:
+                self._in_flight[key] = threading.Event()
+                return True
+        event.wait(timeout)
+        return False
+
+    def release(self, key: str):
+        """Mark conversion for key as finished, waking any waiting requests."""
+        with self._lock:
+            event = self._in_flight.pop(key, None)
+        if event is not None:
+            event.set()
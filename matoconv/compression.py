@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Compression of conversion results, for clients accepting compressed responses."""
+
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+GZIP = 'gzip'
+BROTLI = 'br'
+
+
+def brotli_available() -> bool:
+    """Return whether the brotli bindings can be used."""
+    return brotli is not None
+
+
+def available_encodings() -> list:
+    """Return content encodings which results can be compressed with, most preferred first."""
+    return [BROTLI, GZIP] if brotli_available() else [GZIP]
+
+
+class GzipCompressor(object):
+    """Gzip compressor, providing the interface of brotli compressors."""
+
+    def __init__(self, level: int):
+        """Setup member variables."""
+        self._compressobj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def process(self, data: bytes) -> bytes:
+        """Return compressed data available after adding data."""
+        return self._compressobj.compress(data)
+
+    def flush(self) -> bytes:
+        """Return all compressed data of data added so far."""
+        return self._compressobj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        """Return remaining compressed data, ending the stream."""
+        return self._compressobj.flush(zlib.Z_FINISH)
+
+
+def compressor(encoding: str, gzip_level: int, brotli_quality: int):
+    """Return compressor for content encoding."""
+    if encoding == BROTLI:
+        return brotli.Compressor(quality=brotli_quality)
+    return GzipCompressor(gzip_level)
+
+
+def compress(chunks, encoding: str, gzip_level: int = 6, brotli_quality: int = 5,
+             flush: bool = False):
+    """Yield compressed data of chunks, compressing each as it is read.
+
+    If flush is True, all data of each chunk is yielded before the next
+    is read, so that chunks produced progressively reach the client.
+    """
+    stream = compressor(encoding, gzip_level, brotli_quality)
+    for chunk in chunks:
+        data = stream.process(chunk)
+        if flush:
+            data += stream.flush()
+        if data:
+            yield data
+    yield stream.finish()
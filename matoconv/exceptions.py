@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+
+class MatoconvException(Exception):
+    """Base exception for matoconv."""
+
+    pass
+
+
+class UnknownFileTypeError(MatoconvException):
+    """Unknown filetype."""
+
+    pass
+
+
+class CannotDetectFileTypeError(MatoconvException):
+    """Cannot detect input file type."""
+
+    pass
+
+
+class OfficeListenerError(MatoconvException):
+    """Persistent office listener could not be started or reached."""
+
+    pass
+
+
+class ProfileTemplateError(MatoconvException):
+    """LibreOffice profile template could not be built or cloned."""
+
+    pass
+
+
+class AdmissionRejectedError(MatoconvException):
+    """Conversion rejected, as the converter queue is full or host is overloaded."""
+
+    def __init__(self, message: str, retry_after: int):
+        """Store time after which a retry is likely to be admitted."""
+        super().__init__(message)
+        self.retry_after: int = retry_after
+
+
+class InvalidInputError(MatoconvException):
+    """Input file does not match its format, is corrupt or exceeds limits."""
+
+    def __init__(self, message: str, status_code: int):
+        """Store HTTP status code of response."""
+        super().__init__(message)
+        self.status_code: int = status_code
+
+
+class ConverterUnavailableError(MatoconvException):
+    """Conversions between formats are failing, so are rejected until they recover."""
+
+    def __init__(self, message: str, retry_after: int):
+        """Store time after which conversions may be attempted again."""
+        super().__init__(message)
+        self.retry_after: int = retry_after
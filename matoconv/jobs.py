@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""Asynchronous conversion jobs."""
+
+import json
+import shutil
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+
+
+class Job(object):
+    """Conversion job, performed in the background of the request creating it."""
+
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, job_id: str, directory: str, callback_url: str = None):
+        """Setup member variables."""
+        self._id: str = job_id
+        self._directory: str = directory
+        self._callback_url: str = callback_url
+        self._status: str = Job.PENDING
+        self._error: str = None
+        self._finished_at: float = None
+        self.conversion_details = None
+        self.cache_key: str = None
+
+    @property
+    def id(self) -> str:
+        """Return job ID."""
+        return self._id
+
+    @property
+    def directory(self) -> str:
+        """Return working directory of job, holding input and result."""
+        return self._directory
+
+    @property
+    def callback_url(self) -> str:
+        """Return URL to notify of job completion."""
+        return self._callback_url
+
+    @property
+    def status(self) -> str:
+        """Return status of job."""
+        return self._status
+
+    @property
+    def error(self) -> str:
+        """Return error message of failed job."""
+        return self._error
+
+    @property
+    def finished_at(self) -> float:
+        """Return monotonic time that job finished, or None if still pending."""
+        return self._finished_at
+
+    def finish(self, error: str = None):
+        """Mark job as finished, failing if an error is provided."""
+        self._error = error
+        self._status = Job.FAILED if error else Job.DONE
+        self._finished_at = time.monotonic()
+
+    def to_dict(self) -> dict:
+        """Return details of job, as returned to clients."""
+        return {
+            'id': self._id,
+            'status': self._status,
+            'error': self._error,
+            'attempts': list(self.conversion_details.attempts) if self.conversion_details else []
+        }
+
+    def send_callback(self, timeout: int):
+        """Post details of job to callback URL."""
+        request = urllib.request.Request(
+            self._callback_url,
+            data=json.dumps(self.to_dict()).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            method='POST')
+        urllib.request.urlopen(request, timeout=timeout).close()
+
+
+class JobStore(object):
+    """Store of jobs, removing finished jobs and their results once their TTL expires."""
+
+    def __init__(self, ttl: int, directory: str = None, release_directory=None):
+        """Setup member variables.
+
+        Working directories of removed jobs are passed to release_directory,
+        if provided, rather than being removed immediately.
+        """
+        self._ttl: int = ttl
+        self._directory: str = directory or None
+        self._release_directory = release_directory
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, callback_url: str = None) -> Job:
+        """Create job, with a new working directory."""
+        self.collect()
+        job_id = uuid.uuid4().hex
+        directory = tempfile.mkdtemp(prefix='matoconv-job-', dir=self._directory)
+        job = Job(job_id, directory, callback_url=callback_url)
+        with self._lock:
+            self._jobs[job_id] = job
+        return job
+
+    def get(self, job_id: str) -> Job:
+        """Return job, or None if it does not exist or has expired."""
+        self.collect()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def remove(self, job_id: str):
+        """Remove job and its working directory."""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is not None and self._release_directory is not None:
+            self._release_directory(job.directory)
+        elif job is not None:
+            shutil.rmtree(job.directory, ignore_errors=True)
+
+    def collect(self):
+        """Remove finished jobs older than the TTL."""
+        expire_before = time.monotonic() - self._ttl
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished_at is not None and job.finished_at < expire_before
+            ]
+        for job_id in expired:
+            self.remove(job_id)
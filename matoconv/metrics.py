@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""Metrics, exposed in Prometheus text format."""
+
+import threading
+
+
+def _format_labels(labels: dict) -> str:
+    """Return labels in Prometheus text format."""
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"'))
+        for name, value in labels.items()
+    ) + '}'
+
+
+def _format_value(value: float) -> str:
+    """Return sample value in Prometheus text format."""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Metric(object):
+    """Base class for metrics, holding a value per set of label values."""
+
+    TYPE = None
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = ()):
+        """Setup member variables."""
+        self._name: str = name
+        self._documentation: str = documentation
+        self._label_names: tuple = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        """Return label values, in order of label names."""
+        if set(labels) != set(self._label_names):
+            raise ValueError('Invalid labels for {}: {}'.format(self._name, ', '.join(labels)))
+        return tuple(str(labels[name]) for name in self._label_names)
+
+    def samples(self) -> list:
+        """Return list of sample name suffix, labels and value."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """Return metric in Prometheus text format."""
+        lines = [
+            '# HELP {} {}'.format(self._name, self._documentation),
+            '# TYPE {} {}'.format(self._name, self.TYPE)
+        ]
+        for suffix, labels, value in self.samples():
+            lines.append('{}{}{} {}'.format(
+                self._name, suffix, _format_labels(labels), _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+
+    TYPE = 'counter'
+
+    def inc(self, value: float = 1, **labels):
+        """Increase count for labels."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def samples(self) -> list:
+        """Return list of sample name suffix, labels and value."""
+        with self._lock:
+            return [
+                ('_total', dict(zip(self._label_names, key)), value)
+                for key, value in sorted(self._values.items())
+            ]
+
+
+class Gauge(Metric):
+    """Value obtained, for each set of label values, when metrics are collected."""
+
+    TYPE = 'gauge'
+
+    def __init__(self, name: str, documentation: str, collect, label_names: tuple = ()):
+        """Store function returning dict of label values tuple to value."""
+        super().__init__(name, documentation, label_names)
+        self._collect = collect
+
+    def samples(self) -> list:
+        """Return list of sample name suffix, labels and value."""
+        return [
+            ('', dict(zip(self._label_names, key)), value)
+            for key, value in sorted(self._collect().items())
+        ]
+
+
+class Histogram(Metric):
+    """Distribution of observed values across buckets."""
+
+    TYPE = 'histogram'
+
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = (),
+                 buckets: tuple = DEFAULT_BUCKETS):
+        """Store bucket upper bounds."""
+        super().__init__(name, documentation, label_names)
+        self._buckets: tuple = tuple(sorted(buckets)) + (float('inf'), )
+
+    def observe(self, value: float, **labels):
+        """Add observed value for labels."""
+        key = self._key(labels)
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = ([0] * len(self._buckets), [0])
+            bucket_counts, total = self._values[key]
+            for index, upper_bound in enumerate(self._buckets):
+                if value <= upper_bound:
+                    bucket_counts[index] += 1
+            total[0] += value
+
+    def samples(self) -> list:
+        """Return list of sample name suffix, labels and value."""
+        samples = []
+        with self._lock:
+            for key, (bucket_counts, total) in sorted(self._values.items()):
+                labels = dict(zip(self._label_names, key))
+                for upper_bound, count in zip(self._buckets, bucket_counts):
+                    samples.append(('_bucket', dict(labels, le=_format_value(upper_bound)), count))
+                samples.append(('_sum', labels, total[0]))
+                samples.append(('_count', labels, bucket_counts[-1]))
+        return samples
+
+
+class TaskStats(object):
+    """Timings and events of a conversion task."""
+
+    def __init__(self):
+        """Setup member variables."""
+        self.started_at: float = None
+        self.finished_at: float = None
+        self.retries: int = 0
+        self.timeouts: int = 0
+        self.failures: int = 0
+        # CPU time (seconds) and peak RSS (bytes) of converter processes
+        self.cpu_time: float = 0
+        self.max_rss: int = 0
+
+    def add_usage(self, usage: list):
+        """Add resources used by converter processes."""
+        for process_usage in usage:
+            self.cpu_time += process_usage.cpu_time
+            self.max_rss = max(self.max_rss, process_usage.max_rss)
+
+
+class MatoconvMetrics(object):
+    """Metrics of conversions performed by Matoconv."""
+
+    FORMAT_LABELS = ('source', 'destination')
+
+    def __init__(self, admission):
+        """Create metrics, with converter slot gauges obtained from admission controller."""
+        self._admission = admission
+
+        self.requests = Counter(
+            'matoconv_requests', 'Conversion requests.',
+            ('endpoint', ) + self.FORMAT_LABELS + ('status', ))
+        self.request_duration = Histogram(
+            'matoconv_request_duration_seconds', 'Time taken to respond to conversion requests.',
+            ('endpoint', ) + self.FORMAT_LABELS)
+        self.queue_wait = Histogram(
+            'matoconv_queue_wait_seconds',
+            'Time conversions waited for a converter, including admission and scheduler queue.',
+            self.FORMAT_LABELS)
+        self.conversion_duration = Histogram(
+            'matoconv_conversion_duration_seconds', 'Time spent running the converter.',
+            self.FORMAT_LABELS)
+        self.conversion_cpu = Histogram(
+            'matoconv_conversion_cpu_seconds', 'CPU time used by converter processes.',
+            self.FORMAT_LABELS)
+        self.conversion_max_rss = Histogram(
+            'matoconv_conversion_max_rss_bytes', 'Peak resident set size of converter processes.',
+            self.FORMAT_LABELS,
+            buckets=tuple(2 ** power * 1024 * 1024 for power in range(4, 14)))
+        self.retries = Counter(
+            'matoconv_conversion_retries', 'Conversion attempts retried after failure.',
+            self.FORMAT_LABELS)
+        self.timeouts = Counter(
+            'matoconv_conversion_timeouts', 'Conversion attempts, or waits for conversions, which timed out.',
+            self.FORMAT_LABELS)
+        self.failures = Counter(
+            'matoconv_conversion_failures', 'Conversions which failed after all attempts.',
+            self.FORMAT_LABELS)
+        self.converter_slots = Gauge(
+            'matoconv_converter_slots', 'Converter slots, by state.',
+            lambda: {
+                ('busy', ): self._admission.active,
+                ('idle', ): self._admission.slots - self._admission.active
+            },
+            ('state', ))
+        self.queue_depth = Gauge(
+            'matoconv_queue_depth', 'Conversions waiting for a converter slot.',
+            lambda: {(): self._admission.waiting})
+
+        self._metrics = [
+            self.requests, self.request_duration, self.queue_wait, self.conversion_duration,
+            self.conversion_cpu, self.conversion_max_rss, self.retries, self.timeouts, self.failures, self.converter_slots, self.queue_depth
+        ]
+
+    def observe_task(self, source: str, destination: str, queued_at: float, stats: TaskStats):
+        """Record timings and events of a finished conversion task."""
+        self.queue_wait.observe(
+            max(0, stats.started_at - queued_at), source=source, destination=destination)
+        self.conversion_duration.observe(
+            stats.finished_at - stats.started_at, source=source, destination=destination)
+        # Conversions performed without running converter processes use no measured resources
+        if stats.max_rss:
+            self.conversion_cpu.observe(stats.cpu_time, source=source, destination=destination)
+            self.conversion_max_rss.observe(stats.max_rss, source=source, destination=destination)
+        for counter, value in ((self.retries, stats.retries),
+                               (self.timeouts, stats.timeouts),
+                               (self.failures, stats.failures)):
+            if value:
+                counter.inc(value, source=source, destination=destination)
+
+    def render(self) -> str:
+        """Return all metrics in Prometheus text format."""
+        return ''.join(metric.render() for metric in self._metrics)
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""Persistent headless LibreOffice listeners, driven over UNO."""
+
+import ctypes
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+    from com.sun.star.connection import NoConnectException
+except ImportError:
+    uno = None
+    PropertyValue = None
+    NoConnectException = None
+
+from matoconv.exceptions import OfficeListenerError
+from matoconv.supervisor import kill_process_group
+
+
+# prctl option used to have the kernel signal a listener
+# when the slot that started it goes away.
+PR_SET_PDEATHSIG = 1
+
+
+def uno_available() -> bool:
+    """Return whether the LibreOffice python UNO bindings can be used."""
+    return uno is not None
+
+
+def _die_with_parent():
+    """Terminate the listener if the converter slot owning it exits."""
+    try:
+        libc = ctypes.CDLL('libc.so.6', use_errno=True)
+        libc.prctl(PR_SET_PDEATHSIG, signal.SIGTERM)
+    except (OSError, AttributeError):
+        # Not running on Linux/glibc, rely on stop() being called.
+        pass
+
+
+class OfficeListener(object):
+    """Long-running headless soffice process, owned by a single converter slot.
+
+    Documents are loaded into the already running office over a named pipe,
+    avoiding the LibreOffice start-up cost for each conversion.
+    """
+
+    CONNECT_RETRY_INTERVAL = 0.25
+    STOP_TIMEOUT = 5
+
+    def __init__(self, name: str, start_timeout: int, execution_timeout: int,
+                 profile_template=None):
+        """Store listener settings, the process is started on first use."""
+        self._name: str = name
+        self._profile_template = profile_template
+        self._start_timeout: int = start_timeout
+        self._execution_timeout: int = execution_timeout
+        self._process: subprocess.Popen = None
+        self._profile_directory: str = None
+        self._desktop = None
+
+    @property
+    def name(self) -> str:
+        """Return name of listener."""
+        return self._name
+
+    @property
+    def pipe_name(self) -> str:
+        """Return name of pipe that the listener accepts connections on."""
+        return 'matoconv-' + self._name
+
+    @property
+    def connection_string(self) -> str:
+        """Return UNO connection description for the listener."""
+        return 'pipe,name=' + self.pipe_name + ';urp;StarOffice.ComponentContext'
+
+    @property
+    def profile_directory(self) -> str:
+        """Return path of the private user profile of the listener."""
+        return self._profile_directory
+
+    def get_command(self) -> list:
+        """Return command used to start the listener."""
+        return [
+            'soffice',
+            '--headless',
+            '--invisible',
+            '-env:UserInstallation=file://' + self._profile_directory,
+            '--nocrashreport',
+            '--nodefault',
+            '--nofirststartwizard',
+            '--nologo',
+            '--norestore',
+            '--accept=' + self.connection_string
+        ]
+
+    def is_alive(self) -> bool:
+        """Return whether the listener process is running."""
+        return self._process is not None and self._process.poll() is None
+
+    def start(self):
+        """Start listener process and connect to it."""
+        self._profile_directory = tempfile.mkdtemp(prefix='matoconv-listener-')
+        if self._profile_template is not None:
+            self._profile_template.clone(self._profile_directory)
+        self._process = subprocess.Popen(
+            self.get_command(),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            # Run in a process group of its own, so that soffice.bin, started
+            # by the soffice wrapper, is stopped along with it
+            start_new_session=True,
+            preexec_fn=_die_with_parent)
+        self._desktop = self._connect()
+
+    def stop(self):
+        """Stop listener process and remove its profile."""
+        self._desktop = None
+        if self._process is not None:
+            if self._process.poll() is None:
+                kill_process_group(self._process.pid, signal.SIGTERM)
+                try:
+                    self._process.wait(timeout=self.STOP_TIMEOUT)
+                except subprocess.TimeoutExpired:
+                    pass
+            kill_process_group(self._process.pid, signal.SIGKILL)
+            self._process.wait()
+            self._process = None
+
+        if self._profile_directory is not None:
+            shutil.rmtree(self._profile_directory, ignore_errors=True)
+            self._profile_directory = None
+
+    def ensure_running(self):
+        """Start the listener, respawning it if it has died."""
+        if not self.is_alive() or self._desktop is None:
+            self.stop()
+            self.start()
+
+    def _connect(self):
+        """Wait for the listener to accept connections and return its desktop."""
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            'com.sun.star.bridge.UnoUrlResolver', local_context)
+
+        deadline = time.monotonic() + self._start_timeout
+        while True:
+            try:
+                context = resolver.resolve('uno:' + self.connection_string)
+                return context.ServiceManager.createInstanceWithContext(
+                    'com.sun.star.frame.Desktop', context)
+            except NoConnectException:
+                if not self.is_alive():
+                    raise OfficeListenerError(
+                        'Office listener {} exited during start-up'.format(self._name))
+                if time.monotonic() > deadline:
+                    raise OfficeListenerError(
+                        'Timed out connecting to office listener {}'.format(self._name))
+                time.sleep(self.CONNECT_RETRY_INTERVAL)
+
+    @staticmethod
+    def _properties(**kwargs) -> tuple:
+        """Convert keyword arguments to UNO property values, skipping empty values."""
+        properties = []
+        for name, value in kwargs.items():
+            if value is None:
+                continue
+            prop = PropertyValue()
+            prop.Name = name
+            prop.Value = value
+            properties.append(prop)
+        return tuple(properties)
+
+    def convert(self, input_path: str, output_path: str,
+                input_filter: str, output_filter: str, filter_options: str,
+                filter_data: dict = None):
+        """Convert document using the listener, passing filter_data, if
+        provided, to the export filter, e.g. the PageRange to export.
+
+        Should the listener hang, it is killed after the execution timeout and
+        will be respawned on the next conversion.
+        """
+        self.ensure_running()
+
+        watchdog = threading.Timer(
+            self._execution_timeout, kill_process_group, args=(self._process.pid, ))
+        watchdog.start()
+        try:
+            document = self._desktop.loadComponentFromURL(
+                uno.systemPathToFileUrl(input_path), '_blank', 0,
+                self._properties(Hidden=True, FilterName=input_filter))
+            if document is None:
+                raise OfficeListenerError('Office listener could not load document')
+            try:
+                document.storeToURL(
+                    uno.systemPathToFileUrl(output_path),
+                    self._properties(
+                        FilterName=output_filter, FilterOptions=filter_options,
+                        FilterData=(uno.Any('[]com.sun.star.beans.PropertyValue',
+                                            self._properties(**filter_data))
+                                    if filter_data else None)))
+            finally:
+                document.close(True)
+        except Exception:
+            # The office process may have been lost part way through the
+            # conversion, so discard it to be respawned on next use.
+            if not self.is_alive():
+                self.stop()
+            raise
+        finally:
+            watchdog.cancel()
+
+
+_SLOT = threading.local()
+_LISTENERS = []
+_LISTENERS_LOCK = threading.Lock()
+
+
+def slot_listener(start_timeout: int, execution_timeout: int,
+                  profile_template=None) -> OfficeListener:
+    """Return listener owned by the calling converter slot, creating it on first use."""
+    listener = getattr(_SLOT, 'listener', None)
+    if listener is None:
+        listener = OfficeListener(
+            name='{}-{}'.format(os.getpid(), threading.get_ident()),
+            start_timeout=start_timeout,
+            execution_timeout=execution_timeout,
+            profile_template=profile_template)
+        _SLOT.listener = listener
+        with _LISTENERS_LOCK:
+            _LISTENERS.append(listener)
+    return listener
+
+
+def stop_all():
+    """Stop all listeners started by this process."""
+    with _LISTENERS_LOCK:
+        for listener in _LISTENERS:
+            listener.stop()
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""Post-processing of converted documents."""
+
+import base64
+import concurrent.futures
+import hashlib
+import mimetypes
+import os
+import re
+import zipfile
+
+
+# Image tags and closing head tag, located in the HTML output of pdftohtml
+_TAG_RE = re.compile(rb'<img\b[^>]*>|</head\s*>', re.IGNORECASE)
+_SRC_RE = re.compile(rb'\bsrc="([^"]*)"')
+_CLASS_RE = re.compile(rb'\bclass="([^"]*)"')
+
+# Image shown by tags whose image is provided by a stylesheet class
+_TRANSPARENT_IMAGE = b'data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7'
+
+# Prefix of stylesheet classes providing images
+CLASS_PREFIX = 'matoconv-img-'
+
+# Name of HTML file in bundles of HTML and images
+BUNDLE_HTML_FILENAME = 'index.html'
+
+# Elements located in the HTML output of pdftohtml when stitching shards
+_BODY_RE = re.compile(rb'<body\b[^>]*>', re.IGNORECASE)
+_BODY_END_RE = re.compile(rb'</body\s*>', re.IGNORECASE)
+_STYLE_RE = re.compile(rb'<style\b[^>]*>.*?</style\s*>', re.IGNORECASE | re.DOTALL)
+_FONT_SELECTOR_RE = re.compile(rb'\.(ft\d+)\b')
+_FONT_CLASS_RE = re.compile(rb'\b(ft\d+)\b')
+
+
+class InlineImage(object):
+    """Struct-like object for storing an image, with
+    identical content, referenced by one or more tags.
+    """
+
+    def __init__(self, path: str, digest: str):
+        """Setup member variables."""
+        self._path: str = path
+        self._digest: str = digest
+        self.references: int = 0
+        self.class_name: str = None
+        self.data_uri: bytes = None
+
+    @property
+    def path(self) -> str:
+        """Return path of image file."""
+        return self._path
+
+    @property
+    def digest(self) -> str:
+        """Return hash of image content."""
+        return self._digest
+
+
+def _iter_chunks(path: str, chunk_size: int):
+    """Yield chunks of a HTML file, each ending at the end of a tag,
+    so that no tag is split across chunks.
+    """
+    remainder = b''
+    with open(path, 'rb') as fh:
+        while True:
+            data = fh.read(chunk_size)
+            if not data:
+                break
+            data = remainder + data
+            end = data.rfind(b'>') + 1
+            remainder = data[end:]
+            if end:
+                yield data[:end]
+    if remainder:
+        yield remainder
+
+
+def _hash_file(path: str, chunk_size: int) -> str:
+    """Return hash of file content."""
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def _encode_image(path: str, chunk_size: int) -> bytes:
+    """Return data URI of image file."""
+    # Read in multiples of 3 bytes, so that chunks encode without padding
+    chunk_size = max(3, chunk_size - chunk_size % 3)
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    parts = [b'data:', mimetype.encode('ascii'), b';base64,']
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            parts.append(base64.b64encode(chunk))
+    return b''.join(parts)
+
+
+def _image_path(directory: str, src: bytes) -> str:
+    """Return path of image file referenced by src,
+    or None if it is not a file within the directory.
+    """
+    path = os.path.realpath(os.path.join(directory, src.decode('latin-1')))
+    if os.path.dirname(path) != os.path.realpath(directory) or not os.path.isfile(path):
+        return None
+    return path
+
+
+def _find_images(input_path: str, directory: str, chunk_size: int, logs: list) -> dict:
+    """Return dict of image src to image, for all images referenced by tags in the file."""
+    images_by_src = {}
+    images_by_digest = {}
+    for chunk in _iter_chunks(input_path, chunk_size):
+        for tag in _TAG_RE.finditer(chunk):
+            src_match = _SRC_RE.search(tag.group())
+            if not src_match:
+                continue
+            src = src_match.group(1)
+            if src not in images_by_src:
+                path = _image_path(directory, src)
+                image = None
+                if path:
+                    logs.append('Converting file:' + path)
+                    digest = _hash_file(path, chunk_size)
+                    image = images_by_digest.setdefault(digest, InlineImage(path, digest))
+                images_by_src[src] = image
+            if images_by_src[src] is not None:
+                images_by_src[src].references += 1
+    return images_by_src
+
+
+def bundle_images(input_path: str, output_path: str, directory: str, logs: list,
+                  chunk_size: int = 64 * 1024):
+    """Write zip archive of HTML file and the images referenced by it in the directory.
+
+    Images are stored in the archive as they are, alongside the HTML file,
+    so that they are found by their relative paths.
+    """
+    image_paths = {}
+    for chunk in _iter_chunks(input_path, chunk_size):
+        for tag in _TAG_RE.finditer(chunk):
+            src_match = _SRC_RE.search(tag.group())
+            if src_match and src_match.group(1) not in image_paths:
+                image_paths[src_match.group(1)] = _image_path(directory, src_match.group(1))
+
+    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.write(input_path, BUNDLE_HTML_FILENAME)
+        for path in sorted(set(path for path in image_paths.values() if path)):
+            logs.append('Bundling file:' + path)
+            # Images are already compressed
+            archive.write(path, os.path.basename(path), compress_type=zipfile.ZIP_STORED)
+
+
+def _stylesheet(images: list) -> bytes:
+    """Return style element defining classes for images referenced more than once."""
+    rules = [
+        '.{}{{background:url({}) 0 0/100% 100% no-repeat;'
+        '-webkit-print-color-adjust:exact;print-color-adjust:exact}}'.format(
+            image.class_name, image.data_uri.decode('ascii')).encode('ascii')
+        for image in images
+    ]
+    return b'<style type="text/css">\n' + b'\n'.join(rules) + b'\n</style>\n'
+
+
+def _replace_image(tag: bytes, image: InlineImage) -> bytes:
+    """Return image tag, with src replaced by the image data or class."""
+    if image.class_name is None:
+        return _SRC_RE.sub(lambda _: b'src="' + image.data_uri + b'"', tag, count=1)
+
+    class_name = image.class_name.encode('ascii')
+    tag = _SRC_RE.sub(lambda _: b'src="' + _TRANSPARENT_IMAGE + b'"', tag, count=1)
+    if _CLASS_RE.search(tag):
+        return _CLASS_RE.sub(
+            lambda match: b'class="' + match.group(1) + b' ' + class_name + b'"', tag, count=1)
+    return tag[:4] + b' class="' + class_name + b'"' + tag[4:]
+
+
+def inline_images(input_path: str, output_path: str, directory: str, logs: list,
+                  chunk_size: int = 64 * 1024, workers: int = 1, class_prefix: str = CLASS_PREFIX):
+    """Write HTML file, embedding images referenced by it in the directory as data URIs.
+
+    Each distinct image is encoded once, using up to the given number of
+    worker threads. Images referenced more than once are embedded once in
+    a stylesheet and applied to each of their tags by a class, named
+    using class_prefix.
+    """
+    images_by_src = _find_images(input_path, directory, chunk_size, logs)
+    images = list({
+        image.digest: image for image in images_by_src.values() if image is not None
+    }.values())
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        data_uris = executor.map(lambda image: _encode_image(image.path, chunk_size), images)
+        for image, data_uri in zip(images, data_uris):
+            image.data_uri = data_uri
+
+    shared_images = [image for image in images if image.references > 1]
+    for index, image in enumerate(shared_images):
+        image.class_name = class_prefix + str(index)
+    stylesheet = _stylesheet(shared_images) if shared_images else b''
+
+    def replace_tag(match):
+        """Return tag with image embedded, adding stylesheet before the first tag using it."""
+        nonlocal stylesheet
+        tag = match.group()
+        if tag[:4].lower() != b'<img':
+            prefix, stylesheet = stylesheet, b''
+            return prefix + tag
+        src_match = _SRC_RE.search(tag)
+        image = images_by_src.get(src_match.group(1)) if src_match else None
+        if image is None:
+            return tag
+        prefix = b''
+        if image.class_name is not None:
+            prefix, stylesheet = stylesheet, b''
+        return prefix + _replace_image(tag, image)
+
+    with open(output_path, 'wb') as fh:
+        for chunk in _iter_chunks(input_path, chunk_size):
+            fh.write(_TAG_RE.sub(replace_tag, chunk))
+
+
+def _rename_fonts(data: bytes, suffix: bytes) -> bytes:
+    """Return HTML with font classes of pdftohtml renamed using suffix,
+    in stylesheets and class attributes.
+    """
+    data = _STYLE_RE.sub(
+        lambda match: _FONT_SELECTOR_RE.sub(lambda font: b'.' + font.group(1) + suffix, match.group()),
+        data)
+    return _CLASS_RE.sub(
+        lambda match: b'class="' + _FONT_CLASS_RE.sub(
+            lambda font: font.group(1) + suffix, match.group(1)) + b'"',
+        data)
+
+
+def write_shard(fh, input_path: str, index: int, first: bool, last: bool):
+    """Write HTML file converted from a shard of the pages of a document,
+    as part of a single HTML document stitched from all shards.
+
+    The first shard provides the head of the document, whilst stylesheets of
+    the heads of later shards are written before their pages. Font classes
+    are renamed for each shard, as pdftohtml numbers fonts for each run.
+    """
+    with open(input_path, 'rb') as input_fh:
+        data = _rename_fonts(input_fh.read(), '-{}'.format(index).encode('ascii'))
+
+    body_match = _BODY_RE.search(data)
+    body_start = body_match.end() if body_match else 0
+    body_end_match = _BODY_END_RE.search(data, body_start)
+    body_end = body_end_match.start() if body_end_match else len(data)
+
+    if first:
+        fh.write(data[:body_start])
+    else:
+        for style in _STYLE_RE.finditer(data, 0, body_start):
+            fh.write(style.group() + b'\n')
+    fh.write(data[body_start:body_end])
+    if last:
+        fh.write(b'</body>\n</html>\n')
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Inspection of input files, before they are converted."""
+
+import re
+import zipfile
+
+from matoconv.exceptions import InvalidInputError
+
+
+# Size of start and end of files read to detect their format (bytes)
+SNIFF_SIZE = 8 * 1024
+
+PDF_MAGIC = b'%PDF-'
+OLE_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+ZIP_MAGIC = b'PK\x03\x04'
+RTF_MAGIC = b'{\\rtf'
+
+ODT_MIMETYPE = b'application/vnd.oasis.opendocument.text'
+
+# Page counts held in PDF page tree nodes and office document metadata
+_PDF_COUNT_RE = re.compile(rb'/Type\s*/Pages\b[^>]*?/Count\s+(\d+)|/Count\s+(\d+)[^>]*?/Type\s*/Pages\b')
+_DOCX_PAGES_RE = re.compile(rb'<(?:\w+:)?Pages>\s*(\d+)\s*</(?:\w+:)?Pages>')
+_ODT_PAGES_RE = re.compile(rb'meta:page-count="(\d+)"')
+
+
+class InputInfo(object):
+    """Struct-like object for storing details of an input file."""
+
+    def __init__(self, extension: str, pages: int = None):
+        """Setup member variables."""
+        self._extension: str = extension
+        self._pages: int = pages
+
+    @property
+    def extension(self) -> str:
+        """Return extension of format detected from file content, or None if unknown."""
+        return self._extension
+
+    @property
+    def pages(self) -> int:
+        """Return number of pages, or None if unknown."""
+        return self._pages
+
+
+def _inspect_pdf(path: str, tail: bytes, count_pages: bool) -> InputInfo:
+    """Return details of PDF file."""
+    if b'%%EOF' not in tail:
+        raise InvalidInputError('PDF file is truncated', status_code=422)
+    if not count_pages:
+        return InputInfo('pdf')
+
+    # The root of the page tree has the highest count. Page trees held
+    # in compressed object streams are not found, leaving pages unknown.
+    pages = None
+    with open(path, 'rb') as fh:
+        remainder = b''
+        while True:
+            data = fh.read(SNIFF_SIZE * 8)
+            if not data:
+                break
+            data = remainder + data
+            for match in _PDF_COUNT_RE.finditer(data):
+                count = int(match.group(1) or match.group(2))
+                pages = count if pages is None else max(pages, count)
+            # Retain end of data, in case a dictionary spans reads
+            remainder = data[-256:]
+    return InputInfo('pdf', pages=pages)
+
+
+def _read_member(archive: zipfile.ZipFile, name: str, max_size: int) -> bytes:
+    """Return start of archive member, or None if it does not exist."""
+    try:
+        with archive.open(name) as fh:
+            return fh.read(max_size)
+    except KeyError:
+        return None
+
+
+def _inspect_zip(path: str) -> InputInfo:
+    """Return details of ZIP based office document."""
+    try:
+        with zipfile.ZipFile(path) as archive:
+            mimetype = _read_member(archive, 'mimetype', len(ODT_MIMETYPE) + 1)
+            if mimetype is not None and mimetype.strip() == ODT_MIMETYPE:
+                meta = _read_member(archive, 'meta.xml', SNIFF_SIZE * 8) or b''
+                match = _ODT_PAGES_RE.search(meta)
+                return InputInfo('odt', pages=int(match.group(1)) if match else None)
+
+            names = set(archive.namelist())
+            if '[Content_Types].xml' in names and 'word/document.xml' in names:
+                app = _read_member(archive, 'docProps/app.xml', SNIFF_SIZE * 8) or b''
+                match = _DOCX_PAGES_RE.search(app)
+                return InputInfo('docx', pages=int(match.group(1)) if match else None)
+    except (zipfile.BadZipFile, EOFError):
+        raise InvalidInputError('Document archive is truncated or corrupt', status_code=422)
+    return InputInfo(None)
+
+
+def _inspect_ole(size: int, head: bytes) -> InputInfo:
+    """Return details of OLE compound document."""
+    # Header is followed by at least one sector, of size given by the sector shift
+    sector_shift = int.from_bytes(head[30:32], 'little')
+    if sector_shift not in (9, 12) or size < 512 + (1 << sector_shift):
+        raise InvalidInputError('Document is truncated or corrupt', status_code=422)
+    return InputInfo('doc')
+
+
+def inspect(path: str, size: int, count_pages: bool = True) -> InputInfo:
+    """Return details of input file, detecting its format from its content.
+
+    Counting pages of PDF files reads the whole file, so may be disabled.
+    Raises InvalidInputError if the file structure is truncated or corrupt.
+    """
+    with open(path, 'rb') as fh:
+        head = fh.read(SNIFF_SIZE)
+        fh.seek(max(0, size - SNIFF_SIZE))
+        tail = fh.read(SNIFF_SIZE)
+
+    if PDF_MAGIC in head[:1024]:
+        return _inspect_pdf(path, tail, count_pages)
+    if head.startswith(OLE_MAGIC):
+        return _inspect_ole(size, head)
+    if head.startswith(RTF_MAGIC):
+        # Word documents are commonly provided as RTF, which is converted as doc
+        return InputInfo('doc')
+    if head.startswith(ZIP_MAGIC):
+        return _inspect_zip(path)
+    if head and b'\x00' not in head:
+        # Treat text as HTML, which is how it is converted
+        return InputInfo('html')
+    return InputInfo(None)
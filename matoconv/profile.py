@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""Pre-initialised LibreOffice user profile template."""
+
+import fnmatch
+import os
+import shutil
+import subprocess
+import time
+
+from matoconv.exceptions import ProfileTemplateError
+
+
+class ProfileTemplate(object):
+    """Golden LibreOffice user profile, built once and cloned for each conversion."""
+
+    CLONE_MODES = ('reflink', 'hardlink', 'copy')
+
+    # Files that LibreOffice may rewrite in place, which must never
+    # be shared between profiles when hardlinking.
+    MUTABLE_PATTERNS = ('*.xcu', '*.lock', '.lock', '*.db', '*.pmap', '*.dat')
+
+    def __init__(self, path: str, clone_mode: str, build_timeout: int):
+        """Store template settings."""
+        if clone_mode not in self.CLONE_MODES:
+            raise ProfileTemplateError(
+                'Unknown profile clone mode: {}'.format(clone_mode))
+        self._path: str = path
+        self._clone_mode: str = clone_mode
+        self._build_timeout: int = build_timeout
+        self._ready: bool = False
+
+    @property
+    def path(self) -> str:
+        """Return path of template profile."""
+        return self._path
+
+    @property
+    def ready(self) -> bool:
+        """Return whether template has been built."""
+        return self._ready
+
+    def get_command(self) -> list:
+        """Return command used to initialise the template profile."""
+        return [
+            'soffice',
+            '--headless',
+            '--terminate_after_init',
+            '-env:UserInstallation=file://' + self._path,
+            '--nocrashreport',
+            '--nodefault',
+            '--nofirststartwizard',
+            '--nologo',
+            '--norestore'
+        ]
+
+    def build(self) -> float:
+        """Initialise template profile, returning time taken in seconds."""
+        start_time = time.monotonic()
+
+        # Start from an empty profile, in case of a stale template
+        # from a previous run.
+        shutil.rmtree(self._path, ignore_errors=True)
+        os.makedirs(self._path)
+
+        try:
+            subprocess.run(
+                self.get_command(),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=self._build_timeout,
+                check=True)
+        except (OSError, subprocess.SubprocessError) as exc:
+            raise ProfileTemplateError(
+                'Unable to build profile template: {}'.format(exc))
+
+        if not os.path.isdir(os.path.join(self._path, 'user')):
+            raise ProfileTemplateError(
+                'LibreOffice did not create a user profile in template')
+
+        self._ready = True
+        return time.monotonic() - start_time
+
+    def _is_mutable(self, filename: str) -> bool:
+        """Return whether file must be copied rather than linked."""
+        return any(fnmatch.fnmatch(filename, pattern)
+                   for pattern in self.MUTABLE_PATTERNS)
+
+    def clone(self, destination: str):
+        """Create copy of template profile at destination."""
+        if not self._ready:
+            raise ProfileTemplateError('Profile template has not been built')
+
+        os.makedirs(destination, exist_ok=True)
+
+        if self._clone_mode == 'reflink':
+            # Copy-on-write clone, where the filesystem supports it,
+            # otherwise cp falls back to a regular copy.
+            try:
+                subprocess.run(
+                    ['cp', '-a', '--reflink=auto', self._path + '/.', destination],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.PIPE,
+                    check=True)
+            except (OSError, subprocess.SubprocessError) as exc:
+                raise ProfileTemplateError(
+                    'Unable to clone profile template: {}'.format(exc))
+            return
+
+        for root, dirs, files in os.walk(self._path):
+            target_root = os.path.join(
+                destination, os.path.relpath(root, self._path))
+            for dir_name in dirs:
+                os.makedirs(os.path.join(target_root, dir_name), exist_ok=True)
+            for file_name in files:
+                source = os.path.join(root, file_name)
+                target = os.path.join(target_root, file_name)
+                if self._clone_mode == 'hardlink' and not self._is_mutable(file_name):
+                    try:
+                        os.link(source, target)
+                        continue
+                    except OSError:
+                        # Fall back to copying, e.g. when crossing filesystems
+                        pass
+                shutil.copy2(source, target, follow_symlinks=False)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Streaming of conversion output whilst it is being written."""
+
+import threading
+
+
+class OutputProgress(object):
+    """Progress of a conversion writing its output file progressively.
+
+    Converter backends advance the progress as each part of the output
+    is written, allowing it to be streamed before the conversion has finished.
+    Once finished, the logs of the conversion are recorded, which are empty
+    if it succeeded.
+    """
+
+    def __init__(self):
+        """Setup member variables."""
+        self._condition = threading.Condition()
+        self._size: int = 0
+        self._finished: bool = False
+        self._logs: list = []
+
+    @property
+    def streaming(self) -> bool:
+        """Return whether output has been partially written."""
+        return self._size > 0
+
+    @property
+    def logs(self) -> list:
+        """Return logs of finished conversion."""
+        return self._logs
+
+    def advance(self, size: int):
+        """Record size of output written so far (bytes)."""
+        with self._condition:
+            self._size = size
+            self._condition.notify_all()
+
+    def finish(self, logs: list):
+        """Mark conversion as finished, with its logs."""
+        with self._condition:
+            self._finished = True
+            self._logs = logs
+            self._condition.notify_all()
+
+    def wait_streaming(self, timeout: float) -> bool:
+        """Wait for output to be partially written or the conversion to finish,
+        returning whether output is being streamed before the conversion finished.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._size or self._finished, timeout)
+            return self.streaming and not self._finished
+
+    def wait_finished(self) -> bool:
+        """Wait for conversion to finish, returning whether it succeeded."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._finished)
+            return not self._logs
+
+    def iter_written(self, fh, chunk_size: int):
+        """Yield chunks of output file as they are written, until the conversion
+        finishes. Output of failed conversions is truncated.
+        """
+        position = 0
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._size > position or self._finished)
+                size, finished, success = self._size, self._finished, not self._logs
+            if finished and not success:
+                return
+            # Output is complete once the conversion has succeeded
+            while finished or position < size:
+                data = fh.read(chunk_size if finished else min(chunk_size, size - position))
+                if not data:
+                    break
+                position += len(data)
+                yield data
+            if finished:
+                return
+
+
+class ProgressiveStream(object):
+    """Response body streaming the output of a conversion whilst it is written.
+
+    on_close is called once the conversion has finished and the
+    response has been sent, or the client has disconnected.
+    """
+
+    def __init__(self, progress: OutputProgress, fh, chunk_size: int, on_close):
+        """Setup member variables."""
+        self._progress: OutputProgress = progress
+        self._fh = fh
+        self._chunk_size: int = chunk_size
+        self._on_close = on_close
+        self._closed: bool = False
+
+    def __iter__(self):
+        """Yield output as it is written."""
+        return self._progress.iter_written(self._fh, self._chunk_size)
+
+    def close(self):
+        """Wait for conversion to finish, then close output file and call on_close."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._fh.close()
+            self._progress.wait_finished()
+        finally:
+            self._on_close()
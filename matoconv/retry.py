@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""Retry of failed conversions, with retry budgets and circuit breakers per format pair."""
+
+import collections
+import random
+import threading
+import time
+
+
+class RetryPolicy(object):
+    """Delay between attempts, using exponential backoff with jitter."""
+
+    def __init__(self, max_attempts: int, base_delay: float, max_delay: float):
+        """Setup member variables."""
+        self._max_attempts: int = max_attempts
+        self._base_delay: float = base_delay
+        self._max_delay: float = max_delay
+
+    @property
+    def max_attempts(self) -> int:
+        """Return maximum number of attempts."""
+        return self._max_attempts
+
+    def delay(self, attempt: int) -> float:
+        """Return delay after the given failed attempt (seconds).
+
+        The delay is randomised between half and all of the backoff, so
+        that retries of conversions failing together are spread out.
+        """
+        backoff = min(self._max_delay, self._base_delay * 2 ** (attempt - 1))
+        return random.uniform(backoff / 2, backoff)
+
+
+class RetryBudget(object):
+    """Limit retries to a proportion of recent requests.
+
+    Once failures are widespread, retrying every request would multiply
+    load, so retries beyond the budget fail immediately.
+    """
+
+    def __init__(self, ratio: float, min_retries: int, window: float):
+        """Setup member variables."""
+        self._ratio: float = ratio
+        self._min_retries: int = min_retries
+        self._window: float = window
+        self._requests = collections.deque()
+        self._retries = collections.deque()
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float):
+        """Remove requests and retries older than the window."""
+        for events in (self._requests, self._retries):
+            while events and events[0] < now - self._window:
+                events.popleft()
+
+    def record_request(self):
+        """Record request, adding to the budget."""
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            self._requests.append(now)
+
+    def try_spend(self) -> bool:
+        """Spend a retry from the budget, returning whether one was available."""
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            if len(self._retries) >= self._min_retries + self._ratio * len(self._requests):
+                return False
+            self._retries.append(now)
+            return True
+
+
+class CircuitBreaker(object):
+    """Fail conversions immediately whilst the recent failure rate is high.
+
+    Once open, a single trial conversion is allowed after the cooldown,
+    closing the breaker if it succeeds.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, threshold: float, min_attempts: int, window: int, cooldown: float):
+        """Setup member variables."""
+        self._threshold: float = threshold
+        self._min_attempts: int = min_attempts
+        self._cooldown: float = cooldown
+        self._outcomes = collections.deque(maxlen=window)
+        self._state: str = CircuitBreaker.CLOSED
+        self._opened_at: float = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Return state of circuit breaker."""
+        return self._state
+
+    def retry_after(self) -> int:
+        """Return time until a trial conversion is allowed (seconds)."""
+        with self._lock:
+            if self._state == CircuitBreaker.CLOSED:
+                return 1
+            return max(1, int(self._opened_at + self._cooldown - time.monotonic()) + 1)
+
+    def allow(self) -> bool:
+        """Return whether a conversion is allowed."""
+        with self._lock:
+            if self._state == CircuitBreaker.CLOSED:
+                return True
+            now = time.monotonic()
+            if now < self._opened_at + self._cooldown:
+                return False
+            # Allow a trial conversion, and another after each cooldown
+            # should the trial not complete
+            self._state = CircuitBreaker.HALF_OPEN
+            self._opened_at = now
+            return True
+
+    def record(self, success: bool):
+        """Record outcome of a conversion attempt."""
+        with self._lock:
+            if self._state == CircuitBreaker.HALF_OPEN:
+                if success:
+                    self._state = CircuitBreaker.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+
+            self._outcomes.append(success)
+            failures = self._outcomes.count(False)
+            if (self._state == CircuitBreaker.CLOSED and
+                    len(self._outcomes) >= self._min_attempts and
+                    failures / len(self._outcomes) >= self._threshold):
+                self._open()
+
+    def _open(self):
+        """Open circuit breaker, whilst holding the lock."""
+        self._state = CircuitBreaker.OPEN
+        self._opened_at = time.monotonic()
+
+
+class RetryController(object):
+    """Retry policy, with a retry budget and circuit breaker for each format pair."""
+
+    def __init__(self, policy: RetryPolicy, budget_ratio: float, budget_min_retries: int,
+                 breaker_threshold: float, breaker_min_attempts: int, breaker_window: int,
+                 breaker_cooldown: float, budget_window: float = 60):
+        """Setup member variables."""
+        self._policy: RetryPolicy = policy
+        self._budget_ratio: float = budget_ratio
+        self._budget_min_retries: int = budget_min_retries
+        self._budget_window: float = budget_window
+        self._breaker_threshold: float = breaker_threshold
+        self._breaker_min_attempts: int = breaker_min_attempts
+        self._breaker_window: int = breaker_window
+        self._breaker_cooldown: float = breaker_cooldown
+        self._budgets = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def policy(self) -> RetryPolicy:
+        """Return retry policy."""
+        return self._policy
+
+    def budget(self, source: str, destination: str) -> RetryBudget:
+        """Return retry budget of format pair."""
+        with self._lock:
+            if (source, destination) not in self._budgets:
+                self._budgets[(source, destination)] = RetryBudget(
+                    self._budget_ratio, self._budget_min_retries, self._budget_window)
+            return self._budgets[(source, destination)]
+
+    def breaker(self, source: str, destination: str) -> CircuitBreaker:
+        """Return circuit breaker of format pair."""
+        with self._lock:
+            if (source, destination) not in self._breakers:
+                self._breakers[(source, destination)] = CircuitBreaker(
+                    self._breaker_threshold, self._breaker_min_attempts,
+                    self._breaker_window, self._breaker_cooldown)
+            return self._breakers[(source, destination)]
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Routing of conversions through a graph of formats."""
+
+import collections
+import heapq
+import threading
+
+
+class Conversion(object):
+    """Struct-like object for storing a conversion
+    between two formats, performed by a converter backend.
+    """
+
+    def __init__(self, backend: str, source: str, destination: str, cost: float):
+        """Setup member variables."""
+        self._backend: str = backend
+        self._source: str = source
+        self._destination: str = destination
+        self._cost: float = cost
+
+    @property
+    def backend(self) -> str:
+        """Return name of converter backend performing conversion."""
+        return self._backend
+
+    @property
+    def source(self) -> str:
+        """Return extension of source format."""
+        return self._source
+
+    @property
+    def destination(self) -> str:
+        """Return extension of destination format."""
+        return self._destination
+
+    @property
+    def cost(self) -> float:
+        """Return estimated duration of conversion (seconds), used until it is measured."""
+        return self._cost
+
+    def __repr__(self) -> str:
+        """Return representation of conversion."""
+        return '{}({} -> {})'.format(self._backend, self._source, self._destination)
+
+
+class ConversionGraph(object):
+    """Graph of formats, with conversions as edges.
+
+    The cost of each conversion is its mean duration over the most recent
+    conversions performed, falling back to its estimated cost until one
+    has been performed. Routes are the cheapest path between formats.
+
+    Durations of conversions are also recorded per unit of work, such as
+    pages, to estimate durations of conversions of inputs of a given size.
+    """
+
+    def __init__(self, max_steps: int, window: int):
+        """Setup member variables."""
+        self._max_steps: int = max_steps
+        self._window: int = window
+        self._conversions = {}
+        self._durations = {}
+        self._unit_durations = {}
+        self._lock = threading.Lock()
+
+    def add_conversion(self, conversion: Conversion):
+        """Add conversion to graph."""
+        with self._lock:
+            self._conversions.setdefault(conversion.source, []).append(conversion)
+            self._durations[conversion] = collections.deque(maxlen=self._window)
+            self._unit_durations[conversion] = collections.deque(maxlen=self._window)
+
+    def _cost(self, conversion: Conversion) -> float:
+        """Return cost of conversion (seconds), whilst holding the lock."""
+        durations = self._durations[conversion]
+        if not durations:
+            return conversion.cost
+        return sum(durations) / len(durations)
+
+    def cost(self, conversion: Conversion) -> float:
+        """Return cost of conversion (seconds)."""
+        with self._lock:
+            return self._cost(conversion)
+
+    def estimate(self, conversion: Conversion, units: float) -> float:
+        """Return expected duration of conversion of input of units of work (seconds),
+        falling back to its cost until one has been performed with known units.
+        """
+        with self._lock:
+            unit_durations = self._unit_durations[conversion]
+            if not unit_durations:
+                return self._cost(conversion)
+            return sum(unit_durations) / len(unit_durations) * units
+
+    def observe(self, conversion: Conversion, duration: float, units: float = None):
+        """Record duration of a successful conversion (seconds), of input of units of work, if known."""
+        with self._lock:
+            self._durations[conversion].append(duration)
+            if units:
+                self._unit_durations[conversion].append(duration / units)
+
+    def find_route(self, source: str, destination: str) -> list:
+        """Return cheapest list of conversions from source to destination format,
+        or None if there is no route within the maximum number of steps.
+        """
+        with self._lock:
+            costs = {conversion: self._cost(conversion) for conversion in self._durations}
+            conversions = self._conversions
+
+        # Routes are compared by cost, then by number of steps, so that the
+        # fewest steps are used for routes of equal cost, then by order found.
+        queue = [(0, 0, 0, source, ())]
+        found = 0
+        visited = set()
+        while queue:
+            cost, steps, _, extension, route = heapq.heappop(queue)
+            if route and extension == destination:
+                return list(route)
+            if (extension, steps) in visited or steps >= self._max_steps:
+                continue
+            visited.add((extension, steps))
+            for conversion in conversions.get(extension, []):
+                found += 1
+                heapq.heappush(queue, (
+                    cost + costs[conversion], steps + 1, found, conversion.destination,
+                    route + (conversion, )))
+        return None
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""Scheduling of conversions onto converter slots within the server process."""
+
+import queue
+import threading
+
+from matoconv.retry import RetryPolicy
+
+
+class Task(object):
+    """Conversion task submitted to the scheduler.
+
+    If a retry policy is provided, attempts for which should_retry returns
+    True are retried, until the maximum attempts of the policy. Between
+    attempts, the task's converter slot is given up by calling release,
+    and obtained again by calling reacquire.
+    """
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUSPENDED = 'suspended'
+    RESUMING = 'resuming'
+    DONE = 'done'
+    CANCELLED = 'cancelled'
+
+    def __init__(self, func, args: tuple, callback=None, error_callback=None,
+                 retry_policy: RetryPolicy = None, should_retry=None,
+                 release=None, reacquire=None):
+        """Setup member variables."""
+        self._func = func
+        self._args: tuple = args
+        self._callback = callback
+        self._error_callback = error_callback
+        self._retry_policy: RetryPolicy = retry_policy
+        self._should_retry = should_retry
+        self._release = release
+        self._reacquire = reacquire
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._state: str = Task.QUEUED
+        self._attempts: int = 0
+        self._result = None
+        self._error: BaseException = None
+
+    @property
+    def cancelled(self) -> bool:
+        """Return whether task was cancelled before finishing."""
+        return self._state == Task.CANCELLED
+
+    @property
+    def attempts(self) -> int:
+        """Return number of attempts started."""
+        return self._attempts
+
+    def cancel(self) -> bool:
+        """Cancel task, if it is not running or finished, returning whether it was cancelled.
+
+        The converter slot of a queued task is released.
+        """
+        with self._lock:
+            state = self._state
+            if state not in (Task.QUEUED, Task.SUSPENDED, Task.RESUMING):
+                return False
+            self._state = Task.CANCELLED
+        if state == Task.QUEUED and self._release:
+            self._release()
+        return True
+
+    def retry_delay(self) -> float:
+        """Return delay before the next attempt (seconds)."""
+        return self._retry_policy.delay(self._attempts)
+
+    def run(self) -> bool:
+        """Run attempt of task, unless cancelled, calling callbacks with its result or error.
+
+        Returns False if the attempt is to be retried, rather than finishing the task.
+        """
+        with self._lock:
+            if self._state == Task.CANCELLED:
+                return True
+            self._state = Task.RUNNING
+        self._attempts += 1
+
+        result = None
+        error = None
+        try:
+            result = self._func(*self._args)
+        except BaseException as exc:
+            error = exc
+
+        try:
+            if (error is None and self._retry_policy is not None and
+                    self._attempts < self._retry_policy.max_attempts and
+                    self._should_retry(result)):
+                with self._lock:
+                    self._state = Task.SUSPENDED
+                return False
+        except Exception as exc:
+            error = exc
+
+        self._result = result
+        self._error = error
+        try:
+            if self._error is None:
+                if self._callback:
+                    self._callback(self._result)
+            elif self._error_callback:
+                self._error_callback(self._error)
+        except Exception as exc:
+            # Errors raised by callbacks must not stop the converter slot
+            self._error = exc
+        finally:
+            with self._lock:
+                self._state = Task.DONE
+            self._done.set()
+        return True
+
+    def suspend(self):
+        """Give up converter slot of task, whilst waiting to retry."""
+        if self._release:
+            self._release()
+
+    def resume(self) -> bool:
+        """Obtain converter slot for next attempt, returning False if the task was cancelled."""
+        with self._lock:
+            if self._state == Task.CANCELLED:
+                return False
+            self._state = Task.RESUMING
+        if self._reacquire:
+            self._reacquire()
+        with self._lock:
+            if self._state != Task.CANCELLED:
+                self._state = Task.QUEUED
+                return True
+        # Cancelled whilst obtaining slot
+        if self._release:
+            self._release()
+        return False
+
+    def get(self, timeout: float = None):
+        """Wait for task to finish and return its result, raising its error.
+
+        Raises TimeoutError if the task does not finish within the timeout.
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError('Timed out waiting for conversion')
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class ConverterScheduler(object):
+    """Run conversion tasks on a fixed number of converter slot threads.
+
+    Each slot supervises its converter subprocesses directly, so no
+    worker processes or pickling are involved, and a task raising an
+    error cannot take a slot down with it.
+    """
+
+    def __init__(self, slots: int):
+        """Start converter slot threads."""
+        self._queue = queue.Queue()
+        self._threads = [
+            threading.Thread(
+                target=self._run_slot, name='matoconv-converter-{}'.format(index),
+                daemon=True)
+            for index in range(slots)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _run_slot(self):
+        """Run tasks from the queue until stopped."""
+        while True:
+            task = self._queue.get()
+            if task is None:
+                return
+            if not task.run():
+                self._retry(task)
+
+    def _retry(self, task: Task):
+        """Release converter slot of task, queueing it again after its retry delay.
+
+        The slot thread is free to run other tasks whilst the task waits.
+        """
+        task.suspend()
+        timer = threading.Timer(task.retry_delay(), self._resume, (task, ))
+        timer.daemon = True
+        timer.start()
+
+    def _resume(self, task: Task):
+        """Queue task for its next attempt, once it has obtained a converter slot."""
+        if task.resume():
+            self._queue.put(task)
+
+    def submit(self, func, args: tuple, callback=None, error_callback=None,
+               retry_policy: RetryPolicy = None, should_retry=None,
+               release=None, reacquire=None) -> Task:
+        """Queue task, calling callback with its result or error_callback with its error.
+
+        See Task for retry of attempts.
+        """
+        task = Task(func, args, callback=callback, error_callback=error_callback,
+                    retry_policy=retry_policy, should_retry=should_retry,
+                    release=release, reacquire=reacquire)
+        self._queue.put(task)
+        return task
+
+    def stop(self):
+        """Stop converter slot threads once queued tasks have run."""
+        for _ in self._threads:
+            self._queue.put(None)
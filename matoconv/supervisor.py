@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""Supervision of converter processes, with resource limits and bounded output capture."""
+
+import collections
+import os
+import resource
+import signal
+import subprocess
+import threading
+import time
+
+
+# Return code of conversion commands killed by timeout, matching that of timeout(1)
+TIMEOUT_RC = 124
+
+
+class ProcessUsage(object):
+    """Struct-like object for storing resources used by a converter process,
+    including its descendants which it waited for.
+    """
+
+    def __init__(self, wall_time: float, cpu_time: float, max_rss: int):
+        """Setup member variables."""
+        self._wall_time: float = wall_time
+        self._cpu_time: float = cpu_time
+        self._max_rss: int = max_rss
+
+    @property
+    def wall_time(self) -> float:
+        """Return time process ran for (seconds)."""
+        return self._wall_time
+
+    @property
+    def cpu_time(self) -> float:
+        """Return user and system CPU time used (seconds)."""
+        return self._cpu_time
+
+    @property
+    def max_rss(self) -> int:
+        """Return peak resident set size (bytes)."""
+        return self._max_rss
+
+    def __str__(self) -> str:
+        """Return summary of usage, for logs."""
+        return 'wall time {:.2f}s, CPU time {:.2f}s, peak RSS {} bytes'.format(
+            self._wall_time, self._cpu_time, self._max_rss)
+
+
+class OutputBuffer(object):
+    """Buffer of process output, keeping only the most recent output once full."""
+
+    def __init__(self, size: int):
+        """Setup member variables."""
+        self._size: int = size
+        self._chunks = collections.deque()
+        self._length: int = 0
+        self._discarded: int = 0
+
+    @property
+    def discarded(self) -> int:
+        """Return number of bytes discarded (bytes)."""
+        return self._discarded
+
+    def write(self, data: bytes):
+        """Add output, discarding the oldest output beyond the size of the buffer."""
+        self._chunks.append(data)
+        self._length += len(data)
+        while self._length > self._size:
+            excess = self._length - self._size
+            if len(self._chunks[0]) <= excess:
+                chunk = self._chunks.popleft()
+                self._length -= len(chunk)
+                self._discarded += len(chunk)
+            else:
+                self._chunks[0] = self._chunks[0][excess:]
+                self._length -= excess
+                self._discarded += excess
+
+    def getvalue(self) -> bytes:
+        """Return output held by the buffer."""
+        return b''.join(self._chunks)
+
+    def drain(self, fh, chunk_size: int = 64 * 1024):
+        """Read file until it is closed, adding its data to the buffer."""
+        try:
+            for data in iter(lambda: os.read(fh.fileno(), chunk_size), b''):
+                self.write(data)
+        finally:
+            fh.close()
+
+
+class ProcessResult(object):
+    """Struct-like object for storing the outcome of a supervised process."""
+
+    def __init__(self, rc: int, stdout: OutputBuffer, stderr: OutputBuffer, usage: ProcessUsage):
+        """Setup member variables."""
+        self._rc: int = rc
+        self._stdout: OutputBuffer = stdout
+        self._stderr: OutputBuffer = stderr
+        self._usage: ProcessUsage = usage
+
+    @property
+    def rc(self) -> int:
+        """Return RC of process, or TIMEOUT_RC if it was killed by timeout."""
+        return self._rc
+
+    @property
+    def stdout(self) -> OutputBuffer:
+        """Return most recent stdout of process."""
+        return self._stdout
+
+    @property
+    def stderr(self) -> OutputBuffer:
+        """Return most recent stderr of process."""
+        return self._stderr
+
+    @property
+    def usage(self) -> ProcessUsage:
+        """Return resources used by process."""
+        return self._usage
+
+
+def kill_process_group(pgid: int, sig: int = signal.SIGKILL):
+    """Signal all processes of process group, if any remain."""
+    try:
+        os.killpg(pgid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class ProcessSupervisor(object):
+    """Run converter processes, each in a process group of its own.
+
+    On timeout, the whole process group is terminated, then killed after
+    kill_grace seconds, so that processes started by converters, such as
+    soffice.bin, are not left behind. Any processes of the group remaining
+    once the converter exits are killed.
+
+    Processes are limited to cpu_limit seconds of CPU time and memory_limit
+    bytes of address space, if non-zero. stdout and stderr are read whilst
+    the process runs, keeping the last output_limit bytes of each.
+    """
+
+    def __init__(self, cpu_limit: int = 0, memory_limit: int = 0,
+                 output_limit: int = 64 * 1024, kill_grace: float = 5):
+        """Setup member variables."""
+        self._cpu_limit: int = cpu_limit
+        self._memory_limit: int = memory_limit
+        self._output_limit: int = output_limit
+        self._kill_grace: float = kill_grace
+
+    def _set_limits(self):
+        """Apply resource limits, in the child process before running the converter."""
+        if self._cpu_limit:
+            # Processes receive SIGXCPU at the soft limit and are killed at the hard limit
+            resource.setrlimit(resource.RLIMIT_CPU, (self._cpu_limit, self._cpu_limit + 1))
+        if self._memory_limit:
+            resource.setrlimit(resource.RLIMIT_AS, (self._memory_limit, self._memory_limit))
+
+    def run(self, cmd: list, env: dict, cwd: str, timeout: float = None) -> ProcessResult:
+        """Run command, returning its RC, output and resource usage."""
+        started_at = time.monotonic()
+        p = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=cwd,
+            env=env,
+            start_new_session=True,
+            preexec_fn=self._set_limits if self._cpu_limit or self._memory_limit else None)
+
+        stdout = OutputBuffer(self._output_limit)
+        stderr = OutputBuffer(self._output_limit)
+        readers = [
+            threading.Thread(target=buffer.drain, args=(fh, ), daemon=True)
+            for buffer, fh in ((stdout, p.stdout), (stderr, p.stderr))
+        ]
+        for reader in readers:
+            reader.start()
+
+        # Process is not reaped until its process group has been killed, so that
+        # the group ID cannot be reused by another process before then.
+        exited = threading.Event()
+
+        def wait():
+            os.waitid(os.P_PID, p.pid, os.WEXITED | os.WNOWAIT)
+            exited.set()
+
+        waiter = threading.Thread(target=wait, daemon=True)
+        waiter.start()
+
+        timed_out = not exited.wait(timeout)
+        if timed_out:
+            kill_process_group(p.pid, signal.SIGTERM)
+            if not exited.wait(self._kill_grace):
+                kill_process_group(p.pid, signal.SIGKILL)
+                exited.wait()
+        # Descendants left running would hold output pipes open
+        kill_process_group(p.pid, signal.SIGKILL)
+        _, status, rusage = os.wait4(p.pid, 0)
+        p.returncode = os.waitstatus_to_exitcode(status)
+        for reader in readers:
+            reader.join()
+
+        usage = ProcessUsage(
+            wall_time=time.monotonic() - started_at,
+            cpu_time=rusage.ru_utime + rusage.ru_stime,
+            # ru_maxrss is measured in kilobytes on Linux
+            max_rss=rusage.ru_maxrss * 1024)
+        return ProcessResult(TIMEOUT_RC if timed_out else p.returncode, stdout, stderr, usage)
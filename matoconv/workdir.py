@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""Working directories of conversions, removed in the background once finished."""
+
+import contextlib
+import os
+import queue
+import shutil
+import tempfile
+import threading
+
+
+class WorkDirectories(object):
+    """Working directories of conversions, created beneath a work root,
+    such as a memory-backed filesystem.
+
+    Each process creates its directories within a directory of its own,
+    named by its process ID. Finished directories are removed by a reaper
+    thread, so that removing them does not delay responses. Directories of
+    processes which are no longer running, such as after a crash, are
+    removed on startup.
+    Once usage of the filesystem holding the work root reaches max_usage,
+    directories are created in the default temporary directory instead.
+    """
+
+    PREFIX = 'matoconv-work-'
+
+    def __init__(self, root: str = None, max_usage: int = 0):
+        """Setup member variables and remove directories of previous processes."""
+        self._root: str = root or None
+        self._max_usage: int = max_usage
+        self._pid: int = os.getpid()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        # Directory of this process within each root
+        self._process_directories = {}
+
+        self._reaper = threading.Thread(target=self._reap, name='matoconv-reaper', daemon=True)
+        self._reaper.start()
+
+        if self._root:
+            os.makedirs(self._root, exist_ok=True)
+        for directory in self.roots:
+            self.sweep(directory)
+
+    @property
+    def roots(self) -> list:
+        """Return directories that working directories may be created in."""
+        roots = [tempfile.gettempdir()]
+        if self._root and os.path.realpath(self._root) != os.path.realpath(roots[0]):
+            roots.insert(0, self._root)
+        return roots
+
+    def _process_directory(self, root: str) -> str:
+        """Return directory of this process within root, creating it if it does not exist."""
+        with self._lock:
+            if root not in self._process_directories:
+                self._process_directories[root] = tempfile.mkdtemp(
+                    prefix='{}{}-'.format(self.PREFIX, self._pid), dir=root)
+            return self._process_directories[root]
+
+    def _over_usage(self) -> bool:
+        """Return whether usage of the filesystem holding the work root has reached its limit."""
+        if not self._max_usage:
+            return False
+        try:
+            return shutil.disk_usage(self._root).used >= self._max_usage
+        except OSError:
+            return True
+
+    def create(self) -> str:
+        """Create working directory, returning its path."""
+        root = self._root if self._root and not self._over_usage() else tempfile.gettempdir()
+        return tempfile.mkdtemp(prefix='matoconv-', dir=self._process_directory(root))
+
+    def release(self, path: str):
+        """Queue finished directory to be removed by the reaper thread."""
+        self._queue.put(path)
+
+    @contextlib.contextmanager
+    def directory(self):
+        """Provide working directory, released once the context exits."""
+        path = self.create()
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    @staticmethod
+    def _process_running(pid: int) -> bool:
+        """Return whether process is running."""
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def sweep(self, root: str):
+        """Queue directories within root of processes which are no longer running
+        to be removed. Other directories with the ID of this process were left by
+        a previous process with the same ID.
+        """
+        try:
+            dir_entries = list(os.scandir(root))
+        except OSError:
+            return
+        for dir_entry in dir_entries:
+            if not dir_entry.name.startswith(self.PREFIX) or not dir_entry.is_dir(follow_symlinks=False):
+                continue
+            try:
+                pid = int(dir_entry.name[len(self.PREFIX):].split('-')[0])
+            except ValueError:
+                continue
+            with self._lock:
+                current = dir_entry.path in self._process_directories.values()
+            if current:
+                continue
+            if pid == self._pid or not self._process_running(pid):
+                self.release(dir_entry.path)
+
+    def wait_removed(self):
+        """Wait for queued directories to be removed."""
+        self._queue.join()
+
+    def _reap(self):
+        """Remove directories as they are queued."""
+        while True:
+            path = self._queue.get()
+            try:
+                shutil.rmtree(path, ignore_errors=True)
+            finally:
+                self._queue.task_done()
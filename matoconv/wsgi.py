@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Production server, running Matoconv in pre-forked gunicorn worker processes."""
+
+import os
+import atexit
+import shutil
+import tempfile
+
+from gunicorn.app.base import BaseApplication
+
+from matoconv import Config, Matoconv
+
+
+class ServerConfig(object):
+    """Class to provide access to production server configurations."""
+
+    LISTEN_HOST = os.environ.get('LISTEN_HOST', '0.0.0.0')
+    LISTEN_PORT = os.environ.get('LISTEN_PORT', '5000')
+    DEBUG = os.environ.get('DEBUG', False) == 'true'
+    THREADING = os.environ.get('THREADING', 'true') == 'true'
+    WEB_WORKERS = int(os.environ.get('WEB_WORKERS', 1))
+    WEB_THREADS = int(os.environ.get('WEB_THREADS', 32))
+    WEB_MAX_CONNECTIONS = int(os.environ.get('WEB_MAX_CONNECTIONS', 1000))
+    WEB_KEEPALIVE = int(os.environ.get('WEB_KEEPALIVE', 5))
+    WEB_GRACEFUL_TIMEOUT = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+
+
+def get_options() -> dict:
+    """Return gunicorn settings from configuration."""
+    return {
+        'bind': '{}:{}'.format(ServerConfig.LISTEN_HOST, ServerConfig.LISTEN_PORT),
+        'workers': ServerConfig.WEB_WORKERS,
+        # Threaded workers handle keep-alive connections without
+        # occupying a thread, up to the connection limit.
+        'worker_class': 'gthread',
+        'threads': ServerConfig.WEB_THREADS if ServerConfig.THREADING else 1,
+        'worker_connections': ServerConfig.WEB_MAX_CONNECTIONS,
+        'keepalive': ServerConfig.WEB_KEEPALIVE,
+        'graceful_timeout': ServerConfig.WEB_GRACEFUL_TIMEOUT,
+        # Conversions are limited by EXECUTION_TIMEOUT, so workers are
+        # only restarted if they stop responding to the arbiter.
+        'timeout': max(30, Config.EXECUTION_TIMEOUT * 2),
+        'loglevel': 'debug' if ServerConfig.DEBUG else 'info',
+        'accesslog': '-',
+        # Matoconv must be created in each worker, after forking,
+        # as its converter scheduler runs threads.
+        'preload_app': False,
+    }
+
+
+def share_converter_slots():
+    """Share converter slots between worker processes, so that
+    MAX_CONVERTERS limits conversions across all workers.
+    """
+    if Config.CONVERTER_SLOTS_DIR:
+        return
+    slots_dir = tempfile.mkdtemp(prefix='matoconv-slots-')
+    atexit.register(shutil.rmtree, slots_dir, True)
+    # Workers are forked from this process, so inherit the configuration.
+    Config.CONVERTER_SLOTS_DIR = slots_dir
+    os.environ['CONVERTER_SLOTS_DIR'] = slots_dir
+
+
+class MatoconvServer(BaseApplication):
+    """Gunicorn application running Matoconv."""
+
+    def __init__(self, options: dict):
+        """Store gunicorn settings."""
+        self._options: dict = options
+        super().__init__()
+
+    def load_config(self):
+        """Apply gunicorn settings."""
+        for key, value in self._options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        """Return WSGI app of Matoconv instance for worker."""
+        return Matoconv.get_instance().app
+
+
+def run():
+    """Run production server."""
+    if ServerConfig.WEB_WORKERS > 1:
+        share_converter_slots()
+    MatoconvServer(get_options()).run()
+
+
+if __name__ == '__main__':
+    run()
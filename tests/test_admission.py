@@ -0,0 +1,193 @@
+import tempfile
+import threading
+
+from unittest import TestCase, mock
+
+from matoconv.admission import AdmissionController, AdmissionRequest, SharedSlots
+from matoconv.exceptions import AdmissionRejectedError
+
+
+class TestAdmissionController(TestCase):
+
+    def test_queue_full(self):
+        """Ensure conversions beyond slots and queue depth are rejected immediately."""
+        controller = AdmissionController(slots=1, max_queue=1, max_wait=5)
+        controller.acquire()
+        controller.enqueue()
+
+        with self.assertRaises(AdmissionRejectedError) as context:
+            controller.enqueue()
+        self.assertEqual(str(context.exception), 'Conversion queue is full')
+        self.assertEqual(context.exception.retry_after, 5)
+
+    def test_wait_timeout(self):
+        """Ensure queued conversions are rejected after the maximum wait."""
+        controller = AdmissionController(slots=1, max_queue=1, max_wait=0.01)
+        controller.acquire()
+
+        with self.assertRaises(AdmissionRejectedError):
+            controller.acquire()
+        self.assertEqual(controller.waiting, 0)
+        self.assertEqual(controller.active, 1)
+
+    def test_release_admits_queued(self):
+        """Ensure releasing a slot admits a queued conversion."""
+        controller = AdmissionController(slots=1, max_queue=1, max_wait=5)
+        controller.acquire()
+
+        waiter = threading.Thread(target=controller.acquire)
+        waiter.start()
+        controller.release()
+        waiter.join()
+
+        self.assertEqual(controller.active, 1)
+        self.assertEqual(controller.waiting, 0)
+
+    def test_retry_after_drain_rate(self):
+        """Ensure retry time is based on rate of completed conversions."""
+        controller = AdmissionController(slots=1, max_queue=5, max_wait=30)
+        for _ in range(6):
+            controller.acquire()
+            controller.release()
+        controller.acquire()
+        controller.enqueue()
+
+        # 6 completions per minute, with 2 conversions ahead of a retry
+        self.assertEqual(controller.retry_after(), 20)
+
+    def test_host_load(self):
+        """Ensure conversions are rejected whilst host is overloaded."""
+        controller = AdmissionController(
+            slots=1, max_queue=1, max_wait=5, max_load=4, min_memory=1024)
+
+        with mock.patch('matoconv.admission.os.getloadavg', return_value=(5, 1, 1)):
+            with self.assertRaises(AdmissionRejectedError):
+                controller.enqueue()
+
+        with mock.patch('matoconv.admission.os.getloadavg', return_value=(1, 1, 1)), \
+                mock.patch('matoconv.admission.available_memory', return_value=512):
+            with self.assertRaises(AdmissionRejectedError):
+                controller.enqueue()
+
+        self.assertEqual(controller.waiting, 0)
+
+
+class TestAdmissionOrder(TestCase):
+
+    def _admission_order(self, controller: AdmissionController, held: AdmissionRequest,
+                         requests: list, enqueue: bool = True) -> list:
+        """Queue requests behind the held slot, unless already queued, releasing
+        each admitted request in turn, returning the order they were admitted in.
+        """
+        for request in requests:
+            if enqueue:
+                controller.enqueue(request)
+        admitted = []
+        admitted_event = threading.Semaphore(0)
+
+        def wait(request):
+            controller.wait(request)
+            admitted.append(request)
+            admitted_event.release()
+
+        threads = [threading.Thread(target=wait, args=(request, )) for request in requests]
+        for thread in threads:
+            thread.start()
+        controller.release(held)
+        for _ in requests:
+            self.assertTrue(admitted_event.acquire(timeout=5))
+            controller.release(admitted[-1])
+        for thread in threads:
+            thread.join()
+        return admitted
+
+    def test_shortest_first(self):
+        """Ensure conversions expected to be shortest are admitted first."""
+        controller = AdmissionController(slots=1, max_queue=5, max_wait=5, aging=0)
+        held = controller.acquire()
+        large = AdmissionRequest(cost=100)
+        small = AdmissionRequest(cost=1)
+        medium = AdmissionRequest(cost=10)
+
+        self.assertEqual(self._admission_order(controller, held, [large, small, medium]), [small, medium, large])
+
+    def test_aging(self):
+        """Ensure conversions which have waited are admitted ahead of shorter conversions,
+        with batch conversions ordered as if they had waited less.
+        """
+        controller = AdmissionController(slots=1, max_queue=5, max_wait=5, aging=1, batch_delay=50)
+        held = controller.acquire()
+        large = AdmissionRequest(cost=100)
+        small = AdmissionRequest(cost=1)
+        batch = AdmissionRequest(cost=0, priority=AdmissionRequest.BATCH)
+
+        with mock.patch('matoconv.admission.time.monotonic', return_value=0):
+            controller.enqueue(large)
+        with mock.patch('matoconv.admission.time.monotonic', return_value=200):
+            controller.enqueue(batch)
+            controller.enqueue(small)
+
+        self.assertEqual(
+            self._admission_order(controller, held, [large, batch, small], enqueue=False),
+            [large, small, batch])
+
+    def test_fair_share(self):
+        """Ensure tenants with fewer admitted conversions are admitted first."""
+        controller = AdmissionController(slots=2, max_queue=5, max_wait=5, aging=0)
+        controller.acquire(AdmissionRequest(tenant='a'))
+        held = controller.acquire(AdmissionRequest(tenant='b'))
+        tenant_a = AdmissionRequest(cost=1, tenant='a')
+        tenant_b = AdmissionRequest(cost=100, tenant='b')
+        tenant_c = AdmissionRequest(cost=100, tenant='c')
+
+        self.assertEqual(
+            self._admission_order(controller, held, [tenant_a, tenant_b, tenant_c]),
+            [tenant_b, tenant_c, tenant_a])
+
+    def test_reserved_slots(self):
+        """Ensure reserved slots are only used by interactive conversions."""
+        controller = AdmissionController(slots=2, max_queue=5, max_wait=0.05, reserved_slots=1)
+        controller.acquire(AdmissionRequest(priority=AdmissionRequest.BATCH))
+
+        with self.assertRaises(AdmissionRejectedError):
+            controller.acquire(AdmissionRequest(priority=AdmissionRequest.BATCH))
+        controller.acquire(AdmissionRequest(priority=AdmissionRequest.INTERACTIVE))
+        self.assertEqual(controller.active, 2)
+
+
+class TestSharedSlots(TestCase):
+
+    def setUp(self):
+        """Create shared slots directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_slots_shared(self):
+        """Ensure slots held by one instance cannot be obtained by another."""
+        slots = SharedSlots(self.directory.name, 2)
+        other_slots = SharedSlots(self.directory.name, 2)
+
+        self.assertTrue(slots.try_acquire())
+        self.assertTrue(other_slots.try_acquire())
+        self.assertFalse(slots.try_acquire())
+        self.assertFalse(other_slots.try_acquire())
+
+        other_slots.release()
+        self.assertTrue(slots.try_acquire())
+
+    def test_admission_limited_by_shared_slots(self):
+        """Ensure conversions wait for slots held by other processes."""
+        other_slots = SharedSlots(self.directory.name, 1)
+        other_slots.try_acquire()
+        controller = AdmissionController(
+            slots=1, max_queue=1, max_wait=0.05,
+            shared_slots=SharedSlots(self.directory.name, 1))
+
+        with self.assertRaises(AdmissionRejectedError):
+            controller.acquire()
+
+        other_slots.release()
+        controller.acquire()
+        self.assertEqual(controller.active, 1)
+        controller.release()
+        self.assertTrue(other_slots.try_acquire())
@@ -0,0 +1,293 @@
+
+import os
+import tempfile
+
+from unittest import TestCase, mock
+
+from matoconv import backends, ConversionDetails, FormatFactory, PageRange, PDF, HTML, JPEG
+from matoconv.exceptions import MatoconvException
+from matoconv.supervisor import OutputBuffer, ProcessResult, ProcessUsage
+
+
+class TestBackendBase(TestCase):
+
+    def setUp(self) -> None:
+        """Create conversion in temporary directory."""
+        FormatFactory.register_formats()
+        self.temp_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_directory.cleanup)
+        self.conversion_details = self._conversion('example.html', PDF())
+        with open(self.conversion_details.t_input_path, 'wb') as fh:
+            fh.write(b'<p>Example</p>')
+        return super().setUp()
+
+    def _conversion(self, filename: str, dest_format, index: int = 0) -> ConversionDetails:
+        """Return conversion details of file in the temporary directory."""
+        return ConversionDetails(
+            content_disp_headers='attachment; filename="{}"'.format(filename),
+            temp_directory=self.temp_directory.name,
+            dest_format=dest_format,
+            t_extless_filename='conversion-{}'.format(index))
+
+
+class TestSofficeBackend(TestBackendBase):
+
+    def test_convert(self):
+        """Ensure conversion runs soffice in the temporary directory, using a clone of the profile template."""
+        mock_template = mock.MagicMock()
+        mock_supervisor = mock.MagicMock()
+        backend = backends.SofficeBackend(
+            execution_timeout=10, profile_template=mock_template, supervisor=mock_supervisor)
+        usage = ProcessUsage(wall_time=1, cpu_time=0.5, max_rss=1024)
+        stderr = OutputBuffer(4)
+        stderr.write(b'Error: output')
+        mock_supervisor.run.return_value = ProcessResult(0, OutputBuffer(4), stderr, usage)
+
+        logs = []
+        self.assertEqual(backend.convert(self.conversion_details, logs), 0)
+
+        mock_template.clone.assert_called_once_with(self.conversion_details.t_profile_path)
+        cmd = mock_supervisor.run.call_args[0][0]
+        self.assertEqual(cmd[0], 'soffice')
+        self.assertIn('--convert-to', cmd)
+        self.assertEqual(cmd[-1], self.conversion_details.t_input_path)
+        self.assertEqual(mock_supervisor.run.call_args[0][2], self.temp_directory.name)
+        self.assertEqual(mock_supervisor.run.call_args[1]['timeout'], 10)
+        self.assertIn('Got RC 0', logs)
+        self.assertIn('Discarded first 9 bytes of output', logs)
+        self.assertIn('tput', logs)
+        self.assertEqual(self.conversion_details.process_usage, [usage])
+
+    def test_page_range(self):
+        """Ensure only the page range is exported to PDF."""
+        backend = backends.SofficeBackend(execution_timeout=10)
+        self.assertTrue(backend.supports_page_range('html', 'pdf'))
+        self.assertFalse(backend.supports_page_range('html', 'docx'))
+
+        conversion_details = ConversionDetails(
+            content_disp_headers='attachment; filename="example.html"',
+            temp_directory=self.temp_directory.name,
+            dest_format=PDF(),
+            page_range=PageRange(1, 2))
+        cmd = backend.get_command(conversion_details, [conversion_details.t_input_path])
+        self.assertEqual(
+            cmd[cmd.index('--convert-to') + 1],
+            'pdf:writer_pdf_Export:{"PageRange": {"type": "string", "value": "1-2"}}')
+
+    @mock.patch('matoconv.backends.run_command', return_value=0)
+    def test_convert_batch(self, mock_run_command):
+        """Ensure batch is converted by a single soffice run, with timeout scaled by the number of files."""
+        backend = backends.SofficeBackend(execution_timeout=10)
+        batch = [self.conversion_details, self._conversion('other.html', PDF(), index=1)]
+
+        self.assertEqual(backend.convert_batch(batch, []), 0)
+
+        cmd = mock_run_command.call_args[0][0]
+        self.assertEqual(cmd[0], 'soffice')
+        self.assertEqual(mock_run_command.call_args[1]['timeout'], 20)
+        self.assertEqual(cmd[-2:], [batch[0].t_input_path, batch[1].t_input_path])
+
+
+class TestOfficeListenerBackend(TestBackendBase):
+
+    @mock.patch('matoconv.backends.office.uno_available', return_value=False)
+    def test_start_without_uno(self, _):
+        """Ensure backend cannot be started without the UNO bindings."""
+        backend = backends.OfficeListenerBackend(start_timeout=1, execution_timeout=1)
+        with self.assertRaises(MatoconvException):
+            backend.start()
+        self.assertFalse(backend.is_healthy())
+
+    def test_convert_batch(self):
+        """Ensure batches are converted individually."""
+        backend = backends.OfficeListenerBackend(start_timeout=1, execution_timeout=1)
+        self.assertIsNone(backend.convert_batch([self.conversion_details], []))
+
+
+class TestPdfToHtmlBackend(TestBackendBase):
+
+    def test_convert(self):
+        """Ensure images are embedded in the pdftohtml output."""
+        backend = backends.PdfToHtmlBackend(execution_timeout=10, chunk_size=1024, image_workers=1)
+        conversion_details = self._conversion('example.pdf', HTML())
+        self.assertFalse(backend.supports('html', 'pdf'))
+        self.assertTrue(backend.supports('pdf', 'html'))
+
+        def run_command(cmd, env, cwd, logs, **kwargs):
+            with open(conversion_details.t_extless_path + '-html.html', 'wb') as fh:
+                fh.write(b'<html><head></head><body></body></html>')
+            return 0
+
+        with mock.patch('matoconv.backends.run_command', side_effect=run_command) as mock_run_command, \
+                mock.patch('matoconv.backends.postprocess.inline_images') as mock_inline_images:
+            self.assertEqual(backend.convert(conversion_details, []), 0)
+
+        self.assertEqual(mock_run_command.call_args[0][0][0], 'pdftohtml')
+        mock_inline_images.assert_called_once_with(
+            conversion_details.t_extless_path + '-html.html',
+            conversion_details.t_output_path,
+            self.temp_directory.name, [], chunk_size=1024, workers=1)
+
+    def test_image_assets(self):
+        """Ensure pdftohtml output is bundled with its images, rather than embedding them."""
+        backend = backends.PdfToHtmlBackend(execution_timeout=10, chunk_size=1024, image_workers=1)
+        self.assertTrue(backend.supports_image_assets('pdf', 'html'))
+        self.assertFalse(backends.SofficeBackend(execution_timeout=10).supports_image_assets('html', 'pdf'))
+        conversion_details = ConversionDetails(
+            content_disp_headers='attachment; filename="example.pdf"',
+            temp_directory=self.temp_directory.name,
+            dest_format=HTML(),
+            image_assets=True)
+
+        def run_command(cmd, env, cwd, logs, **kwargs):
+            with open(conversion_details.t_extless_path + '-html.html', 'wb') as fh:
+                fh.write(b'<html><head></head><body></body></html>')
+            return 0
+
+        with mock.patch('matoconv.backends.run_command', side_effect=run_command), \
+                mock.patch('matoconv.backends.postprocess.inline_images') as mock_inline_images, \
+                mock.patch('matoconv.backends.postprocess.bundle_images') as mock_bundle_images:
+            self.assertEqual(backend.convert(conversion_details, []), 0)
+
+        mock_inline_images.assert_not_called()
+        mock_bundle_images.assert_called_once_with(
+            conversion_details.t_extless_path + '-html.html',
+            conversion_details.t_output_path,
+            self.temp_directory.name, [], chunk_size=1024)
+
+    def test_page_range(self):
+        """Ensure first and last pages of the page range are converted."""
+        backend = backends.PdfToHtmlBackend(execution_timeout=10, chunk_size=1024, image_workers=1)
+        for page_range, expected in [(PageRange(2, 3), ['-f', '2', '-l', '3']), (PageRange(2), ['-f', '2'])]:
+            conversion_details = ConversionDetails(
+                content_disp_headers='attachment; filename="example.pdf"',
+                temp_directory=self.temp_directory.name,
+                dest_format=HTML(),
+                page_range=page_range)
+            cmd = backend.get_command(conversion_details)
+            self.assertEqual(cmd[-len(expected) - 1:-1], expected)
+
+
+class TestPdfToHtmlShards(TestBackendBase):
+
+    def setUp(self) -> None:
+        """Create PDF with 45 pages."""
+        super().setUp()
+        self.backend = backends.PdfToHtmlBackend(
+            execution_timeout=10, chunk_size=1024, image_workers=1, shard_pages=20, shard_workers=2)
+        self.pdf_details = self._conversion('example.pdf', HTML())
+        with open(self.pdf_details.t_input_path, 'wb') as fh:
+            fh.write(b'%PDF-1.4\n1 0 obj << /Type /Pages /Count 45 >> endobj\n%%EOF\n')
+
+    def test_get_shards(self):
+        """Ensure documents larger than a shard are split into shards within the page range."""
+        self.assertEqual(self.backend.get_shards(self.pdf_details), [(1, 20), (21, 40), (41, 45)])
+
+        for page_range, shards in [(PageRange(30, 49), []), (PageRange(5), [(5, 24), (25, 44), (45, 45)])]:
+            conversion_details = ConversionDetails(
+                content_disp_headers='attachment; filename="example.pdf"',
+                temp_directory=self.temp_directory.name,
+                dest_format=HTML(),
+                t_extless_filename=self.pdf_details.t_extless_filename,
+                page_range=page_range)
+            self.assertEqual(self.backend.get_shards(conversion_details), shards)
+
+        backend = backends.PdfToHtmlBackend(execution_timeout=10, chunk_size=1024, image_workers=1)
+        self.assertFalse(backend.supports_streaming('pdf', 'html'))
+        self.assertEqual(backend.get_shards(self.pdf_details), [])
+
+    def test_convert_shards(self):
+        """Ensure shards are converted by separate processes and stitched in order."""
+        def run_command(cmd, env, cwd, logs, **kwargs):
+            first, last, output_root = cmd[cmd.index('-f') + 1], cmd[cmd.index('-l') + 1], cmd[-1]
+            with open(output_root + '-html.html', 'wb') as fh:
+                fh.write('<html><head></head><body>\n<p class="ft10">{}-{}</p>\n</body></html>'.format(
+                    first, last).encode('ascii'))
+            return 0
+
+        self.pdf_details.progress = mock.MagicMock()
+        with mock.patch('matoconv.backends.run_command', side_effect=run_command) as mock_run_command:
+            self.assertEqual(self.backend.convert(self.pdf_details, []), 0)
+
+        self.assertEqual(mock_run_command.call_count, 3)
+        with open(self.pdf_details.t_output_path, 'rb') as fh:
+            self.assertEqual(
+                fh.read(),
+                b'<html><head></head><body>\n<p class="ft10-0">1-20</p>\n'
+                b'\n<p class="ft10-1">21-40</p>\n'
+                b'\n<p class="ft10-2">41-45</p>\n'
+                b'</body>\n</html>\n')
+        self.assertEqual(self.pdf_details.progress.advance.call_count, 3)
+
+    def test_failed_shard(self):
+        """Ensure partial output is removed if a shard fails."""
+        with mock.patch('matoconv.backends.run_command', return_value=1):
+            self.assertEqual(self.backend.convert(self.pdf_details, []), 1)
+        self.assertFalse(os.path.exists(self.pdf_details.t_output_path))
+
+
+class TestPdfToPpmBackend(TestBackendBase):
+
+    def test_convert(self):
+        """Ensure first page of the page range is rendered at the requested width."""
+        backend = backends.PdfToPpmBackend(execution_timeout=10)
+        self.assertTrue(backend.supports('pdf', 'jpeg'))
+        self.assertFalse(backend.supports('html', 'png'))
+        self.assertFalse(backends.SofficeBackend(execution_timeout=10).supports('pdf', 'png'))
+
+        conversion_details = ConversionDetails(
+            content_disp_headers='attachment; filename="example.pdf"',
+            temp_directory=self.temp_directory.name,
+            dest_format=JPEG(),
+            page_range=PageRange(3, 3),
+            width=120)
+
+        def run_command(cmd, env, cwd, logs, **kwargs):
+            with open(cmd[-1] + '.jpg', 'wb') as fh:
+                fh.write(b'JPEG')
+            return 0
+
+        with mock.patch('matoconv.backends.run_command', side_effect=run_command) as mock_run_command:
+            self.assertEqual(backend.convert(conversion_details, []), 0)
+
+        cmd = mock_run_command.call_args[0][0]
+        self.assertEqual(
+            cmd,
+            ['pdftoppm', '-jpeg', '-singlefile', '-f', '3', '-scale-to-x', '120', '-scale-to-y', '-1',
+             conversion_details.t_input_path, conversion_details.t_extless_path])
+        with open(conversion_details.t_output_path, 'rb') as fh:
+            self.assertEqual(fh.read(), b'JPEG')
+
+
+class TestStubBackend(TestBackendBase):
+
+    def test_convert(self):
+        """Ensure input file is copied to the output path."""
+        backend = backends.StubBackend()
+        self.assertEqual(backend.convert(self.conversion_details, []), 0)
+        with open(self.conversion_details.t_output_path, 'rb') as fh:
+            self.assertEqual(fh.read(), b'<p>Example</p>')
+
+
+class TestRoutingTable(TestCase):
+
+    def test_parse(self):
+        """Ensure routes are parsed in order."""
+        self.assertEqual(
+            backends.parse_routing_table('html:PDF=stub, *:*=soffice,'),
+            [('html', 'pdf', 'stub'), ('*', '*', 'soffice')])
+        with self.assertRaises(MatoconvException):
+            backends.parse_routing_table('html=stub')
+
+    def test_select_backend(self):
+        """Ensure first matching route, whose backend supports the pair, is selected."""
+        routes = backends.parse_routing_table('*:html=pdftohtml,html:*=stub,*:*=soffice')
+        available = {
+            'pdftohtml': backends.PdfToHtmlBackend(1, 1, 1),
+            'stub': backends.StubBackend(),
+            'soffice': backends.SofficeBackend(1),
+        }
+        self.assertIs(backends.select_backend(routes, available, 'pdf', 'html'), available['pdftohtml'])
+        self.assertIs(backends.select_backend(routes, available, 'html', 'pdf'), available['stub'])
+        self.assertIs(backends.select_backend(routes, available, 'docx', 'html'), available['soffice'])
+        self.assertIsNone(backends.select_backend(routes[:1], available, 'docx', 'pdf'))
@@ -0,0 +1,78 @@
+import io
+import json
+import os
+import tempfile
+import zipfile
+
+from unittest import TestCase, mock
+
+from matoconv.batch import BatchFile, iter_uploads, write_archive, MANIFEST_FILENAME
+from matoconv.cache import CacheEntry
+
+
+class TestIterUploads(TestCase):
+
+    def setUp(self) -> None:
+        self.temp_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_directory.cleanup)
+        self.archive_path = os.path.join(self.temp_directory.name, 'input.zip')
+        return super().setUp()
+
+    def test_zip_body(self):
+        """Ensure members of zip request body are yielded, ignoring directories."""
+        body = io.BytesIO()
+        with zipfile.ZipFile(body, 'w') as archive:
+            archive.writestr('docs/', '')
+            archive.writestr('docs/a.html', b'<p>a</p>')
+            archive.writestr('b.odt', b'odt data')
+        body.seek(0)
+        request = mock.MagicMock(mimetype='application/zip', stream=body)
+
+        uploads = [(filename, stream.read())
+                   for filename, stream in iter_uploads(request, self.archive_path, 1024)]
+
+        self.assertEqual(uploads, [('a.html', b'<p>a</p>'), ('b.odt', b'odt data')])
+
+    def test_multipart(self):
+        """Ensure files of multipart upload are yielded."""
+        upload = mock.MagicMock(filename='../a.html', stream=io.BytesIO(b'<p>a</p>'))
+        request = mock.MagicMock(mimetype='multipart/form-data')
+        request.files.items.return_value = [('files', upload)]
+
+        uploads = [(filename, stream.read())
+                   for filename, stream in iter_uploads(request, self.archive_path, 1024)]
+
+        self.assertEqual(uploads, [('a.html', b'<p>a</p>')])
+        request.files.items.assert_called_once_with(multi=True)
+
+
+class TestWriteArchive(TestCase):
+
+    def test_write_archive(self):
+        """Ensure converted files and manifest are written, with duplicate names made unique."""
+        batch_files = []
+        for filename in ['a.html', 'a.html', 'c.txt']:
+            batch_file = BatchFile(filename)
+            batch_file.conversion_details = mock.MagicMock(ouptut_filename='a.pdf')
+            batch_files.append(batch_file)
+        batch_files[0].entry = CacheEntry('key-a', data=b'first')
+        batch_files[1].entry = CacheEntry('key-b', data=b'second')
+        batch_files[2].error = 'Unsupported source format'
+
+        with tempfile.TemporaryDirectory() as temp_directory:
+            path = os.path.join(temp_directory, 'output.zip')
+            write_archive(path, batch_files)
+
+            with zipfile.ZipFile(path) as archive:
+                self.assertEqual(archive.read('a.pdf'), b'first')
+                self.assertEqual(archive.read('1-a.pdf'), b'second')
+                manifest = json.loads(archive.read(MANIFEST_FILENAME))
+
+        self.assertEqual(manifest, [
+            {'filename': 'a.html', 'output_filename': 'a.pdf', 'success': True, 'error': None,
+             'attempts': []},
+            {'filename': 'a.html', 'output_filename': '1-a.pdf', 'success': True, 'error': None,
+             'attempts': []},
+            {'filename': 'c.txt', 'output_filename': None, 'success': False,
+             'error': 'Unsupported source format', 'attempts': []},
+        ])
@@ -0,0 +1,79 @@
+
+import io
+import os
+import tempfile
+import zipfile
+from unittest import TestCase
+
+import benchmarks
+from matoconv import FormatFactory, Matoconv, preflight
+
+
+class TestDocuments(TestCase):
+
+    def test_synthetic_pdf(self):
+        """Ensure synthetic PDF documents have the requested number of pages."""
+        document = benchmarks.synthetic_pdf(3)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, document.filename)
+            with open(path, 'wb') as fh:
+                fh.write(document.unique_data(1))
+            info = preflight.inspect(path, os.path.getsize(path))
+
+        self.assertEqual(info.extension, 'pdf')
+        self.assertEqual(info.pages, 3)
+
+    def test_unique_data(self):
+        """Ensure documents are made unique, retaining the first member of archives."""
+        odt = [document for document in benchmarks.load_corpus() if document.extension == 'odt'][0]
+        first, second = odt.unique_data(1), odt.unique_data(2)
+        self.assertNotEqual(first, second)
+        with zipfile.ZipFile(io.BytesIO(first)) as archive:
+            self.assertEqual(archive.namelist()[0], 'mimetype')
+
+        html = benchmarks.synthetic_html(1)
+        self.assertNotEqual(html.unique_data(1), html.unique_data(2))
+
+
+class TestResults(TestCase):
+
+    def test_percentile(self):
+        """Ensure percentiles use the nearest rank."""
+        values = list(range(1, 101))
+        self.assertEqual(benchmarks.percentile(values, 50), 50)
+        self.assertEqual(benchmarks.percentile(values, 99), 99)
+        self.assertEqual(benchmarks.percentile([3, 1, 2], 95), 3)
+        self.assertIsNone(benchmarks.percentile([], 50))
+
+    def test_compare(self):
+        """Ensure regressions beyond the tolerance are reported."""
+        def results(p95, throughput):
+            return {'results': [{
+                'backend': 'stub', 'document': 'doc', 'source': 'html', 'destination': 'pdf',
+                'concurrency': 1, 'errors': 0, 'throughput': throughput, 'latency': {'p95': p95}}]}
+
+        self.assertEqual(benchmarks.compare(results(1.0, 10), results(1.05, 9.5)), [])
+        regressions = benchmarks.compare(results(1.0, 10), results(1.5, 5))
+        self.assertEqual(len(regressions), 2)
+
+
+class TestStubConverter(TestCase):
+
+    def tearDown(self) -> None:
+        """Tear down matoconv instance."""
+        Matoconv.INSTANCE = None
+        return super().tearDown()
+
+    def test_run_pair(self):
+        """Ensure conversions through the stub converter are measured."""
+        with benchmarks.stub_converter():
+            client = benchmarks.AppClient(Matoconv().app)
+            self.assertEqual(list(FormatFactory.BACKENDS), ['stub'])
+        result = benchmarks.run_pair(
+            client, benchmarks.synthetic_pdf(1), 'html', requests=4, concurrency=2, warmup=1)
+
+        self.assertEqual(result['succeeded'], 4)
+        self.assertEqual(result['statuses'], {'200': 4})
+        self.assertEqual(result['cached'], 0)
+        self.assertGreater(result['throughput'], 0)
+        self.assertLessEqual(result['latency']['p50'], result['latency']['p99'])
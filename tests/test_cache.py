@@ -0,0 +1,102 @@
+import os
+import tempfile
+import threading
+
+from unittest import TestCase
+
+from matoconv import PDF, HTML, DOCX
+from matoconv.cache import ResultCache
+
+
+class TestResultCacheKey(TestCase):
+
+    def test_make_key(self):
+        """Ensure key depends on input and formats."""
+        key = ResultCache.make_key('abc', HTML(), PDF())
+        self.assertEqual(key, ResultCache.make_key('abc', HTML(), PDF()))
+        self.assertNotEqual(key, ResultCache.make_key('abd', HTML(), PDF()))
+        self.assertNotEqual(key, ResultCache.make_key('abc', HTML(), DOCX()))
+        self.assertNotEqual(key, ResultCache.make_key('abc', HTML(), PDF(), options='x'))
+
+
+class TestResultCache(TestCase):
+
+    def setUp(self) -> None:
+        self.temp_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_directory.cleanup)
+        self.cache_directory = os.path.join(self.temp_directory.name, 'cache')
+        return super().setUp()
+
+    def _output_file(self, data: bytes) -> str:
+        """Create conversion output file containing data."""
+        fd, path = tempfile.mkstemp(dir=self.temp_directory.name)
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        return path
+
+    def test_memory_lru_eviction(self):
+        """Ensure least recently used entries are evicted from memory tier."""
+        cache = ResultCache(memory_size=40, disk_size=0)
+        cache.put('a', self._output_file(b'0123456789'))
+        cache.put('b', self._output_file(b'0123456789'))
+        cache.put('c', self._output_file(b'0123456789'))
+        # Access 'a', so that 'b' is least recently used
+        self.assertEqual(cache.get('a').data, b'0123456789')
+        cache.put('d', self._output_file(b'0123456789'))
+        cache.put('e', self._output_file(b'0123456789'))
+
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('e'))
+
+    def test_large_item_not_held_in_memory(self):
+        """Ensure items larger than the memory item limit are only held on disk."""
+        cache = ResultCache(memory_size=40, disk_size=1000,
+                            directory=self.cache_directory)
+        cache.put('large', self._output_file(b'x' * 20))
+
+        entry = cache.get('large')
+        self.assertIsNone(entry.data)
+        self.assertEqual(entry.path, os.path.join(self.cache_directory, 'large'))
+        self.assertEqual(entry.read(), b'x' * 20)
+
+    def test_disk_eviction(self):
+        """Ensure disk tier is kept within size limit."""
+        cache = ResultCache(memory_size=0, disk_size=25,
+                            directory=self.cache_directory)
+        cache.put('a', self._output_file(b'0123456789'))
+        cache.put('b', self._output_file(b'0123456789'))
+        cache.put('c', self._output_file(b'0123456789'))
+
+        self.assertIsNone(cache.get('a'))
+        self.assertFalse(os.path.exists(os.path.join(self.cache_directory, 'a')))
+        self.assertEqual(cache.get('c').read(), b'0123456789')
+
+    def test_disk_index_reloaded(self):
+        """Ensure results on disk are available to a new cache instance."""
+        cache = ResultCache(memory_size=0, disk_size=100,
+                            directory=self.cache_directory)
+        cache.put('a', self._output_file(b'0123456789'))
+
+        cache = ResultCache(memory_size=0, disk_size=100,
+                            directory=self.cache_directory)
+        self.assertEqual(cache.get('a').read(), b'0123456789')
+
+    def test_coalescing(self):
+        """Ensure only the first request for a key leads the conversion."""
+        cache = ResultCache(memory_size=100, disk_size=0)
+        self.assertTrue(cache.wait_or_lead('a', timeout=1))
+
+        results = []
+        follower = threading.Thread(
+            target=lambda: results.append(cache.wait_or_lead('a', timeout=5)))
+        follower.start()
+
+        cache.put('a', self._output_file(b'result'))
+        cache.release('a')
+        follower.join()
+
+        self.assertEqual(results, [False])
+        self.assertEqual(cache.get('a').data, b'result')
+        # Once released, the next request leads again
+        self.assertTrue(cache.wait_or_lead('a', timeout=1))
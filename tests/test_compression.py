@@ -0,0 +1,38 @@
+import gzip
+import zlib
+from unittest import TestCase, mock
+
+from matoconv import compression
+
+
+class TestCompress(TestCase):
+
+    def test_gzip(self):
+        """Ensure chunks are compressed as a single gzip stream."""
+        data = b''.join(compression.compress([b'PAGE 1\n', b'PAGE 2\n'], compression.GZIP))
+        self.assertEqual(gzip.decompress(data), b'PAGE 1\nPAGE 2\n')
+
+    def test_flush(self):
+        """Ensure all data of each chunk is yielded before the next chunk is read."""
+        chunks = compression.compress(iter([b'PAGE 1\n', b'PAGE 2\n']), compression.GZIP, flush=True)
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.assertEqual(decompressor.decompress(next(chunks)), b'PAGE 1\n')
+        self.assertEqual(decompressor.decompress(b''.join(chunks)), b'PAGE 2\n')
+
+    def test_available_encodings(self):
+        """Ensure brotli is preferred, where available."""
+        with mock.patch('matoconv.compression.brotli', None):
+            self.assertEqual(compression.available_encodings(), ['gzip'])
+        with mock.patch('matoconv.compression.brotli', mock.MagicMock()):
+            self.assertEqual(compression.available_encodings(), ['br', 'gzip'])
+
+    def test_brotli(self):
+        """Ensure brotli compressor is used for brotli encoding."""
+        mock_brotli = mock.MagicMock()
+        mock_brotli.Compressor.return_value.process.return_value = b'COMPRESSED'
+        mock_brotli.Compressor.return_value.finish.return_value = b'END'
+        with mock.patch('matoconv.compression.brotli', mock_brotli):
+            data = list(compression.compress([b'PAGE 1\n'], compression.BROTLI, brotli_quality=4))
+
+        self.assertEqual(data, [b'COMPRESSED', b'END'])
+        mock_brotli.Compressor.assert_called_once_with(quality=4)
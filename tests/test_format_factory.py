@@ -22,14 +22,14 @@ class TestByExtension(TestCase):
         self.assertEqual(form, None)
 
     def test_by_extension_mocked(self):
-        """Test by_extension, mocking list of extensions and format class."""
+        """Test by_extension, registering mocked format class."""
         mocked_extension = mock.Mock()
         mocked_extension_instance = mock.Mock()
         mocked_extension.return_value = mocked_extension_instance
-
-        FormatFactory.FORMATS = [mocked_extension]
         mocked_extension_instance.extension = 'tst'
 
+        FormatFactory._register_format(mocked_extension)
+
         self.assertEqual(
             self.format_factory.by_extension('tst'),
             mocked_extension_instance)
@@ -57,3 +57,68 @@ class TestByExtension(TestCase):
                 self.format_factory.by_extension(ext),
                 cls
             )
+
+
+class TestFindRoute(TestCase):
+
+    def setUp(self) -> None:
+        self.format_factory = FormatFactory()
+        self.format_factory.register_formats()
+        return super().setUp()
+
+    def _route(self, source: str, destination: str) -> list:
+        """Return backend, source and destination of each conversion of route."""
+        return [
+            (conversion.backend, conversion.source, conversion.destination)
+            for conversion in self.format_factory.find_route(
+                self.format_factory.by_extension(source),
+                self.format_factory.by_extension(destination))
+        ]
+
+    def test_direct_route(self):
+        """Ensure formats are converted directly by default."""
+        self.assertEqual(self._route('docx', 'pdf'), [('soffice', 'docx', 'pdf')])
+        self.assertEqual(self._route('pdf', 'html'), [('pdftohtml', 'pdf', 'html')])
+        self.assertEqual(self._route('odt', 'odt'), [('soffice', 'odt', 'odt')])
+
+    def test_image_route(self):
+        """Ensure documents are rendered to images from PDF."""
+        self.assertEqual(self._route('pdf', 'png'), [('pdftoppm', 'pdf', 'png')])
+        self.assertEqual(
+            self._route('docx', 'jpeg'),
+            [('soffice', 'docx', 'pdf'), ('pdftoppm', 'pdf', 'jpeg')])
+
+    def test_measured_route(self):
+        """Ensure cheaper multi-step routes are used once direct conversion is measured to be slow."""
+        direct, = self.format_factory.find_route(PDF(), DOCX())
+        self.format_factory.observe_conversion(direct, 10)
+
+        self.assertEqual(
+            self._route('pdf', 'docx'),
+            [('pdftohtml', 'pdf', 'html'), ('soffice', 'html', 'docx')])
+
+    def test_estimate_duration(self):
+        """Ensure durations are estimated from measured durations per page, once measured."""
+        route = self.format_factory.find_route(DOCX(), PDF())
+        self.assertEqual(self.format_factory.estimate_duration(route, 10), route[0].cost)
+
+        self.format_factory.observe_conversion(route[0], 4, units=2)
+        self.format_factory.observe_conversion(route[0], 8, units=2)
+        self.assertEqual(self.format_factory.estimate_duration(route, 10), 30)
+
+    @mock.patch('matoconv.Config.CONVERTER_ROUTES', 'html:pdf=stub,*:*=soffice')
+    def test_routing_table(self):
+        """Ensure each pair is converted by the backend of its route."""
+        self.format_factory.register_formats()
+
+        self.assertEqual(self._route('html', 'pdf'), [('stub', 'html', 'pdf')])
+        self.assertEqual(self._route('pdf', 'html'), [('soffice', 'pdf', 'html')])
+        self.assertEqual(sorted(self.format_factory.BACKENDS), ['soffice', 'stub'])
+
+    @mock.patch('matoconv.Config.CONVERTER_MODE', 'persistent')
+    def test_persistent_mode(self):
+        """Ensure persistent converter mode routes conversions to office listeners."""
+        self.format_factory.register_formats()
+
+        self.assertEqual(self._route('docx', 'pdf'), [('soffice-listener', 'docx', 'pdf')])
+        self.assertEqual(self._route('pdf', 'html'), [('pdftohtml', 'pdf', 'html')])
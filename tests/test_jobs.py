@@ -0,0 +1,63 @@
+import os
+import tempfile
+
+from unittest import TestCase, mock
+
+from matoconv.jobs import Job, JobStore
+
+
+class TestJobStore(TestCase):
+
+    def setUp(self) -> None:
+        self.temp_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_directory.cleanup)
+        return super().setUp()
+
+    def test_create(self):
+        """Ensure jobs are created with their own working directory."""
+        store = JobStore(ttl=10, directory=self.temp_directory.name)
+        job = store.create(callback_url='http://example.com/done')
+
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertEqual(job.callback_url, 'http://example.com/done')
+        self.assertEqual(os.path.dirname(job.directory), self.temp_directory.name)
+        self.assertTrue(os.path.isdir(job.directory))
+        self.assertIs(store.get(job.id), job)
+        self.assertIsNone(store.get('unknown'))
+
+    def test_finish(self):
+        """Ensure job status reflects errors."""
+        store = JobStore(ttl=10, directory=self.temp_directory.name)
+        job = store.create()
+        job.finish(error='Conversion failed')
+
+        self.assertEqual(job.to_dict(), {
+            'id': job.id, 'status': Job.FAILED, 'error': 'Conversion failed', 'attempts': []})
+
+    def test_collect(self):
+        """Ensure finished jobs are removed once TTL expires, leaving pending jobs."""
+        store = JobStore(ttl=10, directory=self.temp_directory.name)
+        with mock.patch('matoconv.jobs.time.monotonic', return_value=100):
+            finished_job = store.create()
+            finished_job.finish()
+            pending_job = store.create()
+
+        with mock.patch('matoconv.jobs.time.monotonic', return_value=105):
+            self.assertIs(store.get(finished_job.id), finished_job)
+
+        with mock.patch('matoconv.jobs.time.monotonic', return_value=111):
+            self.assertIsNone(store.get(finished_job.id))
+            self.assertIs(store.get(pending_job.id), pending_job)
+
+        self.assertFalse(os.path.exists(finished_job.directory))
+        self.assertTrue(os.path.exists(pending_job.directory))
+
+    def test_release_directory(self):
+        """Ensure working directories of removed jobs are released, rather than removed immediately."""
+        release_directory = mock.MagicMock()
+        store = JobStore(ttl=10, directory=self.temp_directory.name, release_directory=release_directory)
+        job = store.create()
+        store.remove(job.id)
+
+        release_directory.assert_called_once_with(job.directory)
+        self.assertIsNone(store.get(job.id))
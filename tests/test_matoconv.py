@@ -1,8 +1,29 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
 import warnings
+import zipfile
 
 from unittest import TestCase, mock
 
-from matoconv import Matoconv, PDF, HTML
+import flask
+
+from matoconv import Matoconv, ConversionDetails, FormatFactory, PageRange, PDF, DOCX, HTML
+from matoconv.cache import CacheEntry, ResultCache
+from matoconv.exceptions import AdmissionRejectedError
+from matoconv.metrics import TaskStats
+from matoconv.supervisor import ProcessUsage
+
+
+def task_result(logs: list) -> tuple:
+    """Return result of conversion task, as returned by Matoconv.run_task."""
+    stats = TaskStats()
+    stats.started_at = stats.finished_at = time.monotonic()
+    return logs, stats
 
 
 class TestRouteBase(TestCase):
@@ -54,7 +75,16 @@ class MockConversionDetails(object):
             "ouptut_filename": "OR1g1nalFILENAME.pdf",
             "temp_directory": "/tmp/conversion-path",
             "destination_format": PDF,
-            "source_format": HTML
+            "source_format": HTML,
+            "attempts": [],
+            "page_range": None,
+            "width": None,
+            "image_assets": False,
+            "compressible": True,
+            "work_units": 1,
+            "process_usage": [],
+            "progress": None,
+            "options": ""
         }
     }
 
@@ -73,13 +103,15 @@ class TestRouteMockedBase(TestRouteBase):
     MOCK_APP = True
     MOCK_FORMAT_FACTORY_REGISTER_FORMATS = True
     MOCK_CORS = True
-    MOCK_POOL = True
+    MOCK_SCHEDULER = True
     MOCK_CONVERSION_DETAILS = True
     MOCK_FORMAT_FACTORY_BY_EXTENSION = True
     MOCK_OPEN = True
     MOCK_TEMPORARY_DIRECTORY = True
-    MOCK_SUBPROCESS = True
+    MOCK_RUN_COMMAND = True
     MOCK_OS = True
+    MOCK_RESULT_CACHE = True
+    MOCK_CHECK_INPUT = True
 
     def setUp(self) -> None:
         """Create mocks and call setup setup."""
@@ -97,6 +129,25 @@ class TestRouteMockedBase(TestRouteBase):
             self.mock_register_formats = self.mock_register_formats_patcher.start()
             self.addCleanup(self.mock_register_formats_patcher.stop)
 
+            # Without registered formats, convert directly using a single conversion
+            self.mock_find_route_patcher = mock.patch(
+                'matoconv.FormatFactory.find_route', return_value=[mock.MagicMock()])
+            self.mock_find_route = self.mock_find_route_patcher.start()
+            self.addCleanup(self.mock_find_route_patcher.stop)
+            self.mock_observe_conversion_patcher = mock.patch(
+                'matoconv.FormatFactory.observe_conversion')
+            self.mock_observe_conversion = self.mock_observe_conversion_patcher.start()
+            self.addCleanup(self.mock_observe_conversion_patcher.stop)
+            self.mock_estimate_duration_patcher = mock.patch(
+                'matoconv.FormatFactory.estimate_duration', return_value=0)
+            self.mock_estimate_duration = self.mock_estimate_duration_patcher.start()
+            self.addCleanup(self.mock_estimate_duration_patcher.stop)
+            self.mock_backend_patcher = mock.patch(
+                'matoconv.FormatFactory.backend',
+                return_value=mock.MagicMock(**{'supports_streaming.return_value': False}))
+            self.mock_backend = self.mock_backend_patcher.start()
+            self.addCleanup(self.mock_backend_patcher.stop)
+
         if self.MOCK_FORMAT_FACTORY_BY_EXTENSION:
             self.mock_format_factory_by_extension_patcher = mock.patch(
                 'matoconv.FormatFactory.by_extension')
@@ -115,12 +166,13 @@ class TestRouteMockedBase(TestRouteBase):
             self.mock_cors = self.mock_cors_patcher.start()
             self.addCleanup(self.mock_cors_patcher.stop)
 
-        if self.MOCK_POOL:
-            self.mock_pool_patcher = mock.patch('matoconv.Pool')
-            self.mock_pool_class = self.mock_pool_patcher.start()
-            self.addCleanup(self.mock_pool_patcher.stop)
-            self.mock_pool = mock.MagicMock()
-            self.mock_pool_class.return_value = self.mock_pool
+        if self.MOCK_SCHEDULER:
+            self.mock_scheduler_patcher = mock.patch('matoconv.ConverterScheduler')
+            self.mock_scheduler_class = self.mock_scheduler_patcher.start()
+            self.addCleanup(self.mock_scheduler_patcher.stop)
+            self.mock_scheduler = mock.MagicMock()
+            self.mock_scheduler_class.return_value = self.mock_scheduler
+            self.mock_scheduler.submit.return_value.get.return_value = task_result([])
 
         if self.MOCK_CONVERSION_DETAILS:
             self.mock_conversion_details_patcher = mock.patch(
@@ -138,18 +190,18 @@ class TestRouteMockedBase(TestRouteBase):
         if self.MOCK_TEMPORARY_DIRECTORY:
             self.mock_temporary_directory_factory = mock.MagicMock()
             self.mock_temporary_directory_patcher = mock.patch(
-                'matoconv.tempfile.TemporaryDirectory', self.mock_temporary_directory_factory)
+                'matoconv.WorkDirectories.directory', self.mock_temporary_directory_factory)
             self.mock_temporary_directory_patcher.start()
             self.addCleanup(self.mock_temporary_directory_patcher.stop)
             self.mock_temporary_directory = mock.MagicMock()
             self.mock_temporary_directory_factory.return_value = self.mock_temporary_directory
 
-        if self.MOCK_SUBPROCESS:
-            self.mock_subprocess = mock.MagicMock()
-            self.mock_subprocess_patcher = mock.patch(
-                'matoconv.subprocess', self.mock_subprocess)
-            self.mock_subprocess_patcher.start()
-            self.addCleanup(self.mock_subprocess_patcher.stop)
+        if self.MOCK_RUN_COMMAND:
+            self.mock_run_command = mock.MagicMock()
+            self.mock_run_command_patcher = mock.patch(
+                'matoconv.backends.run_command', self.mock_run_command)
+            self.mock_run_command_patcher.start()
+            self.addCleanup(self.mock_run_command_patcher.stop)
 
         if self.MOCK_OS:
             self.mock_os = mock.MagicMock()
@@ -157,6 +209,23 @@ class TestRouteMockedBase(TestRouteBase):
             self.mock_os_patcher.start()
             self.addCleanup(self.mock_os_patcher.stop)
 
+        if self.MOCK_CHECK_INPUT:
+            self.mock_check_input_patcher = mock.patch('matoconv.Matoconv.check_input')
+            self.mock_check_input = self.mock_check_input_patcher.start()
+            self.addCleanup(self.mock_check_input_patcher.stop)
+
+        if self.MOCK_RESULT_CACHE:
+            self.mock_result_cache_patcher = mock.patch('matoconv.ResultCache')
+            self.mock_result_cache_class = self.mock_result_cache_patcher.start()
+            self.addCleanup(self.mock_result_cache_patcher.stop)
+            self.mock_result_cache_class.make_key.return_value = 'mock-cache-key'
+            self.mock_result_cache_class.variant_key.side_effect = ResultCache.variant_key
+            self.mock_result_cache = mock.MagicMock()
+            self.mock_result_cache_class.return_value = self.mock_result_cache
+            # Default to cache misses, with each request leading its conversion
+            self.mock_result_cache.get.return_value = None
+            self.mock_result_cache.wait_or_lead.return_value = True
+
 
 class TestGetInstance(TestRouteMockedBase):
 
@@ -205,8 +274,8 @@ class TestSetup(TestRouteMockedBase):
         # Assert cors called with flask app and resource config
         self.mock_cors.assert_called_with(
             self.mock_flask_app, resources={r"*": {"origins": ""}})
-        # Assert Pool is created with correct number for threads
-        self.mock_pool_class.assert_called_with(processes=5)
+        # Assert scheduler is created with correct number of slots
+        self.mock_scheduler_class.assert_called_with(slots=5)
 
 
 class TestRouteIndex(TestRouteBase):
@@ -252,15 +321,16 @@ class TestRouteConvert(TestRouteMockedBase):
         destination_format_mock = mock.MagicMock()
         self.mock_format_factory_by_extension.return_value = destination_format_mock
 
-        # Mock pool apply_async return object
-        mock_apply_async_task = mock.MagicMock()
-        self.mock_pool.apply_async.return_value = mock_apply_async_task
+        # Mock scheduler submit return object
+        mock_task = mock.MagicMock()
+        mock_task.get.return_value = task_result([])
+        self.mock_scheduler.submit.return_value = mock_task
 
         # Setup mocked temporary directory
         self.mock_temporary_directory.__enter__.return_value = '/some_temp-dir'
 
-        self.mock_open.read = mock.MagicMock()
-        self.mock_open.return_value.read.return_value = '--- OUTPUT DATA TO SEND TO USER ---'
+        mock.mock_open(self.mock_open, read_data=b'--- OUTPUT DATA TO SEND TO USER ---')
+        self.mock_os.fstat.return_value.st_size = 35
 
         with self.client.post('/convert/format/docx',
                               headers={
@@ -270,19 +340,26 @@ class TestRouteConvert(TestRouteMockedBase):
             self.assertEqual(
                 res.headers['Content-Disposition'], 'attachment; filename=OR1g1nalFILENAME.pdf')
             self.assertEqual(res.content_type, "special-type/pdf-mime")
+            self.assertEqual(res.content_length, 35)
             self.assertEqual(res.data, b'--- OUTPUT DATA TO SEND TO USER ---')
 
         self.mock_format_factory_by_extension.assert_called_with('docx')
         self.mock_conversion_details.assert_called_with(
             content_disp_headers='attachment; filename="OR1g1nalFILENAME.html"',
             temp_directory='/some_temp-dir',
-            dest_format=destination_format_mock
+            dest_format=destination_format_mock,
+            page_range=None,
+            width=None,
+            image_assets=False
         )
 
-        # Ensure object is added to pool and callto get response was made
-        self.mock_pool.apply_async.assert_called_with(
-            self.matoconv.perform_conversion, (mock_conversion_details_obj, ))
-        mock_apply_async_task.get.assert_called_with(timeout=60)
+        # Ensure object is submitted to scheduler and call to get response was made
+        self.mock_scheduler.submit.assert_called_with(
+            mock.ANY, (self.matoconv.perform_conversion, (mock_conversion_details_obj, )),
+            callback=mock.ANY, error_callback=mock.ANY,
+            retry_policy=self.matoconv.retries.policy, should_retry=mock.ANY,
+            release=mock.ANY, reacquire=mock.ANY)
+        mock_task.get.assert_called_with(timeout=60)
 
         # Ensure open was called as expected
         self.mock_open.assert_has_calls([
@@ -292,63 +369,1000 @@ class TestRouteConvert(TestRouteMockedBase):
             mock.call().write(b'SOME TEST DATA FROM INPUT HTML FILE'),
             mock.call().__exit__(None, None, None),
 
-            # Open output file to send back to user.
+            # Open output file to stream back to user.
             mock.call('/tmp/conversion-path/temp-conversion-file.pdf', 'rb'),
-            mock.call().__enter__(),
-            mock.call().read(),
-            mock.call().__exit__(None, None, None)
         ])
+        # Ensure temporary directory is removed after the output file is opened
+        self.mock_temporary_directory.__exit__.assert_called_once()
+        self.mock_open.return_value.close.assert_called()
 
 
-class TestPerformConversion(TestRouteMockedBase):
+class TestRouteConvertCache(TestRouteMockedBase):
 
-    def test_full_single_run(self):
-        """Test full conversion with single attempt."""
+    MOCK_APP = False
+
+    def setUp(self) -> None:
+        super().setUp()
         MockConversionDetails.TYPE = 1
-        mock_conversion_details = MockConversionDetails()
+        self.mock_conversion_details.return_value = MockConversionDetails()
+        self.mock_format_factory_by_extension.return_value = mock.MagicMock()
 
-        with mock.patch('matoconv.Matoconv.get_conversion_command') as mock_get_conversion_command:
+    def test_cache_hit(self):
+        """Ensure cached results are returned without performing a conversion."""
+        self.mock_result_cache.get.return_value = CacheEntry(
+            'mock-cache-key', data=b'CACHED OUTPUT')
 
-            mock_cmd = ['A', 'command', 'to', 'Run!']
-            mock_env = {
-                'some': 'environment',
-                'variables': 'go',
-                'here': '!'
-            }
-            mock_callback = mock.MagicMock()
-            mock_get_conversion_command.return_value = mock_cmd, mock_env, mock_callback
+        with self.client.post('/convert/format/pdf',
+                              headers={
+                                  'Content-Disposition': 'attachment; filename="OR1g1nalFILENAME.html"'},
+                              data='SOME TEST DATA') as res:
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.data, b'CACHED OUTPUT')
+            self.assertEqual(res.headers['ETag'], '"mock-cache-key"')
 
-            # Return value for process itself
-            mock_process = mock.MagicMock()
-            self.mock_subprocess.Popen.return_value = mock_process
+        self.mock_result_cache.get.assert_called_with('mock-cache-key')
+        self.mock_scheduler.submit.assert_not_called()
+        self.mock_result_cache.wait_or_lead.assert_not_called()
 
-            # Set return command RC
-            mock_process.wait.return_value = 0
+    def test_cache_miss_stores_result(self):
+        """Ensure converted results are stored and in-flight marker released."""
+        mock.mock_open(self.mock_open, read_data=b'CONVERTED OUTPUT')
+        self.mock_os.fstat.return_value.st_size = 16
 
-            # Return that output file was create
-            self.mock_os.path.isfile.return_value = True
+        with self.client.post('/convert/format/pdf',
+                              headers={
+                                  'Content-Disposition': 'attachment; filename="OR1g1nalFILENAME.html"'},
+                              data='SOME TEST DATA') as res:
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.data, b'CONVERTED OUTPUT')
 
-            # Perform conversion
-            response = self.matoconv.perform_conversion(
-                mock_conversion_details)
+        self.mock_result_cache.put.assert_called_once_with(
+            'mock-cache-key', '/tmp/conversion-path/temp-conversion-file.pdf')
+        self.mock_result_cache.release.assert_called_once_with('mock-cache-key')
+
+    def test_not_modified(self):
+        """Ensure conditional requests matching the cache key are not converted."""
+        with self.client.post('/convert/format/pdf',
+                              headers={
+                                  'Content-Disposition': 'attachment; filename="OR1g1nalFILENAME.html"',
+                                  'If-None-Match': '"mock-cache-key"'},
+                              data='SOME TEST DATA') as res:
+            self.assertEqual(res.status_code, 304)
+            self.assertEqual(res.headers['ETag'], '"mock-cache-key"')
+
+        self.mock_scheduler.submit.assert_not_called()
+
+
+class TestRouteMetrics(TestRouteMockedBase):
+
+    MOCK_APP = False
+
+    def test_metrics(self):
+        """Ensure conversion requests and conversion task statistics are exposed as metrics."""
+        self.mock_conversion_details.return_value = mock.MagicMock(
+            source_format=HTML(), destination_format=PDF(), page_range=None, width=None, options='',
+            response_mime_type='application/pdf', ouptut_filename='OR1g1nalFILENAME.pdf')
+        self.mock_format_factory_by_extension.return_value = PDF()
+        mock.mock_open(self.mock_open, read_data=b'CONVERTED OUTPUT')
+        self.mock_os.fstat.return_value.st_size = 16
+
+        # Run task callback, as performed by scheduler once task has finished
+        stats = task_result([])[1]
+        stats.finished_at = stats.started_at + 2
+        stats.retries = 1
+
+        def submit(func, args, callback, error_callback, **kwargs):
+            callback(([], stats))
+            task = mock.MagicMock()
+            task.get.return_value = ([], stats)
+            return task
+
+        self.mock_scheduler.submit.side_effect = submit
+
+        with self.client.post('/convert/format/pdf',
+                              headers={
+                                  'Content-Disposition': 'attachment; filename="OR1g1nalFILENAME.html"'},
+                              data='SOME TEST DATA') as res:
+            self.assertEqual(res.status_code, 200)
+
+        with self.client.get('/metrics') as res:
+            self.assertEqual(res.status_code, 200)
+            self.assertTrue(res.content_type.startswith('text/plain; version=0.0.4'))
+            output = res.data.decode('utf-8')
+
+        self.assertIn(
+            'matoconv_requests_total{endpoint="convert",source="html",destination="pdf",status="200"} 1.0\n',
+            output)
+        self.assertIn(
+            'matoconv_request_duration_seconds_count{endpoint="convert",source="html",destination="pdf"} 1.0\n',
+            output)
+        self.assertIn(
+            'matoconv_conversion_duration_seconds_sum{source="html",destination="pdf"} 2.0\n', output)
+        self.assertIn(
+            'matoconv_conversion_retries_total{source="html",destination="pdf"} 1.0\n', output)
+        self.assertIn('matoconv_converter_slots{state="busy"} 0.0\n', output)
+
+class TestRouteHealth(TestRouteMockedBase):
+
+    MOCK_APP = False
+
+    def test_health(self):
+        """Ensure health of each converter backend is reported, failing if any are unhealthy."""
+        healthy, unhealthy = mock.MagicMock(), mock.MagicMock()
+        healthy.is_healthy.return_value = True
+        unhealthy.is_healthy.return_value = False
 
-            mock_process.wait.assert_called()
+        with mock.patch.dict('matoconv.FormatFactory.BACKENDS', {'stub': healthy}, clear=True):
+            with self.client.get('/health') as res:
+                self.assertEqual(res.status_code, 200)
+                self.assertEqual(res.get_json(), {'stub': True})
+
+        with mock.patch.dict('matoconv.FormatFactory.BACKENDS',
+                             {'stub': healthy, 'soffice': unhealthy}, clear=True):
+            with self.client.get('/health') as res:
+                self.assertEqual(res.status_code, 503)
+                self.assertEqual(res.get_json(), {'stub': True, 'soffice': False})
+
+
+class TestRouteConvertAdmission(TestRouteMockedBase):
+
+    MOCK_APP = False
+
+    def test_rejected(self):
+        """Ensure rejected conversions respond with 429 and Retry-After."""
+        MockConversionDetails.TYPE = 1
+        self.mock_conversion_details.return_value = MockConversionDetails()
+        self.mock_format_factory_by_extension.return_value = mock.MagicMock()
+
+        with mock.patch.object(self.matoconv.admission, 'acquire',
+                               side_effect=AdmissionRejectedError('Conversion queue is full', retry_after=12)):
+            with self.client.post('/convert/format/pdf',
+                                  headers={
+                                      'Content-Disposition': 'attachment; filename="OR1g1nalFILENAME.html"'},
+                                  data='SOME TEST DATA') as res:
+                self.assertEqual(res.status_code, 429)
+                self.assertEqual(res.headers['Retry-After'], '12')
+                self.assertEqual(res.data, b'Conversion queue is full')
+
+        self.mock_scheduler.submit.assert_not_called()
+        self.mock_result_cache.release.assert_called_once_with('mock-cache-key')
+
+    def test_circuit_open(self):
+        """Ensure conversions are rejected with 503 and Retry-After whilst the circuit breaker is open."""
+        MockConversionDetails.TYPE = 1
+        self.mock_conversion_details.return_value = MockConversionDetails()
+        self.mock_format_factory_by_extension.return_value = mock.MagicMock()
+
+        breaker = mock.MagicMock()
+        breaker.allow.return_value = False
+        breaker.retry_after.return_value = 25
+        with mock.patch.object(self.matoconv.retries, 'breaker', return_value=breaker), \
+                mock.patch.object(self.matoconv.admission, 'acquire') as mock_acquire:
+            with self.client.post('/convert/format/pdf',
+                                  headers={
+                                      'Content-Disposition': 'attachment; filename="OR1g1nalFILENAME.html"'},
+                                  data='SOME TEST DATA') as res:
+                self.assertEqual(res.status_code, 503)
+                self.assertEqual(res.headers['Retry-After'], '25')
+
+        mock_acquire.assert_not_called()
+        self.mock_scheduler.submit.assert_not_called()
+        self.mock_result_cache.release.assert_called_once_with('mock-cache-key')
+
+    def test_priority(self):
+        """Ensure conversions are queued with the priority class and tenant of the request."""
+        MockConversionDetails.TYPE = 1
+        self.mock_conversion_details.return_value = MockConversionDetails()
+        self.mock_format_factory_by_extension.return_value = mock.MagicMock()
+        self.mock_estimate_duration.return_value = 3
+
+        with mock.patch.object(self.matoconv.admission, 'acquire',
+                               side_effect=AdmissionRejectedError('Conversion queue is full', retry_after=12)) \
+                as mock_acquire:
+            with self.client.post('/convert/format/pdf',
+                                  headers={
+                                      'Content-Disposition': 'attachment; filename="OR1g1nalFILENAME.html"',
+                                      'X-Priority': 'batch',
+                                      'X-Tenant': 'tenant-1'},
+                                  data='SOME TEST DATA') as res:
+                self.assertEqual(res.status_code, 429)
+
+            admission_request = mock_acquire.call_args[0][0]
+            self.assertEqual(admission_request.priority, 'batch')
+            self.assertEqual(admission_request.tenant, 'tenant-1')
+            self.assertEqual(admission_request.cost, 3)
+
+            with self.client.post('/convert/format/pdf',
+                                  headers={
+                                      'Content-Disposition': 'attachment; filename="OR1g1nalFILENAME.html"',
+                                      'X-Priority': 'urgent'},
+                                  data='SOME TEST DATA') as res:
+                self.assertEqual(res.status_code, 400)
+        self.assertEqual(mock_acquire.call_count, 1)
+
+
+class TestRouteConvertRequestSize(TestRouteMockedBase):
+
+    MOCK_APP = False
+
+    @mock.patch('matoconv.Config.MAX_REQUEST_SIZE', 4)
+    def test_request_too_large(self):
+        """Ensure requests larger than the maximum request size are rejected."""
+        with self.client.post('/convert/format/pdf',
+                              headers={
+                                  'Content-Disposition': 'attachment; filename="OR1g1nalFILENAME.html"'},
+                              data='SOME TEST DATA') as res:
+            self.assertEqual(res.status_code, 413)
+
+        self.mock_conversion_details.assert_not_called()
+        self.mock_scheduler.submit.assert_not_called()
+
+
+class TestRouteConvertPreflight(TestRouteMockedBase):
+
+    MOCK_APP = False
+    MOCK_FORMAT_FACTORY_REGISTER_FORMATS = False
+    MOCK_CONVERSION_DETAILS = False
+    MOCK_FORMAT_FACTORY_BY_EXTENSION = False
+    MOCK_OPEN = False
+    MOCK_TEMPORARY_DIRECTORY = False
+    MOCK_OS = False
+    MOCK_CHECK_INPUT = False
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.converted = []
+
+        def submit(func, args, callback, error_callback, **kwargs):
+            """Record conversion and create output file in place of conversion."""
+            details = args[1][0]
+            self.converted.append(os.path.basename(details.t_input_path))
+            with open(details.t_output_path, 'wb') as fh:
+                fh.write(b'CONVERTED')
+            callback(task_result([]))
+            task = mock.MagicMock()
+            task.get.return_value = task_result([])
+            return task
+
+        self.mock_scheduler.submit.side_effect = submit
+
+    def _convert(self, filename: str, data: bytes) -> int:
+        """Post conversion request, returning status code."""
+        with self.client.post('/convert/format/pdf',
+                              headers={'Content-Disposition': 'attachment; filename="{}"'.format(filename)},
+                              data=data) as res:
+            return res.status_code
+
+    def test_mismatched_content(self):
+        """Ensure files not matching the format of their extension are rejected before conversion."""
+        self.assertEqual(self._convert('example.docx', b'<p>Not a document</p>'), 415)
+        self.assertEqual(self.converted, [])
+
+    def test_detect_format(self):
+        """Ensure source format of files without an extension is detected."""
+        self.assertEqual(self._convert('example', b'<p>Example</p>'), 200)
+        self.assertEqual(self.converted, ['conversion.html'])
+
+        self.assertEqual(self._convert('example', b'\x89PNG\r\n\x1a\n\x00'), 415)
+
+    @mock.patch.dict(os.environ, {'PREFLIGHT_MAX_SIZE_HTML': '4'})
+    def test_max_size(self):
+        """Ensure files larger than the maximum size of their format are rejected."""
+        self.assertEqual(self._convert('example.html', b'<p>Example</p>'), 413)
+        self.assertEqual(self.converted, [])
+
+
+class TestRouteConvertPageRange(TestRouteMockedBase):
+
+    MOCK_APP = False
+    MOCK_FORMAT_FACTORY_REGISTER_FORMATS = False
+    MOCK_CONVERSION_DETAILS = False
+    MOCK_FORMAT_FACTORY_BY_EXTENSION = False
+    MOCK_OPEN = False
+    MOCK_TEMPORARY_DIRECTORY = False
+    MOCK_OS = False
+    MOCK_CHECK_INPUT = False
+
+    # PDF document with a page tree of 3 pages
+    PDF_DATA = b'%PDF-1.4\n1 0 obj << /Type /Pages /Count 3 >> endobj\n%%EOF\n'
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.page_ranges = []
+
+        def submit(func, args, callback, error_callback, **kwargs):
+            """Record page range and create output file in place of conversion."""
+            details = args[1][0]
+            self.page_ranges.append(str(details.page_range))
+            with open(details.t_output_path, 'wb') as fh:
+                fh.write(b'CONVERTED')
+            callback(task_result([]))
+            task = mock.MagicMock()
+            task.get.return_value = task_result([])
+            return task
+
+        self.mock_scheduler.submit.side_effect = submit
+
+    def _convert(self, url: str, filename: str, data: bytes) -> int:
+        """Post conversion request, returning status code."""
+        with self.client.post(url,
+                              headers={'Content-Disposition': 'attachment; filename="{}"'.format(filename)},
+                              data=data) as res:
+            return res.status_code
+
+    def test_page_range(self):
+        """Ensure page range is converted, cached separately from full conversions."""
+        self.assertEqual(self._convert('/convert/format/html?pages=1-2', 'example.pdf', self.PDF_DATA), 200)
+        self.assertEqual(self.page_ranges, ['1-2'])
+        self.assertEqual(self.mock_result_cache_class.make_key.call_args[1]['options'], 'pages=1-2')
+
+        self.assertEqual(self._convert('/convert/format/html', 'example.pdf', self.PDF_DATA), 200)
+        self.assertEqual(self.mock_result_cache_class.make_key.call_args[1]['options'], '')
+
+    def test_invalid_page_range(self):
+        """Ensure invalid page ranges, and ranges beyond the document, are rejected."""
+        for pages in ['a', '0', '3-2', '-2']:
+            self.assertEqual(
+                self._convert('/convert/format/html?pages=' + pages, 'example.pdf', self.PDF_DATA), 400)
+        self.assertEqual(self._convert('/convert/format/html?pages=4-', 'example.pdf', self.PDF_DATA), 422)
+        self.assertEqual(self.page_ranges, [])
+
+    def test_unsupported_page_range(self):
+        """Ensure page ranges are rejected for conversions which cannot convert only the range."""
+        self.assertEqual(self._convert('/convert/format/docx?pages=1', 'example.html', b'<p>Example</p>'), 400)
+        self.assertEqual(self._convert('/convert/format/pdf?pages=1', 'example.html', b'<p>Example</p>'), 200)
+
+    @mock.patch('matoconv.Config.PREFLIGHT_MAX_PAGES', 2)
+    def test_max_pages(self):
+        """Ensure page limit applies to the pages converted."""
+        self.assertEqual(self._convert('/convert/format/html', 'example.pdf', self.PDF_DATA), 413)
+        self.assertEqual(self._convert('/convert/format/html?pages=2-', 'example.pdf', self.PDF_DATA), 200)
+
+
+class TestRouteConvertStreaming(TestRouteMockedBase):
+
+    MOCK_APP = False
+    MOCK_FORMAT_FACTORY_REGISTER_FORMATS = False
+    MOCK_CONVERSION_DETAILS = False
+    MOCK_FORMAT_FACTORY_BY_EXTENSION = False
+    MOCK_OPEN = False
+    MOCK_TEMPORARY_DIRECTORY = False
+    MOCK_OS = False
+    MOCK_CHECK_INPUT = False
+
+    # PDF document with a page tree of 45 pages
+    PDF_DATA = b'%PDF-1.4\n1 0 obj << /Type /Pages /Count 45 >> endobj\n%%EOF\n'
+
+    def _submit(self, logs: list):
+        """Return scheduler submit side effect, writing output in two parts from a
+        converter thread, finishing with the given logs.
+        """
+        self.finished = threading.Event()
+
+        def submit(func, args, callback, error_callback, **kwargs):
+            details = args[1][0]
+
+            def convert():
+                with open(details.t_output_path, 'wb') as fh:
+                    fh.write(b'<html><body>PAGE 1')
+                    fh.flush()
+                    details.progress.advance(fh.tell())
+                    time.sleep(0.05)
+                    fh.write(b' PAGE 2</body></html>')
+                callback(task_result(logs))
+                self.finished.set()
+
+            threading.Thread(target=convert).start()
+            return mock.MagicMock()
+
+        return submit
+
+    def _convert(self) -> flask.Response:
+        """Post PDF to HTML conversion request, returning the response."""
+        return self.client.post(
+            '/convert/format/html',
+            headers={'Content-Disposition': 'attachment; filename="example.pdf"'},
+            data=self.PDF_DATA)
+
+    def test_streaming(self):
+        """Ensure output is streamed whilst converted, then cached."""
+        self.mock_scheduler.submit.side_effect = self._submit([])
+
+        with self._convert() as res:
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.content_type, 'text/html')
+            self.assertIsNone(res.headers.get('ETag'))
+            self.assertEqual(res.data, b'<html><body>PAGE 1 PAGE 2</body></html>')
+
+        self.assertTrue(self.finished.wait(1))
+        self.mock_result_cache.put.assert_called_once()
+        self.mock_result_cache.release.assert_called_once()
+
+    def test_streaming_failure(self):
+        """Ensure streamed output of failed conversions is truncated and not cached."""
+        self.mock_scheduler.submit.side_effect = self._submit(['Conversion failed'])
+
+        with self._convert() as res:
+            self.assertEqual(res.status_code, 200)
+            self.assertNotIn(b'PAGE 2', res.data)
+
+        self.mock_result_cache.put.assert_not_called()
+        self.mock_result_cache.release.assert_called_once()
+
+
+class TestRouteConvertCompression(TestRouteMockedBase):
+
+    MOCK_APP = False
+    MOCK_FORMAT_FACTORY_REGISTER_FORMATS = False
+    MOCK_CONVERSION_DETAILS = False
+    MOCK_FORMAT_FACTORY_BY_EXTENSION = False
+    MOCK_OPEN = False
+    MOCK_TEMPORARY_DIRECTORY = False
+    MOCK_OS = False
+    MOCK_CHECK_INPUT = False
+
+    OUTPUT = b'<p>Converted</p>' * 100
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        def submit(func, args, callback, error_callback, **kwargs):
+            """Create output file in place of conversion."""
+            details = args[1][0]
+            with open(details.t_output_path, 'wb') as fh:
+                fh.write(self.OUTPUT)
+            callback(task_result([]))
+            task = mock.MagicMock()
+            task.get.return_value = task_result([])
+            return task
+
+        self.mock_scheduler.submit.side_effect = submit
+
+    def _convert(self, destination: str, headers: dict) -> flask.Response:
+        """Post HTML conversion request, returning the response."""
+        headers['Content-Disposition'] = 'attachment; filename="example.html"'
+        return self.client.post('/convert/format/' + destination, headers=headers, data=b'<p>Example</p>')
+
+    def test_gzip(self):
+        """Ensure results are compressed whilst sent, then the compressed result is cached."""
+        with self._convert('html', {'Accept-Encoding': 'br;q=0, gzip'}) as res:
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+            self.assertEqual(res.headers['ETag'], '"mock-cache-key.gzip"')
+            self.assertEqual(res.headers['Vary'], 'Accept-Encoding')
+            self.assertEqual(gzip.decompress(res.data), self.OUTPUT)
 
-            self.assertTrue(isinstance(response, list))
-            self.assertEqual(len(response), 0)
+        self.mock_result_cache.put.assert_any_call('mock-cache-key', mock.ANY)
+        self.mock_result_cache.put.assert_called_with('mock-cache-key.gzip', mock.ANY)
 
-            mock_get_conversion_command.assert_called_once_with(
+    def test_cached_variant(self):
+        """Ensure cached compressed results are not compressed again."""
+        compressed = gzip.compress(self.OUTPUT)
+        self.mock_result_cache.get.side_effect = lambda key: {
+            'mock-cache-key': CacheEntry(key, data=self.OUTPUT),
+            'mock-cache-key.gzip': CacheEntry(key, data=compressed)
+        }[key]
+
+        with self._convert('html', {'Accept-Encoding': 'gzip'}) as res:
+            self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+            self.assertEqual(res.data, compressed)
+
+        self.mock_scheduler.submit.assert_not_called()
+        self.mock_result_cache.put.assert_not_called()
+
+        with self._convert('html', {'If-None-Match': '"mock-cache-key.gzip"', 'Accept-Encoding': 'gzip'}) as res:
+            self.assertEqual(res.status_code, 304)
+
+    def test_not_compressed(self):
+        """Ensure results are not compressed for clients not accepting compression,
+        compressed formats and small results."""
+        with self._convert('html', {}) as res:
+            self.assertNotIn('Content-Encoding', res.headers)
+            self.assertEqual(res.headers['Vary'], 'Accept-Encoding')
+            self.assertEqual(res.data, self.OUTPUT)
+
+        with self._convert('pdf', {'Accept-Encoding': 'gzip'}) as res:
+            self.assertNotIn('Content-Encoding', res.headers)
+            self.assertNotIn('Vary', res.headers)
+
+        with mock.patch('matoconv.Config.COMPRESSION_MIN_SIZE', len(self.OUTPUT) + 1), \
+                self._convert('html', {'Accept-Encoding': 'gzip'}) as res:
+            self.assertNotIn('Content-Encoding', res.headers)
+            self.assertEqual(res.headers['ETag'], '"mock-cache-key"')
+
+
+class TestRoutePreview(TestRouteMockedBase):
+
+    MOCK_APP = False
+    MOCK_FORMAT_FACTORY_REGISTER_FORMATS = False
+    MOCK_CONVERSION_DETAILS = False
+    MOCK_FORMAT_FACTORY_BY_EXTENSION = False
+    MOCK_OPEN = False
+    MOCK_TEMPORARY_DIRECTORY = False
+    MOCK_OS = False
+    MOCK_CHECK_INPUT = False
+
+    PDF_DATA = TestRouteConvertPageRange.PDF_DATA
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.conversions = []
+
+        def submit(func, args, callback, error_callback, **kwargs):
+            """Record conversion and create output file in place of conversion."""
+            details = args[1][0]
+            self.conversions.append((
+                details.destination_format.extension, str(details.page_range), details.width))
+            with open(details.t_output_path, 'wb') as fh:
+                fh.write(b'IMAGE')
+            callback(task_result([]))
+            task = mock.MagicMock()
+            task.get.return_value = task_result([])
+            return task
+
+        self.mock_scheduler.submit.side_effect = submit
+
+    _convert = TestRouteConvertPageRange._convert
+
+    def test_preview(self):
+        """Ensure page is rendered at the requested width, cached by page and width."""
+        with self.client.post('/preview/format/png?page=2&width=100',
+                              headers={'Content-Disposition': 'attachment; filename="example.pdf"'},
+                              data=self.PDF_DATA) as res:
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.content_type, 'image/png')
+            self.assertEqual(res.headers['Content-Disposition'], 'attachment; filename=example.png')
+        self.assertEqual(self.conversions, [('png', '2', 100)])
+        self.assertEqual(self.mock_result_cache_class.make_key.call_args[1]['options'], 'pages=2,width=100')
+
+    def test_default_preview(self):
+        """Ensure first page is rendered at the default width."""
+        self.assertEqual(self._convert('/preview/format/jpeg', 'example.html', b'<p>Example</p>'), 200)
+        self.assertEqual(self.conversions, [('jpeg', '1', 200)])
+
+    def test_invalid_preview(self):
+        """Ensure invalid formats, pages and widths are rejected."""
+        self.assertEqual(self._convert('/preview/format/pdf', 'example.pdf', self.PDF_DATA), 404)
+        for query in ['page=0', 'page=a', 'width=0', 'width=5000']:
+            self.assertEqual(self._convert('/preview/format/png?' + query, 'example.pdf', self.PDF_DATA), 400)
+        self.assertEqual(self._convert('/preview/format/png?page=4', 'example.pdf', self.PDF_DATA), 422)
+        self.assertEqual(self.conversions, [])
+
+
+class TestRouteConvertImageAssets(TestRouteMockedBase):
+
+    MOCK_APP = False
+    MOCK_FORMAT_FACTORY_REGISTER_FORMATS = False
+    MOCK_CONVERSION_DETAILS = False
+    MOCK_FORMAT_FACTORY_BY_EXTENSION = False
+    MOCK_OPEN = False
+    MOCK_TEMPORARY_DIRECTORY = False
+    MOCK_OS = False
+    MOCK_CHECK_INPUT = False
+
+    PDF_DATA = TestRouteConvertPageRange.PDF_DATA
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.image_assets = []
+
+        def submit(func, args, callback, error_callback, **kwargs):
+            """Record option and create output file in place of conversion."""
+            details = args[1][0]
+            self.image_assets.append(details.image_assets)
+            with open(details.t_output_path, 'wb') as fh:
+                fh.write(b'ARCHIVE')
+            callback(task_result([]))
+            task = mock.MagicMock()
+            task.get.return_value = task_result([])
+            return task
+
+        self.mock_scheduler.submit.side_effect = submit
+
+    _convert = TestRouteConvertPageRange._convert
+
+    @mock.patch('matoconv.Config.COMPRESSION', True)
+    def test_image_assets(self):
+        """Ensure archive of document and images is returned uncompressed, cached separately."""
+        with self.client.post('/convert/format/html?images=separate',
+                              headers={'Content-Disposition': 'attachment; filename="example.pdf"',
+                                       'Accept-Encoding': 'gzip'},
+                              data=self.PDF_DATA) as res:
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.content_type, 'application/zip')
+            self.assertEqual(res.headers['Content-Disposition'], 'attachment; filename=example.html.zip')
+            self.assertNotIn('Content-Encoding', res.headers)
+            self.assertEqual(res.data, b'ARCHIVE')
+        self.assertEqual(self.image_assets, [True])
+        self.assertEqual(self.mock_result_cache_class.make_key.call_args[1]['options'], 'images=separate')
+
+        self.assertEqual(self._convert('/convert/format/html?images=inline', 'example.pdf', self.PDF_DATA), 200)
+        self.assertEqual(self.image_assets, [True, False])
+        self.assertEqual(self.mock_result_cache_class.make_key.call_args[1]['options'], '')
+
+    def test_invalid_image_assets(self):
+        """Ensure invalid options, and conversions which cannot output separate images, are rejected."""
+        self.assertEqual(self._convert('/convert/format/html?images=a', 'example.pdf', self.PDF_DATA), 400)
+        self.assertEqual(
+            self._convert('/convert/format/pdf?images=separate', 'example.html', b'<p>Example</p>'), 400)
+        self.assertEqual(self.image_assets, [])
+
+
+class TestRouteConvertBatch(TestRouteMockedBase):
+
+    MOCK_APP = False
+    MOCK_FORMAT_FACTORY_REGISTER_FORMATS = False
+    MOCK_CONVERSION_DETAILS = False
+    MOCK_FORMAT_FACTORY_BY_EXTENSION = False
+    MOCK_OPEN = False
+    MOCK_TEMPORARY_DIRECTORY = False
+    MOCK_OS = False
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.batches = []
+
+        def submit(func, args, callback, error_callback, **kwargs):
+            """Record batch and create output files in place of conversion."""
+            batch = args[1][0]
+            self.batches.append([os.path.basename(details.t_input_path) for details in batch])
+            for details in batch:
+                with open(details.t_output_path, 'wb') as fh:
+                    fh.write(b'CONVERTED ' + details.original_filename.encode())
+            callback(task_result([]))
+            task = mock.MagicMock()
+            task.get.return_value = task_result([])
+            return task
+
+        self.mock_scheduler.submit.side_effect = submit
+
+    def test_zip_batch(self):
+        """Ensure files of zip are converted in groups and returned with per-file results."""
+        body = io.BytesIO()
+        with zipfile.ZipFile(body, 'w') as archive:
+            archive.writestr('a.html', b'<p>a</p>')
+            archive.writestr('b.odt', b'odt')
+            archive.writestr('c.html', b'<p>c</p>')
+            archive.writestr('d.txt', b'text')
+
+        with self.client.post('/convert/batch/format/pdf',
+                              headers={'Content-Type': 'application/zip'},
+                              data=body.getvalue()) as res:
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.content_type, 'application/zip')
+            with zipfile.ZipFile(io.BytesIO(res.data)) as archive:
+                self.assertEqual(archive.read('a.pdf'), b'CONVERTED a.html')
+                self.assertEqual(archive.read('b.pdf'), b'CONVERTED b.odt')
+                self.assertEqual(archive.read('c.pdf'), b'CONVERTED c.html')
+                manifest = json.loads(archive.read('results.json'))
+
+        self.assertEqual(self.batches, [
+            ['conversion-0.html', 'conversion-2.html'],
+            ['conversion-1.odt']
+        ])
+        self.assertEqual([result['success'] for result in manifest], [True, True, True, False])
+        self.assertEqual(manifest[3]['error'], 'Unsupported source format')
+        self.assertEqual(self.mock_result_cache.put.call_count, 3)
+
+    def test_multipart_batch(self):
+        """Ensure files of multipart upload are converted."""
+        with self.client.post('/convert/batch/format/pdf',
+                              data={'files': [(io.BytesIO(b'<p>a</p>'), 'a.html'),
+                                              (io.BytesIO(b'<p>b</p>'), 'b.html')]},
+                              content_type='multipart/form-data') as res:
+            self.assertEqual(res.status_code, 200)
+            with zipfile.ZipFile(io.BytesIO(res.data)) as archive:
+                self.assertEqual(archive.read('b.pdf'), b'CONVERTED b.html')
+
+        self.assertEqual(self.batches, [['conversion-0.html', 'conversion-1.html']])
+
+    def test_empty_batch(self):
+        """Ensure requests without files are rejected."""
+        with self.client.post('/convert/batch/format/pdf', data={},
+                              content_type='multipart/form-data') as res:
+            self.assertEqual(res.status_code, 400)
+            self.assertTrue(b'No files provided' in res.data)
+
+    def test_invalid_zip(self):
+        """Ensure invalid zip bodies are rejected."""
+        with self.client.post('/convert/batch/format/pdf',
+                              headers={'Content-Type': 'application/zip'},
+                              data=b'not a zip') as res:
+            self.assertEqual(res.status_code, 400)
+            self.assertTrue(b'Invalid zip archive' in res.data)
+
+
+class TestRouteJobs(TestRouteMockedBase):
+
+    MOCK_APP = False
+    MOCK_FORMAT_FACTORY_REGISTER_FORMATS = False
+    MOCK_CONVERSION_DETAILS = False
+    MOCK_FORMAT_FACTORY_BY_EXTENSION = False
+    MOCK_OPEN = False
+    MOCK_TEMPORARY_DIRECTORY = False
+    MOCK_OS = False
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.pending_tasks = []
+
+        def submit(func, args, callback, error_callback, **kwargs):
+            """Store task, to be completed by test."""
+            self.pending_tasks.append((args[1][0], callback))
+
+        self.mock_scheduler.submit.side_effect = submit
+
+        # Submit queued jobs immediately, rather than in a background thread,
+        # leaving threads without arguments, such as the work directory reaper
+        thread_class = threading.Thread
+        self.mock_thread_patcher = mock.patch('matoconv.threading.Thread')
+        self.mock_thread = self.mock_thread_patcher.start()
+        self.addCleanup(self.mock_thread_patcher.stop)
+        self.mock_thread.side_effect = lambda target, args=(), **kwargs: mock.MagicMock(
+            start=lambda: target(*args)) if args else thread_class(target=target, **kwargs)
+
+    def tearDown(self) -> None:
+        for job_id in list(self.matoconv.job_store._jobs):
+            self.matoconv.job_store.remove(job_id)
+        return super().tearDown()
+
+    def _create_job(self, query_string='format=pdf'):
+        with self.client.post('/jobs?' + query_string,
+                              headers={
+                                  'Content-Disposition': 'attachment; filename="example.html"'},
+                              data='<p>Hi</p>') as res:
+            return res.status_code, res.get_json(), res.headers.get('Location')
+
+    def test_job(self):
+        """Ensure job is created without waiting for conversion and result is available once done."""
+        status_code, job, location = self._create_job()
+        self.assertEqual(status_code, 202)
+        self.assertEqual(job['status'], 'pending')
+        self.assertTrue(location.endswith('/jobs/' + job['id']))
+
+        with self.client.get('/jobs/' + job['id'] + '/result') as res:
+            self.assertEqual(res.status_code, 409)
+
+        # Complete conversion
+        conversion_details, callback = self.pending_tasks.pop()
+        with open(conversion_details.t_input_path, 'rb') as fh:
+            self.assertEqual(fh.read(), b'<p>Hi</p>')
+        with open(conversion_details.t_output_path, 'wb') as fh:
+            fh.write(b'CONVERTED')
+        callback(task_result([]))
+
+        with self.client.get('/jobs/' + job['id']) as res:
+            self.assertEqual(res.get_json()['status'], 'done')
+
+        with self.client.get('/jobs/' + job['id'] + '/result') as res:
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.data, b'CONVERTED')
+            self.assertEqual(res.headers['Content-Disposition'], 'attachment; filename=example.pdf')
+            self.assertEqual(res.headers['ETag'], '"mock-cache-key"')
+
+        self.mock_result_cache.put.assert_called_once_with(
+            'mock-cache-key', conversion_details.t_output_path)
+
+    def test_failed_job(self):
+        """Ensure jobs without output are marked as failed."""
+        _, job, _ = self._create_job()
+        _, callback = self.pending_tasks.pop()
+        callback(task_result(['Conversion error']))
+
+        with self.client.get('/jobs/' + job['id']) as res:
+            self.assertEqual(res.get_json(), {
+                'id': job['id'], 'status': 'failed', 'error': 'Conversion failed', 'attempts': []})
+
+    def test_cached_job(self):
+        """Ensure cached results complete job without conversion."""
+        self.mock_result_cache.get.return_value = CacheEntry('mock-cache-key', data=b'CACHED')
+
+        _, job, _ = self._create_job()
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(self.pending_tasks, [])
+
+        with self.client.get('/jobs/' + job['id'] + '/result') as res:
+            self.assertEqual(res.data, b'CACHED')
+
+    def test_callback(self):
+        """Ensure callback URL is notified of job completion."""
+        _, job, _ = self._create_job('format=pdf&callback=http%3A%2F%2Fexample.com%2Fdone')
+        _, callback = self.pending_tasks.pop()
+
+        self.mock_thread.reset_mock()
+        self.mock_thread.side_effect = None
+        mock_thread = self.mock_thread
+        callback(task_result([]))
+
+        mock_thread.assert_called_once_with(
+            target=self.matoconv.send_job_callback,
+            args=(self.matoconv.job_store.get(job['id']), ), daemon=True)
+        mock_thread.return_value.start.assert_called_once_with()
+
+    def test_invalid_requests(self):
+        """Ensure invalid job requests are rejected."""
+        self.assertEqual(self._create_job('format=doesnotexist')[0], 404)
+        self.assertEqual(self._create_job('format=pdf&callback=file%3A%2F%2F%2Fetc%2Fpasswd')[0], 400)
+        with self.client.get('/jobs/doesnotexist') as res:
+            self.assertEqual(res.status_code, 404)
+
+
+class TestPerformConversionStats(TestRouteMockedBase):
+
+    def test_timeout_failure(self):
+        """Ensure a single attempt is made, counting timeouts and failures."""
+        MockConversionDetails.TYPE = 1
+        mock_backend = mock.MagicMock()
+        mock_backend.convert.return_value = Matoconv.TIMEOUT_RC
+        self.mock_os.path.isfile.return_value = False
+
+        stats = TaskStats()
+        with mock.patch('matoconv.FormatFactory.backend', return_value=mock_backend), \
+                mock.patch('matoconv.Config.MAX_ATTEMPTS', 2):
+            Matoconv.perform_conversion(MockConversionDetails(), stats=stats)
+
+        mock_backend.convert.assert_called_once()
+        self.assertEqual(stats.timeouts, 1)
+        self.assertEqual(stats.retries, 0)
+        self.assertEqual(stats.failures, 1)
+
+
+class TestPerformBatchConversion(TestRouteMockedBase):
+
+    MOCK_FORMAT_FACTORY_REGISTER_FORMATS = False
+    MOCK_FORMAT_FACTORY_BY_EXTENSION = False
+    MOCK_OPEN = False
+    MOCK_TEMPORARY_DIRECTORY = False
+    MOCK_OS = False
+
+    def test_single_soffice_run(self):
+        """Ensure batch is converted by a single soffice run, converting missing outputs individually."""
+        with tempfile.TemporaryDirectory() as temp_directory:
+            batch = [
+                ConversionDetails(
+                    content_disp_headers='attachment; filename="{}.html"'.format(name),
+                    temp_directory=temp_directory,
+                    dest_format=PDF(),
+                    t_extless_filename='conversion-{}'.format(index))
+                for index, name in enumerate(['a', 'b'])
+            ]
+            def run_command(cmd, env, cwd, logs, **kwargs):
+                """Only convert first file in the batch run."""
+                with open(batch[0].t_output_path, 'wb') as fh:
+                    fh.write(b'')
+                kwargs['usage'].append(ProcessUsage(wall_time=1, cpu_time=0.5, max_rss=1024))
+                return 0
+
+            self.mock_run_command.side_effect = run_command
+            stats = TaskStats()
+
+            with mock.patch('matoconv.Matoconv.perform_conversion') as mock_perform_conversion:
+                mock_perform_conversion.return_value = []
+                logs = Matoconv.perform_batch_conversion(batch, stats=stats)
+
+            self.assertEqual(logs, [])
+            cmd = self.mock_run_command.call_args[0][0]
+            self.assertEqual(cmd[0], 'soffice')
+            self.assertEqual(self.mock_run_command.call_args[1]['timeout'], 40)
+            self.assertEqual(cmd[-2:], [batch[0].t_input_path, batch[1].t_input_path])
+            mock_perform_conversion.assert_called_once_with(batch[1], stats=stats)
+            self.assertEqual(stats.cpu_time, 0.5)
+            self.assertEqual(stats.max_rss, 1024)
+
+
+class TestPerformConversionRoute(TestRouteMockedBase):
+
+    MOCK_FORMAT_FACTORY_REGISTER_FORMATS = False
+    MOCK_CONVERSION_DETAILS = False
+    MOCK_FORMAT_FACTORY_BY_EXTENSION = False
+    MOCK_OPEN = False
+    MOCK_TEMPORARY_DIRECTORY = False
+    MOCK_OS = False
+
+    def test_multi_step_route(self):
+        """Ensure each step of route converts the output of the previous step."""
+        direct, = FormatFactory.find_route(PDF(), DOCX())
+        FormatFactory.observe_conversion(direct, 10)
+
+        conversion_details = ConversionDetails(
+            content_disp_headers='attachment; filename="example.pdf"',
+            temp_directory='/tmp/conversion-path',
+            dest_format=DOCX())
+        steps = []
+
+        def perform_conversion_step(step_details, backend, stats):
+            steps.append((backend.name, step_details.t_input_path, step_details.t_output_path))
+            return [], True
+
+        with mock.patch('matoconv.Matoconv.perform_conversion_step',
+                        side_effect=perform_conversion_step):
+            self.assertEqual(Matoconv.perform_conversion(conversion_details), [])
+
+        self.assertEqual(steps, [
+            ('pdftohtml', '/tmp/conversion-path/conversion.pdf', '/tmp/conversion-path/conversion.html'),
+            ('soffice', '/tmp/conversion-path/conversion.html', '/tmp/conversion-path/conversion.docx')
+        ])
+
+    def test_multi_step_page_range(self):
+        """Ensure page range is converted by the first step supporting it."""
+        direct, = FormatFactory.find_route(PDF(), DOCX())
+        FormatFactory.observe_conversion(direct, 10)
+
+        conversion_details = ConversionDetails(
+            content_disp_headers='attachment; filename="example.pdf"',
+            temp_directory='/tmp/conversion-path',
+            dest_format=DOCX(),
+            page_range=PageRange(1, 2))
+        page_ranges = []
+
+        def perform_conversion_step(step_details, backend, stats):
+            page_ranges.append((backend.name, str(step_details.page_range)))
+            return [], True
+
+        with mock.patch('matoconv.Matoconv.perform_conversion_step',
+                        side_effect=perform_conversion_step), \
+                mock.patch('matoconv.FormatFactory.observe_conversion') as mock_observe_conversion:
+            self.assertEqual(Matoconv.perform_conversion(conversion_details), [])
+
+        self.assertEqual(page_ranges, [('pdftohtml', '1-2'), ('soffice', 'None')])
+        # Only full conversions are observed
+        mock_observe_conversion.assert_called_once()
+
+    def test_failed_step(self):
+        """Ensure conversion stops at the first failed step."""
+        direct, = FormatFactory.find_route(PDF(), DOCX())
+        FormatFactory.observe_conversion(direct, 10)
+        conversion_details = ConversionDetails(
+            content_disp_headers='attachment; filename="example.pdf"',
+            temp_directory='/tmp/conversion-path',
+            dest_format=DOCX())
+
+        with mock.patch('matoconv.Matoconv.perform_conversion_step',
+                        return_value=(['Conversion error'], False)) as mock_perform_conversion_step:
+            self.assertEqual(Matoconv.perform_conversion(conversion_details), ['Conversion error'])
+
+        mock_perform_conversion_step.assert_called_once()
+
+
+class TestPageRange(TestCase):
+
+    def test_parse(self):
+        """Ensure page ranges are parsed from request parameters."""
+        for value, first, last in [('2', 2, 2), ('1-3', 1, 3), ('4-', 4, None)]:
+            page_range = PageRange.parse(value)
+            self.assertEqual((page_range.first, page_range.last), (first, last))
+            self.assertEqual(str(page_range), value)
+
+    def test_count(self):
+        """Ensure pages converted are counted within the document."""
+        self.assertEqual(PageRange(2, 3).count(10), 2)
+        self.assertEqual(PageRange(2).count(10), 9)
+        self.assertEqual(PageRange(9, 12).count(10), 2)
+        self.assertEqual(PageRange(11).count(10), 0)
+
+
+class TestPerformConversion(TestRouteMockedBase):
+
+    def test_full_single_run(self):
+        """Test full conversion with single attempt."""
+        MockConversionDetails.TYPE = 1
+        mock_conversion_details = MockConversionDetails()
+        mock_backend = mock.MagicMock()
+        mock_backend.convert.return_value = 0
+
+        # Return that output file was create
+        self.mock_os.path.isfile.return_value = True
+
+        with mock.patch('matoconv.FormatFactory.backend', return_value=mock_backend) as mock_get_backend:
+            # Perform conversion
+            response = self.matoconv.perform_conversion(
                 mock_conversion_details)
 
-            self.mock_subprocess.Popen.assert_called_once_with(
-                mock_cmd,
-                stderr=self.mock_subprocess.PIPE,
-                stdout=self.mock_subprocess.PIPE,
-                cwd='/tmp/conversion-path',
-                env=mock_env)
+        self.assertTrue(isinstance(response, list))
+        self.assertEqual(len(response), 0)
 
-            # Ensure callback was called with empty logs
-            mock_callback.assert_called()
+        mock_get_backend.assert_called_once_with(self.mock_find_route.return_value[0].backend)
+        mock_backend.convert.assert_called_once_with(mock_conversion_details, [])
 
-            self.mock_os.path.isfile.assert_called_once_with(
-                '/tmp/conversion-path/temp-conversion-file.pdf')
+        self.mock_os.path.isfile.assert_called_once_with(
+            '/tmp/conversion-path/temp-conversion-file.pdf')
@@ -0,0 +1,80 @@
+from unittest import TestCase, mock
+
+from matoconv.metrics import Counter, Gauge, Histogram, MatoconvMetrics, TaskStats
+from matoconv.supervisor import ProcessUsage
+
+
+class TestMetrics(TestCase):
+
+    def test_counter(self):
+        """Ensure counters are rendered per label values."""
+        counter = Counter('test_events', 'Test events.', ('source', ))
+        counter.inc(source='html')
+        counter.inc(2, source='html')
+        counter.inc(source='a"b')
+
+        self.assertEqual(counter.render(), (
+            '# HELP test_events Test events.\n'
+            '# TYPE test_events counter\n'
+            'test_events_total{source="a\\"b"} 1.0\n'
+            'test_events_total{source="html"} 3.0\n'))
+
+    def test_invalid_labels(self):
+        """Ensure labels must match label names."""
+        counter = Counter('test_events', 'Test events.', ('source', ))
+        with self.assertRaises(ValueError):
+            counter.inc(destination='pdf')
+
+    def test_histogram(self):
+        """Ensure histogram buckets are cumulative."""
+        histogram = Histogram('test_seconds', 'Test durations.', buckets=(1, 5))
+        histogram.observe(0.5)
+        histogram.observe(3)
+        histogram.observe(10)
+
+        self.assertEqual(histogram.render(), (
+            '# HELP test_seconds Test durations.\n'
+            '# TYPE test_seconds histogram\n'
+            'test_seconds_bucket{le="1.0"} 1.0\n'
+            'test_seconds_bucket{le="5.0"} 2.0\n'
+            'test_seconds_bucket{le="+Inf"} 3.0\n'
+            'test_seconds_sum 13.5\n'
+            'test_seconds_count 3.0\n'))
+
+    def test_gauge(self):
+        """Ensure gauge values are collected when rendered."""
+        values = {('busy', ): 1}
+        gauge = Gauge('test_slots', 'Test slots.', lambda: values, ('state', ))
+        values[('busy', )] = 2
+
+        self.assertIn('test_slots{state="busy"} 2.0\n', gauge.render())
+
+    def test_observe_task(self):
+        """Ensure task statistics are recorded."""
+        admission = mock.MagicMock(slots=5, active=2, waiting=3)
+        metrics = MatoconvMetrics(admission)
+        stats = TaskStats()
+        stats.started_at = 102
+        stats.finished_at = 105
+        stats.retries = 2
+        stats.add_usage([
+            ProcessUsage(wall_time=1, cpu_time=0.5, max_rss=1024),
+            ProcessUsage(wall_time=1, cpu_time=1.5, max_rss=512)
+        ])
+        metrics.observe_task(source='html', destination='pdf', queued_at=100, stats=stats)
+
+        output = metrics.render()
+        self.assertIn(
+            'matoconv_queue_wait_seconds_sum{source="html",destination="pdf"} 2.0\n', output)
+        self.assertIn(
+            'matoconv_conversion_duration_seconds_sum{source="html",destination="pdf"} 3.0\n', output)
+        self.assertIn(
+            'matoconv_conversion_retries_total{source="html",destination="pdf"} 2.0\n', output)
+        self.assertIn(
+            'matoconv_conversion_cpu_seconds_sum{source="html",destination="pdf"} 2.0\n', output)
+        self.assertIn(
+            'matoconv_conversion_max_rss_bytes_sum{source="html",destination="pdf"} 1024.0\n', output)
+        self.assertNotIn('matoconv_conversion_failures_total{', output)
+        self.assertIn('matoconv_converter_slots{state="busy"} 2.0\n', output)
+        self.assertIn('matoconv_converter_slots{state="idle"} 3.0\n', output)
+        self.assertIn('matoconv_queue_depth 3.0\n', output)
@@ -0,0 +1,90 @@
+import threading
+
+from unittest import TestCase, mock
+
+from matoconv import office, PDF, HTML, DOCX
+
+
+class TestOfficeListener(TestCase):
+
+    def setUp(self) -> None:
+        self.listener = office.OfficeListener(
+            name='test', start_timeout=1, execution_timeout=1)
+        return super().setUp()
+
+    def test_get_command(self):
+        """Ensure listener is started with a private profile and accepts on a pipe."""
+        self.listener._profile_directory = '/tmp/some-profile'
+        cmd = self.listener.get_command()
+        self.assertEqual(cmd[0], 'soffice')
+        self.assertIn('--headless', cmd)
+        self.assertIn('-env:UserInstallation=file:///tmp/some-profile', cmd)
+        self.assertIn(
+            '--accept=pipe,name=matoconv-test;urp;StarOffice.ComponentContext', cmd)
+
+    def test_is_alive(self):
+        """Test is_alive with no process, running process and exited process."""
+        self.assertFalse(self.listener.is_alive())
+
+        self.listener._process = mock.MagicMock()
+        self.listener._process.poll.return_value = None
+        self.assertTrue(self.listener.is_alive())
+
+        self.listener._process.poll.return_value = 1
+        self.assertFalse(self.listener.is_alive())
+
+    def test_ensure_running_respawns(self):
+        """Ensure a listener whose process has died is restarted."""
+        dead_process = mock.MagicMock()
+        dead_process.poll.return_value = -9
+        self.listener._process = dead_process
+        self.listener._desktop = mock.MagicMock()
+
+        with mock.patch.object(self.listener, 'start') as mock_start:
+            self.listener.ensure_running()
+
+        mock_start.assert_called_once_with()
+        # Dead process is not signalled again.
+        dead_process.terminate.assert_not_called()
+
+    def test_ensure_running_alive(self):
+        """Ensure a healthy listener is not restarted."""
+        self.listener._process = mock.MagicMock()
+        self.listener._process.poll.return_value = None
+        self.listener._desktop = mock.MagicMock()
+
+        with mock.patch.object(self.listener, 'start') as mock_start:
+            self.listener.ensure_running()
+
+        mock_start.assert_not_called()
+
+
+class TestSlotListener(TestCase):
+
+    def test_slot_listener_per_thread(self):
+        """Ensure each slot thread owns a single listener."""
+        listener = office.slot_listener(start_timeout=1, execution_timeout=1)
+        self.assertIs(
+            office.slot_listener(start_timeout=1, execution_timeout=1), listener)
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(
+            office.slot_listener(start_timeout=1, execution_timeout=1)))
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(other[0], listener)
+        self.assertNotEqual(other[0].pipe_name, listener.pipe_name)
+
+
+class TestUnoFilters(TestCase):
+
+    def test_uno_filters(self):
+        """Test UNO filter names are derived from formats."""
+        self.assertEqual(PDF().uno_output_filter, 'writer_pdf_Export')
+        self.assertEqual(PDF().uno_input_filter, 'writer_pdf_import')
+        self.assertEqual(PDF().uno_output_filter_options, None)
+        self.assertEqual(DOCX().uno_output_filter, 'Office Open XML Text')
+        self.assertEqual(HTML().uno_input_filter, 'HTML (StarWriter)')
+        self.assertEqual(HTML().uno_output_filter, 'HTML (StarWriter)')
+        self.assertEqual(HTML().uno_output_filter_options, 'EmbedImages')
@@ -0,0 +1,137 @@
+
+import base64
+import io
+import os
+import tempfile
+import zipfile
+from unittest import TestCase
+
+from matoconv.postprocess import bundle_images, inline_images, write_shard
+
+
+class TestInlineImages(TestCase):
+
+    def setUp(self):
+        """Create directory of pdftohtml output."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.input_path = os.path.join(self.directory.name, 'conversion-html.html')
+        self.output_path = os.path.join(self.directory.name, 'conversion.html')
+
+    def _write(self, filename: str, data: bytes):
+        """Write file to directory."""
+        with open(os.path.join(self.directory.name, filename), 'wb') as fh:
+            fh.write(data)
+
+    def _inline_images(self, html: bytes, chunk_size: int = 64 * 1024) -> bytes:
+        """Inline images of HTML, returning the output."""
+        self._write('conversion-html.html', html)
+        inline_images(self.input_path, self.output_path, self.directory.name, [],
+                      chunk_size=chunk_size, workers=2)
+        with open(self.output_path, 'rb') as fh:
+            return fh.read()
+
+    def test_single_reference(self):
+        """Ensure images referenced once are embedded in their tag."""
+        self._write('conversion-html001.png', b'PNG DATA')
+
+        output = self._inline_images(
+            b'<html><head></head><body>\n<img width="10" src="conversion-html001.png"/>\n</body></html>\n')
+
+        self.assertEqual(
+            output,
+            b'<html><head></head><body>\n<img width="10" src="data:image/png;base64,' +
+            base64.b64encode(b'PNG DATA') + b'"/>\n</body></html>\n')
+
+    def test_duplicate_images(self):
+        """Ensure identical images are embedded once, in a stylesheet class."""
+        self._write('conversion-html001.png', b'BACKGROUND')
+        self._write('conversion-html002.png', b'BACKGROUND')
+
+        output = self._inline_images(
+            b'<html><head>\n</head><body>\n'
+            b'<img src="conversion-html001.png"/>\n'
+            b'<img class="page" src="conversion-html002.png"/>\n'
+            b'</body></html>\n')
+
+        self.assertEqual(output.count(base64.b64encode(b'BACKGROUND')), 1)
+        self.assertLess(output.index(b'<style'), output.index(b'</head>'))
+        self.assertIn(b'<img class="matoconv-img-0" src="data:image/gif;base64,', output)
+        self.assertIn(b'<img class="page matoconv-img-0" src="data:image/gif;base64,', output)
+
+    def test_tags_split_across_chunks(self):
+        """Ensure tags are replaced when spanning multiple reads."""
+        self._write('conversion-html001.png', b'PNG DATA')
+        html = b'<html><body>' + b'<p>text</p>' * 20 + b'<img src="conversion-html001.png"/></body></html>'
+
+        self.assertEqual(
+            self._inline_images(html, chunk_size=7),
+            self._inline_images(html))
+
+    def test_missing_and_external_images(self):
+        """Ensure images outside the directory, or missing, are left unchanged."""
+        html = b'<body><img src="missing.png"/><img src="../secret.png"/></body>'
+
+        self.assertEqual(self._inline_images(html), html)
+
+
+class TestBundleImages(TestCase):
+
+    setUp = TestInlineImages.setUp
+    _write = TestInlineImages._write
+
+    def test_bundle(self):
+        """Ensure HTML is bundled with its images, stored once each, excluding missing and external images."""
+        self._write('conversion-html001.png', b'PNG DATA')
+        html = (b'<body><img src="conversion-html001.png"/><img src="conversion-html001.png"/>'
+                b'<img src="missing.png"/><img src="../secret.png"/></body>')
+        self._write('conversion-html.html', html)
+        output_path = os.path.join(self.directory.name, 'conversion.zip')
+        logs = []
+
+        bundle_images(self.input_path, output_path, self.directory.name, logs, chunk_size=7)
+
+        with zipfile.ZipFile(output_path) as archive:
+            self.assertEqual(archive.namelist(), ['index.html', 'conversion-html001.png'])
+            self.assertEqual(archive.read('index.html'), html)
+            self.assertEqual(archive.read('conversion-html001.png'), b'PNG DATA')
+            self.assertEqual(archive.getinfo('conversion-html001.png').compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(len(logs), 1)
+
+
+class TestWriteShard(TestCase):
+
+    SHARD = (
+        b'<html><head><title>Shard</title>\n'
+        b'<style type="text/css">\n<!--\n.ft10{font-size:12px;}\n-->\n</style>\n'
+        b'</head>\n<body bgcolor="#A0A0A0">\n'
+        b'<div id="page{page}-div"><p class="ft10">Text ft10</p></div>\n'
+        b'</body>\n</html>\n')
+
+    def setUp(self):
+        """Create directory of shard output."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def _shard(self, index: int) -> str:
+        """Write shard, returning its path."""
+        path = os.path.join(self.directory.name, 'conversion-shard-{}.html'.format(index))
+        with open(path, 'wb') as fh:
+            fh.write(self.SHARD.replace(b'{page}', str(index + 1).encode('ascii')))
+        return path
+
+    def test_stitch(self):
+        """Ensure shards are stitched into a single document, with fonts of each shard renamed."""
+        fh = io.BytesIO()
+        write_shard(fh, self._shard(0), 0, first=True, last=False)
+        write_shard(fh, self._shard(1), 1, first=False, last=True)
+
+        self.assertEqual(
+            fh.getvalue(),
+            b'<html><head><title>Shard</title>\n'
+            b'<style type="text/css">\n<!--\n.ft10-0{font-size:12px;}\n-->\n</style>\n'
+            b'</head>\n<body bgcolor="#A0A0A0">\n'
+            b'<div id="page1-div"><p class="ft10-0">Text ft10</p></div>\n'
+            b'<style type="text/css">\n<!--\n.ft10-1{font-size:12px;}\n-->\n</style>\n'
+            b'\n<div id="page2-div"><p class="ft10-1">Text ft10</p></div>\n'
+            b'</body>\n</html>\n')
@@ -0,0 +1,95 @@
+
+import io
+import os
+import tempfile
+import zipfile
+from unittest import TestCase
+
+from matoconv.exceptions import InvalidInputError
+from matoconv.preflight import inspect, OLE_MAGIC
+
+
+class TestInspect(TestCase):
+
+    def setUp(self):
+        """Create directory for input files."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'conversion')
+
+    def _inspect(self, data: bytes, count_pages: bool = True):
+        """Write input file and return its details."""
+        with open(self.path, 'wb') as fh:
+            fh.write(data)
+        return inspect(self.path, len(data), count_pages=count_pages)
+
+    @staticmethod
+    def _zip(members: dict) -> bytes:
+        """Return zip archive of members."""
+        archive_data = io.BytesIO()
+        with zipfile.ZipFile(archive_data, 'w') as archive:
+            for name, data in members.items():
+                archive.writestr(name, data)
+        return archive_data.getvalue()
+
+    def test_pdf(self):
+        """Ensure PDF files are detected, with page count of page tree root."""
+        info = self._inspect(
+            b'%PDF-1.4\n1 0 obj\n<< /Type /Pages /Kids [3 0 R] /Count 12 >>\nendobj\n'
+            b'2 0 obj\n<< /Count 3 /Type /Pages /Parent 1 0 R >>\nendobj\n%%EOF\n')
+
+        self.assertEqual(info.extension, 'pdf')
+        self.assertEqual(info.pages, 12)
+        self.assertIsNone(self._inspect(b'%PDF-1.4\n%%EOF\n', count_pages=False).pages)
+
+    def test_pdf_truncated(self):
+        """Ensure PDF files without end of file marker are rejected."""
+        with self.assertRaises(InvalidInputError) as context:
+            self._inspect(b'%PDF-1.4\n1 0 obj\n<< /Type /Pages')
+        self.assertEqual(context.exception.status_code, 422)
+
+    def test_docx(self):
+        """Ensure DOCX files are detected, with page count from document properties."""
+        info = self._inspect(self._zip({
+            '[Content_Types].xml': '<Types/>',
+            'word/document.xml': '<document/>',
+            'docProps/app.xml': '<Properties><Pages>4</Pages></Properties>'
+        }))
+
+        self.assertEqual(info.extension, 'docx')
+        self.assertEqual(info.pages, 4)
+
+    def test_odt(self):
+        """Ensure ODT files are detected, with page count from metadata."""
+        info = self._inspect(self._zip({
+            'mimetype': 'application/vnd.oasis.opendocument.text',
+            'meta.xml': '<meta:document-statistic meta:page-count="7"/>'
+        }))
+
+        self.assertEqual(info.extension, 'odt')
+        self.assertEqual(info.pages, 7)
+
+    def test_zip_truncated(self):
+        """Ensure truncated archives are rejected."""
+        data = self._zip({'mimetype': 'application/vnd.oasis.opendocument.text'})
+        with self.assertRaises(InvalidInputError):
+            self._inspect(data[:len(data) // 2])
+
+    def test_other_zip(self):
+        """Ensure archives which are not documents are not detected."""
+        self.assertIsNone(self._inspect(self._zip({'example.txt': 'text'})).extension)
+
+    def test_doc(self):
+        """Ensure OLE documents and RTF are detected as doc."""
+        header = OLE_MAGIC + b'\x00' * 22 + b'\x09\x00' + b'\x00' * 480
+        self.assertEqual(self._inspect(header + b'\x00' * 512).extension, 'doc')
+        self.assertEqual(self._inspect(b'{\\rtf1\\ansi example}').extension, 'doc')
+
+        with self.assertRaises(InvalidInputError):
+            self._inspect(header)
+
+    def test_html(self):
+        """Ensure text is detected as HTML and binary data is not detected."""
+        self.assertEqual(self._inspect(b'<html><body>Example</body></html>').extension, 'html')
+        self.assertIsNone(self._inspect(b'\x89PNG\r\n\x1a\n\x00\x00').extension)
+        self.assertIsNone(self._inspect(b'').extension)
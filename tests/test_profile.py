@@ -0,0 +1,75 @@
+import os
+import tempfile
+
+from unittest import TestCase, mock
+
+from matoconv.exceptions import ProfileTemplateError
+from matoconv.profile import ProfileTemplate
+
+
+class TestProfileTemplate(TestCase):
+
+    def setUp(self) -> None:
+        """Create fake pre-built template profile."""
+        self.temp_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_directory.cleanup)
+        self.template_path = os.path.join(self.temp_directory.name, 'template')
+        os.makedirs(os.path.join(self.template_path, 'user', 'config'))
+        for file_name in ['user/registrymodifications.xcu', 'user/config/images.zip']:
+            with open(os.path.join(self.template_path, file_name), 'w') as fh:
+                fh.write(file_name)
+        return super().setUp()
+
+    def _create_template(self, clone_mode):
+        template = ProfileTemplate(
+            path=self.template_path, clone_mode=clone_mode, build_timeout=1)
+        template._ready = True
+        return template
+
+    def test_unknown_clone_mode(self):
+        """Ensure unknown clone modes are rejected."""
+        with self.assertRaises(ProfileTemplateError):
+            ProfileTemplate(path=self.template_path, clone_mode='magic', build_timeout=1)
+
+    def test_clone_before_build(self):
+        """Ensure template cannot be cloned before being built."""
+        template = ProfileTemplate(
+            path=self.template_path, clone_mode='copy', build_timeout=1)
+        with self.assertRaises(ProfileTemplateError):
+            template.clone(os.path.join(self.temp_directory.name, 'clone'))
+
+    def test_clone_hardlink(self):
+        """Ensure immutable files are linked and mutable files copied."""
+        destination = os.path.join(self.temp_directory.name, 'clone')
+        self._create_template('hardlink').clone(destination)
+
+        template_stat = os.stat(os.path.join(self.template_path, 'user/config/images.zip'))
+        clone_stat = os.stat(os.path.join(destination, 'user/config/images.zip'))
+        self.assertEqual(template_stat.st_ino, clone_stat.st_ino)
+
+        template_stat = os.stat(os.path.join(
+            self.template_path, 'user/registrymodifications.xcu'))
+        clone_stat = os.stat(os.path.join(destination, 'user/registrymodifications.xcu'))
+        self.assertNotEqual(template_stat.st_ino, clone_stat.st_ino)
+
+    def test_clone_copy(self):
+        """Ensure copy mode creates independent copies of all files."""
+        destination = os.path.join(self.temp_directory.name, 'clone')
+        self._create_template('copy').clone(destination)
+
+        for file_name in ['user/registrymodifications.xcu', 'user/config/images.zip']:
+            with open(os.path.join(destination, file_name), 'r') as fh:
+                self.assertEqual(fh.read(), file_name)
+            self.assertNotEqual(
+                os.stat(os.path.join(self.template_path, file_name)).st_ino,
+                os.stat(os.path.join(destination, file_name)).st_ino)
+
+    def test_build_failure(self):
+        """Ensure failure to run soffice is reported as a template error."""
+        template = ProfileTemplate(
+            path=self.template_path, clone_mode='copy', build_timeout=1)
+        with mock.patch('matoconv.profile.subprocess.run',
+                        side_effect=FileNotFoundError('soffice')):
+            with self.assertRaises(ProfileTemplateError):
+                template.build()
+        self.assertFalse(template.ready)
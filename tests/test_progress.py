@@ -0,0 +1,73 @@
+import io
+import tempfile
+import threading
+from unittest import TestCase, mock
+
+from matoconv.progress import OutputProgress, ProgressiveStream
+
+
+class TestOutputProgress(TestCase):
+
+    def test_wait_streaming(self):
+        """Ensure output is streamed only if partially written before the conversion finishes."""
+        progress = OutputProgress()
+        self.assertFalse(progress.wait_streaming(0))
+
+        progress.advance(10)
+        self.assertTrue(progress.wait_streaming(0))
+
+        progress.finish([])
+        self.assertFalse(progress.wait_streaming(0))
+        self.assertTrue(progress.wait_finished())
+
+    def test_iter_written(self):
+        """Ensure output is yielded as it is written, until the conversion finishes."""
+        progress = OutputProgress()
+        written = threading.Event()
+        output = tempfile.NamedTemporaryFile()
+        self.addCleanup(output.close)
+
+        def convert():
+            with open(output.name, 'wb') as fh:
+                fh.write(b'PAGE 1\n')
+                fh.flush()
+                progress.advance(fh.tell())
+                written.wait()
+                fh.write(b'PAGE 2\n')
+            progress.finish([])
+
+        thread = threading.Thread(target=convert)
+        thread.start()
+        with open(output.name, 'rb') as fh:
+            chunks = progress.iter_written(fh, 4)
+            self.assertEqual(next(chunks), b'PAGE')
+            self.assertEqual(next(chunks), b' 1\n')
+            written.set()
+            self.assertEqual(b''.join(chunks), b'PAGE 2\n')
+        thread.join()
+
+    def test_failed_conversion(self):
+        """Ensure output of failed conversions is truncated."""
+        progress = OutputProgress()
+        progress.advance(7)
+        progress.finish(['Conversion failed'])
+        self.assertEqual(list(progress.iter_written(io.BytesIO(b'PAGE 1\n'), 4)), [])
+        self.assertFalse(progress.wait_finished())
+
+
+class TestProgressiveStream(TestCase):
+
+    def test_close(self):
+        """Ensure output file is closed and callback is called once."""
+        progress = OutputProgress()
+        progress.finish([])
+        fh = io.BytesIO(b'OUTPUT')
+        on_close = mock.MagicMock()
+
+        stream = ProgressiveStream(progress, fh, 64, on_close)
+        self.assertEqual(b''.join(stream), b'OUTPUT')
+        stream.close()
+        stream.close()
+
+        self.assertTrue(fh.closed)
+        on_close.assert_called_once_with()
@@ -0,0 +1,85 @@
+
+from unittest import TestCase, mock
+
+from matoconv.retry import RetryPolicy, RetryBudget, CircuitBreaker, RetryController
+
+
+class TestRetryPolicy(TestCase):
+
+    def test_delay(self):
+        """Ensure delay backs off exponentially, with jitter, up to the maximum."""
+        policy = RetryPolicy(max_attempts=5, base_delay=1, max_delay=5)
+        for attempt, backoff in ((1, 1), (2, 2), (3, 4), (4, 5)):
+            delay = policy.delay(attempt)
+            self.assertGreaterEqual(delay, backoff / 2)
+            self.assertLessEqual(delay, backoff)
+
+
+class TestRetryBudget(TestCase):
+
+    def test_budget(self):
+        """Ensure retries are limited to the minimum plus a proportion of requests."""
+        budget = RetryBudget(ratio=0.5, min_retries=1, window=60)
+        for _ in range(4):
+            budget.record_request()
+
+        self.assertEqual([budget.try_spend() for _ in range(4)], [True, True, True, False])
+
+    def test_window(self):
+        """Ensure retries outside the window are not counted."""
+        budget = RetryBudget(ratio=0, min_retries=1, window=60)
+        with mock.patch('matoconv.retry.time.monotonic', return_value=100):
+            self.assertTrue(budget.try_spend())
+            self.assertFalse(budget.try_spend())
+        with mock.patch('matoconv.retry.time.monotonic', return_value=161):
+            self.assertTrue(budget.try_spend())
+
+
+class TestCircuitBreaker(TestCase):
+
+    def test_open_and_recover(self):
+        """Ensure breaker opens on failure rate, allowing a trial after the cooldown."""
+        breaker = CircuitBreaker(threshold=0.5, min_attempts=4, window=10, cooldown=30)
+        with mock.patch('matoconv.retry.time.monotonic', return_value=100):
+            for success in (True, False, True):
+                breaker.record(success)
+            self.assertTrue(breaker.allow())
+
+            breaker.record(False)
+            self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+            self.assertFalse(breaker.allow())
+            self.assertEqual(breaker.retry_after(), 31)
+
+        with mock.patch('matoconv.retry.time.monotonic', return_value=130):
+            self.assertTrue(breaker.allow())
+            self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+            self.assertFalse(breaker.allow())
+
+            breaker.record(True)
+            self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+            self.assertTrue(breaker.allow())
+
+    def test_failed_trial(self):
+        """Ensure breaker opens again if the trial conversion fails."""
+        breaker = CircuitBreaker(threshold=0.5, min_attempts=1, window=10, cooldown=30)
+        with mock.patch('matoconv.retry.time.monotonic', return_value=100):
+            breaker.record(False)
+        with mock.patch('matoconv.retry.time.monotonic', return_value=130):
+            self.assertTrue(breaker.allow())
+            breaker.record(False)
+            self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+            self.assertFalse(breaker.allow())
+
+
+class TestRetryController(TestCase):
+
+    def test_per_format_pair(self):
+        """Ensure each format pair has its own budget and breaker."""
+        controller = RetryController(
+            RetryPolicy(3, 1, 10), budget_ratio=0.2, budget_min_retries=1,
+            breaker_threshold=0.5, breaker_min_attempts=1, breaker_window=10,
+            breaker_cooldown=30)
+
+        self.assertIs(controller.breaker('html', 'pdf'), controller.breaker('html', 'pdf'))
+        self.assertIsNot(controller.breaker('html', 'pdf'), controller.breaker('docx', 'pdf'))
+        self.assertIs(controller.budget('html', 'pdf'), controller.budget('html', 'pdf'))
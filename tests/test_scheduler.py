@@ -0,0 +1,117 @@
+import threading
+
+from unittest import TestCase, mock
+
+from matoconv.retry import RetryPolicy
+from matoconv.scheduler import ConverterScheduler, Task
+
+
+class TestConverterScheduler(TestCase):
+
+    def setUp(self) -> None:
+        self.scheduler = ConverterScheduler(slots=2)
+        self.addCleanup(self.scheduler.stop)
+        return super().setUp()
+
+    def test_result(self):
+        """Ensure task result is passed to callback and returned by get."""
+        results = []
+        task = self.scheduler.submit(
+            lambda a, b: a + b, (1, 2), callback=results.append)
+
+        self.assertEqual(task.get(timeout=5), 3)
+        self.assertEqual(results, [3])
+
+    def test_error(self):
+        """Ensure task errors are passed to error callback and raised by get, leaving slot running."""
+        errors = []
+
+        def fail():
+            raise ValueError('Conversion error')
+
+        task = self.scheduler.submit(fail, (), error_callback=errors.append)
+        with self.assertRaises(ValueError):
+            task.get(timeout=5)
+        self.assertEqual(str(errors[0]), 'Conversion error')
+
+        # Ensure slots continue to run tasks
+        tasks = [self.scheduler.submit(lambda: 'ok', ()) for _ in range(2)]
+        self.assertEqual([task.get(timeout=5) for task in tasks], ['ok', 'ok'])
+
+    def test_concurrency(self):
+        """Ensure tasks are limited to the number of slots."""
+        release = threading.Event()
+        tasks = [self.scheduler.submit(release.wait, (5, )) for _ in range(3)]
+
+        with self.assertRaises(TimeoutError):
+            tasks[2].get(timeout=0.1)
+        self.assertTrue(tasks[2].cancel())
+
+        release.set()
+        self.assertTrue(tasks[0].get(timeout=5))
+        self.assertTrue(tasks[1].get(timeout=5))
+
+    def test_retry(self):
+        """Ensure failed attempts are retried, releasing the slot whilst waiting."""
+        events = []
+        results = iter(['failed', 'failed', 'ok'])
+        task = self.scheduler.submit(
+            lambda: next(results), (), callback=events.append,
+            retry_policy=RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.01),
+            should_retry=lambda result: result == 'failed',
+            release=lambda: events.append('release'),
+            reacquire=lambda: events.append('reacquire'))
+
+        self.assertEqual(task.get(timeout=5), 'ok')
+        self.assertEqual(task.attempts, 3)
+        self.assertEqual(events, ['release', 'reacquire', 'release', 'reacquire', 'ok'])
+
+    def test_retry_max_attempts(self):
+        """Ensure result of final attempt is returned once attempts are exhausted."""
+        task = self.scheduler.submit(
+            lambda: 'failed', (),
+            retry_policy=RetryPolicy(max_attempts=2, base_delay=0.01, max_delay=0.01),
+            should_retry=lambda result: True)
+
+        self.assertEqual(task.get(timeout=5), 'failed')
+        self.assertEqual(task.attempts, 2)
+
+
+class TestTask(TestCase):
+
+    def test_cancel_started(self):
+        """Ensure tasks cannot be cancelled once started."""
+        task = Task(lambda: None, ())
+        task.run()
+        self.assertFalse(task.cancel())
+        self.assertFalse(task.cancelled)
+
+    def test_cancelled_not_run(self):
+        """Ensure cancelled tasks do not run."""
+        calls = []
+        task = Task(calls.append, (1, ))
+        task.cancel()
+        task.run()
+        self.assertEqual(calls, [])
+
+    def test_cancel_queued_releases_slot(self):
+        """Ensure cancelling a queued task releases its slot."""
+        release = mock.MagicMock()
+        task = Task(lambda: None, (), release=release)
+        self.assertTrue(task.cancel())
+        release.assert_called_once_with()
+
+    def test_cancel_suspended(self):
+        """Ensure tasks waiting to retry can be cancelled, without obtaining a slot."""
+        release = mock.MagicMock()
+        reacquire = mock.MagicMock()
+        task = Task(lambda: 'failed', (), retry_policy=RetryPolicy(2, 1, 1),
+                    should_retry=lambda result: True, release=release, reacquire=reacquire)
+        self.assertFalse(task.run())
+        task.suspend()
+        release.assert_called_once_with()
+
+        self.assertTrue(task.cancel())
+        self.assertFalse(task.resume())
+        reacquire.assert_not_called()
+        release.assert_called_once_with()
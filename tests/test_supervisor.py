@@ -0,0 +1,86 @@
+import os
+import sys
+import tempfile
+import time
+
+from unittest import TestCase
+
+from matoconv.supervisor import OutputBuffer, ProcessSupervisor, TIMEOUT_RC
+
+
+class TestOutputBuffer(TestCase):
+
+    def test_write(self):
+        """Ensure only the most recent output is kept once the buffer is full."""
+        buffer = OutputBuffer(5)
+        buffer.write(b'abc')
+        buffer.write(b'defg')
+        self.assertEqual(buffer.getvalue(), b'cdefg')
+        buffer.write(b'hijklmn')
+        self.assertEqual(buffer.getvalue(), b'jklmn')
+        self.assertEqual(buffer.discarded, 9)
+
+
+class TestProcessSupervisor(TestCase):
+
+    def setUp(self) -> None:
+        self.temp_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_directory.cleanup)
+        return super().setUp()
+
+    def _run(self, supervisor: ProcessSupervisor, code: str, timeout: float = None):
+        """Run python code using the supervisor."""
+        return supervisor.run(
+            [sys.executable, '-c', code], dict(os.environ), self.temp_directory.name, timeout=timeout)
+
+    def test_run(self):
+        """Ensure RC, output and resource usage of process are returned."""
+        result = self._run(
+            ProcessSupervisor(output_limit=1024),
+            'import sys\n'
+            'sys.stdout.write("x" * 1000000)\n'
+            'sys.stderr.write("error")\n'
+            'sys.exit(3)')
+        self.assertEqual(result.rc, 3)
+        self.assertEqual(result.stdout.getvalue(), b'x' * 1024)
+        self.assertEqual(result.stdout.discarded, 1000000 - 1024)
+        self.assertEqual(result.stderr.getvalue(), b'error')
+        self.assertGreater(result.usage.max_rss, 0)
+        self.assertGreater(result.usage.cpu_time, 0)
+
+    def test_timeout(self):
+        """Ensure descendants of processes are killed on timeout."""
+        pid_path = os.path.join(self.temp_directory.name, 'pid')
+        started_at = time.monotonic()
+        result = self._run(
+            ProcessSupervisor(kill_grace=1),
+            'import signal, subprocess, sys, time\n'
+            'signal.signal(signal.SIGTERM, signal.SIG_IGN)\n'
+            'child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])\n'
+            'open("pid", "w").write(str(child.pid))\n'
+            'time.sleep(60)',
+            timeout=1)
+        self.assertEqual(result.rc, TIMEOUT_RC)
+        self.assertLess(time.monotonic() - started_at, 30)
+
+        with open(pid_path) as fh:
+            child_pid = int(fh.read())
+        # Child is reparented once killed, so may remain until reaped by init
+        for _ in range(50):
+            try:
+                with open('/proc/{}/stat'.format(child_pid)) as fh:
+                    if fh.read().rsplit(')', 1)[1].split()[0] == 'Z':
+                        break
+            except FileNotFoundError:
+                break
+            time.sleep(0.1)
+        else:
+            self.fail('Child process was not killed')
+
+    def test_memory_limit(self):
+        """Ensure processes exceeding the memory limit fail."""
+        result = self._run(
+            ProcessSupervisor(memory_limit=512 * 1024 * 1024),
+            'x = bytearray(1024 * 1024 * 1024)')
+        self.assertNotEqual(result.rc, 0)
+        self.assertIn(b'MemoryError', result.stderr.getvalue())
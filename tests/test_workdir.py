@@ -0,0 +1,67 @@
+import os
+import tempfile
+
+from unittest import TestCase, mock
+
+from matoconv.workdir import WorkDirectories
+
+
+class TestWorkDirectories(TestCase):
+
+    def setUp(self) -> None:
+        self.temp_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_directory.cleanup)
+        self.root = os.path.join(self.temp_directory.name, 'work')
+        return super().setUp()
+
+    def test_directory(self):
+        """Ensure directories are created in the work root and removed once released."""
+        work_directories = WorkDirectories(root=self.root)
+        with work_directories.directory() as path:
+            self.assertTrue(os.path.isdir(path))
+            self.assertEqual(os.path.dirname(os.path.dirname(path)), self.root)
+            self.assertTrue(os.path.basename(os.path.dirname(path)).startswith(
+                'matoconv-work-{}-'.format(os.getpid())))
+            with open(os.path.join(path, 'output.pdf'), 'wb') as fh:
+                fh.write(b'OUTPUT')
+
+        work_directories.wait_removed()
+        self.assertFalse(os.path.exists(path))
+
+    def test_max_usage(self):
+        """Ensure directories are created in the default temporary directory once usage reaches the limit."""
+        work_directories = WorkDirectories(root=self.root, max_usage=100)
+        with mock.patch('matoconv.workdir.shutil.disk_usage', return_value=mock.MagicMock(used=50)):
+            path = work_directories.create()
+        self.assertTrue(path.startswith(self.root + '/'))
+        work_directories.release(path)
+
+        with mock.patch('matoconv.workdir.shutil.disk_usage', return_value=mock.MagicMock(used=100)):
+            path = work_directories.create()
+        self.assertTrue(path.startswith(tempfile.gettempdir() + '/'))
+        self.assertFalse(path.startswith(self.root + '/'))
+        work_directories.release(path)
+        work_directories.wait_removed()
+
+    def test_sweep(self):
+        """Ensure directories of processes no longer running are removed on startup."""
+        running = os.path.join(self.root, 'matoconv-work-{}-abc'.format(os.getppid()))
+        crashed = os.path.join(self.root, 'matoconv-work-999999999-abc')
+        previous = os.path.join(self.root, 'matoconv-work-{}-abc'.format(os.getpid()))
+        unrelated = os.path.join(self.root, 'other')
+        for path in [running, crashed, previous, unrelated]:
+            os.makedirs(os.path.join(path, 'conversion'))
+
+        work_directories = WorkDirectories(root=self.root)
+        work_directories.wait_removed()
+
+        self.assertTrue(os.path.exists(running))
+        self.assertFalse(os.path.exists(crashed))
+        self.assertFalse(os.path.exists(previous))
+        self.assertTrue(os.path.exists(unrelated))
+
+        # Directories of the current process are not removed
+        path = work_directories.create()
+        work_directories.sweep(self.root)
+        work_directories.wait_removed()
+        self.assertTrue(os.path.isdir(path))
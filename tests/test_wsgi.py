@@ -0,0 +1,48 @@
+
+import os
+from unittest import TestCase, mock
+
+from matoconv import Config
+from matoconv import wsgi
+
+
+class TestServerOptions(TestCase):
+
+    @mock.patch('matoconv.wsgi.ServerConfig.WEB_WORKERS', 4)
+    @mock.patch('matoconv.wsgi.ServerConfig.WEB_THREADS', 8)
+    @mock.patch('matoconv.wsgi.ServerConfig.LISTEN_PORT', '8091')
+    def test_get_options(self):
+        """Ensure gunicorn settings are obtained from configuration."""
+        options = wsgi.get_options()
+
+        self.assertEqual(options['bind'], '0.0.0.0:8091')
+        self.assertEqual(options['workers'], 4)
+        self.assertEqual(options['worker_class'], 'gthread')
+        self.assertEqual(options['threads'], 8)
+        self.assertFalse(options['preload_app'])
+
+    @mock.patch('matoconv.wsgi.ServerConfig.THREADING', False)
+    def test_get_options_threading_disabled(self):
+        """Ensure workers use a single thread when threading is disabled."""
+        self.assertEqual(wsgi.get_options()['threads'], 1)
+
+    @mock.patch.dict(os.environ, {})
+    @mock.patch('matoconv.Config.CONVERTER_SLOTS_DIR', '')
+    @mock.patch('matoconv.wsgi.atexit')
+    def test_share_converter_slots(self, mock_atexit):
+        """Ensure shared slots directory is created and passed to workers."""
+        wsgi.share_converter_slots()
+        slots_dir = Config.CONVERTER_SLOTS_DIR
+
+        self.assertTrue(os.path.isdir(slots_dir))
+        self.assertEqual(os.environ['CONVERTER_SLOTS_DIR'], slots_dir)
+        os.rmdir(slots_dir)
+
+    @mock.patch('matoconv.Config.CONVERTER_SLOTS_DIR', '/configured')
+    @mock.patch('matoconv.wsgi.tempfile')
+    def test_share_converter_slots_configured(self, mock_tempfile):
+        """Ensure configured shared slots directory is used."""
+        wsgi.share_converter_slots()
+
+        mock_tempfile.mkdtemp.assert_not_called()
+        self.assertEqual(Config.CONVERTER_SLOTS_DIR, '/configured')